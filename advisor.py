@@ -0,0 +1,291 @@
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+import random
+import time
+from types import TracebackType
+from typing import TypedDict
+
+from agents import ShantenAgent
+from game import players_num
+from hand_cache import cached_calculate_shanten
+from hand_table import calculate_shanten, load_suit_tables
+from option_config import set_options_config
+from player import MahjongPlayer
+from rules import compile_rules
+from seeding import derive_seed
+from tiles import PLAYING_TILE_ID_NUM, SUITED_TILE_ID_NUM, TILE_ID_NUM, TILES, MahjongTile
+
+# A discard is rated by rollouts: the unseen tiles are shuffled, then every turn the 3 other seats discard one unseen tile and the seat
+# draws one, until the seat wins or its draws run out. The seat keeps a drawn tile only if it lowers the shanten number, then discards
+# the most isolated tile keeping the lower shanten number. The other seats never claim or win, so the rates are those of the seat
+# racing the wall. All discards are rolled out on the same shuffles, so they are compared on the same luck.
+
+# The bound of the hands memoized by the rollout policy of every count of declared melds, the policy starts over when it is exceeded
+_POLICY_MAXSIZE: int = 1 << 20
+
+class SeatView(TypedDict):
+    tiles_hold: list[int]  # the tile IDs in hand, 3n + 2 tiles before discarding
+    melds_num: int  # the declared pongs, kongs and chows
+    unseen: list[int]  # the count of every tile ID not seen by the seat, in the wall or in the other hands
+    draws_left: int  # the tiles the seat will draw before the wall runs out
+
+class DiscardAdvice(TypedDict):
+    tile: MahjongTile
+    shanten: int  # the shanten number after the discard
+    samples: int
+    win_rate: float
+    self_draw_rate: float  # the rate of wins with the drawn tile, the others are from the discards of the other seats
+    mean_turns: float  # the turns to win, of the winning rollouts
+
+class DiscardAdvisor:
+    """
+        Rank the discards of a seat by Monte Carlo rollouts, across a pool of worker processes kept between calls.
+        Give every call a time budget, a sample budget, or both. The results of a sample budget only depend on `seed` and `workers`.
+    """
+    def __init__(self, workers: None | int = None, time_budget: None | float = 0.05, samples: None | int = None) -> None:
+        """
+            Args:
+                workers: The count of worker processes, `os.cpu_count()` by default, and 1 to roll out in this process.
+                time_budget: The default seconds of rollouts for every call, the call returns a few milliseconds later.
+                samples: The default count of shuffles for every call, every shuffle rolls out all discards.
+        """
+        self.workers: int = workers or os.cpu_count() or 1
+        self.time_budget = time_budget
+        self.samples = samples
+        self._executor: None | ProcessPoolExecutor = None  # started on the first call with more than one worker
+
+    def __enter__(self) -> 'DiscardAdvisor':
+        return self
+
+    def __exit__(self, exc_type: None | type[BaseException], exc: None | BaseException, traceback: None | TracebackType) -> None:
+        self.close()
+
+    def advise(self, view: SeatView, seed: int = 0, time_budget: None | float = None, samples: None | int = None) -> list[DiscardAdvice]:
+        """
+            Roll out every distinct tile in hand as the discard.
+
+            Args:
+                view: What the seat sees, see `seat_view`.
+                seed: The seed of the shuffles.
+                time_budget: The seconds of rollouts, `self.time_budget` by default.
+                samples: The count of shuffles, `self.samples` by default.
+
+            Returns:
+                list: The advice of every discard, the highest win rate first, then the smallest shanten number and the fewest turns.
+        """
+        time_budget = time_budget if time_budget is not None else self.time_budget
+        samples = samples if samples is not None else self.samples
+        if time_budget is None and samples is None:
+            raise ValueError('Give a time budget or a sample budget.')
+        candidates = sorted(set(view['tiles_hold']))
+        # the workers stop at the same wall clock time, however long they wait to start
+        deadline = time.time() + time_budget if time_budget is not None else None
+        if self.workers == 1:
+            tallies = run_rollouts(view, candidates, samples, deadline, derive_seed(seed, 0))
+        else:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=load_suit_tables)
+            worker_samples = None if samples is None else math.ceil(samples / self.workers)
+            futures = [
+                self._executor.submit(run_rollouts, view, candidates, worker_samples, deadline, derive_seed(seed, worker))
+                for worker in range(self.workers)
+            ]
+            tallies = [[0] * 4 for _ in candidates]
+            for future in futures:
+                for tally, worker_tally in zip(tallies, future.result()):
+                    for i, value in enumerate(worker_tally):
+                        tally[i] += value
+
+        counts = [0] * TILE_ID_NUM
+        for tile_id in view['tiles_hold']:
+            counts[tile_id] += 1
+        advice = []
+        for tile_id, (samples_num, wins, self_draws, turns) in zip(candidates, tallies):
+            counts[tile_id] -= 1
+            advice.append(DiscardAdvice(
+                tile=TILES[tile_id],
+                shanten=cached_calculate_shanten(counts, view['melds_num']),
+                samples=samples_num,
+                win_rate=wins / max(samples_num, 1),
+                self_draw_rate=self_draws / max(samples_num, 1),
+                mean_turns=turns / wins if wins else 0.0,
+            ))
+            counts[tile_id] += 1
+        advice.sort(key=lambda item: (-item['win_rate'], item['shanten'], item['mean_turns'] or math.inf, item['tile'].tile_id))
+        return advice
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+class AdvisorAgent(ShantenAgent):
+    """
+        Discard the first advice of a `DiscardAdvisor`, and claim like `ShantenAgent`. By default every discard is rolled out on 32
+        shuffles in this process, so a game with the same seeds plays the same.
+    """
+    def __init__(self, rng: None | random.Random = None, advisor: None | DiscardAdvisor = None) -> None:
+        super().__init__(rng)
+        self.advisor = advisor if advisor is not None else DiscardAdvisor(workers=1, time_budget=None, samples=32)
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        advice = self.advisor.advise(seat_view(player), self.rng.getrandbits(32))
+        return advice[0]['tile']
+
+def run_rollouts(view: SeatView, candidates: list[int], samples: None | int, deadline: None | float, seed: int) -> list[list[int]]:
+    """
+        Roll out the discards in one process, until `samples` shuffles are done or the `time.time()` is past `deadline`, see `DiscardAdvisor`.
+
+        Returns:
+            list: The count of samples, wins, self-draw wins, and the sum of turns of the wins for every discard in `candidates`.
+    """
+    deadline = deadline if deadline is not None else math.inf
+    samples = samples if samples is not None else 1 << 62
+    rng = random.Random(seed)
+    policy = _policies.get(view['melds_num'])
+    if policy is None or len(policy.shantens) > _POLICY_MAXSIZE:
+        policy = _policies[view['melds_num']] = _RolloutPolicy(view['melds_num'])
+    wall = [tile_id for tile_id in range(TILE_ID_NUM) for _ in range(view['unseen'][tile_id])]
+    draws_left = min(view['draws_left'], len(wall) // players_num)
+    counts_hold = [0] * TILE_ID_NUM
+    for tile_id in view['tiles_hold']:
+        counts_hold[tile_id] += 1
+
+    tallies = [[0] * 4 for _ in candidates]
+    now = time.time
+    for _ in range(samples):
+        rng.shuffle(wall)
+        for tile_id, tally in zip(candidates, tallies):
+            if now() >= deadline:
+                return tallies
+            counts = list(counts_hold)
+            counts[tile_id] -= 1
+            turns, self_draw = _rollout(policy, counts, wall, draws_left)
+            tally[0] += 1
+            if turns:
+                tally[1] += 1
+                tally[2] += self_draw
+                tally[3] += turns
+    return tallies
+
+def seat_view(player: MahjongPlayer, players: None | Iterable[MahjongPlayer] = None) -> SeatView:
+    """
+        Collect what `player` sees at the table: the own hand, the discards and the declared melds of all players.
+        Kongs are all counted as seen, as `MahjongPlayer.kong` does not tell concealed kongs apart. Jokers count as plain tiles.
+
+        Args:
+            player: The player to advise.
+            players: All players at the table, the players of `player.claims` by default.
+
+        Returns:
+            SeatView: The view of the seat.
+    """
+    if players is None:
+        players = player.claims.players.values() if player.claims is not None else [player]
+    rules = player.rules if player.rules is not None else compile_rules(set_options_config())
+    seen = list(player.counts)
+    other_tiles_num = 0
+    for other in players:
+        # the declared pongs and chows are already in `tiles_discard`, except the claimed tile which is in the discards of its player
+        for tile in other.tiles_discard:
+            seen[tile.tile_id] += 1
+        for meld in other.kong:
+            seen[meld[0].tile_id] += 4
+        if other is not player:
+            other_tiles_num += len(other.tiles_hold)
+    unseen = [0] * TILE_ID_NUM
+    for tile_id in rules.tile_ids:
+        unseen[tile_id] += 1
+    unseen = [max(unseen[tile_id] - seen[tile_id], 0) for tile_id in range(TILE_ID_NUM)]
+    return SeatView(
+        tiles_hold=[tile.tile_id for tile in player.tiles_hold],
+        melds_num=len(player.pong) + len(player.kong) + len(player.chow),
+        unseen=unseen,
+        draws_left=max(sum(unseen) - other_tiles_num, 0) // players_num,
+    )
+
+class _RolloutPolicy:
+    # The shanten numbers of the hands met in the rollouts, and the discard of every hand after a useful draw, kept by every process
+    # across calls. The rollouts keep meeting the same hands, so most lookups are hits. Only a drawn tile identical or close to a tile
+    # in hand can be useful.
+    def __init__(self, melds_num: int) -> None:
+        self.melds_num = melds_num
+        self.shantens: dict[bytes, int] = {}
+        self.discards: dict[bytes, int] = {}
+
+    def discard(self, counts: list[int], shanten: int) -> int:
+        # The first tile in the order of `_isolation` keeping `shanten`, the most isolated tiles are tried first
+        key = bytes(counts)
+        tile_id = self.discards.get(key)
+        if tile_id is None:
+            best = (9, 0)
+            for discard_id in sorted((tile_id for tile_id in range(TILE_ID_NUM) if counts[tile_id]), key=lambda tile_id: _isolation(counts, tile_id)):
+                counts[discard_id] -= 1
+                discard_shanten = self.shanten(counts)
+                counts[discard_id] += 1
+                best = min(best, (discard_shanten, discard_id))
+                if discard_shanten <= shanten:
+                    break
+            tile_id = best[1]
+            self.discards[key] = tile_id
+        return tile_id
+
+    def shanten(self, counts: list[int]) -> int:
+        key = bytes(counts)
+        shanten = self.shantens.get(key)
+        if shanten is None:
+            shanten = calculate_shanten(counts, self.melds_num)
+            self.shantens[key] = shanten
+        return shanten
+
+    def useful(self, counts: list[int], shanten: int, tile_id: int) -> bool:
+        if tile_id >= PLAYING_TILE_ID_NUM or counts[tile_id] >= 4 or _isolation(counts, tile_id) == 0:
+            return False
+        counts[tile_id] += 1
+        useful = self.shanten(counts) < shanten
+        counts[tile_id] -= 1
+        return useful
+
+_policies: dict[int, _RolloutPolicy] = {}  # by the count of declared melds
+
+def _isolation(counts: list[int], tile_id: int) -> int:
+    # The tiles in hand identical or close to `tile_id`, identical ones count twice, honors and bonus tiles only have identical ones
+    if tile_id >= SUITED_TILE_ID_NUM:
+        return 2 * counts[tile_id]
+    suit_start = tile_id - tile_id % 9
+    return counts[tile_id] + sum(counts[max(suit_start, tile_id - 2):min(suit_start + 9, tile_id + 3)])
+
+def _rollout(policy: _RolloutPolicy, counts: list[int], wall: list[int], draws_left: int) -> tuple[int, bool]:
+    # Returns the turns to win(0 if the draws run out), and whether the win is from the wall
+    shanten = policy.shanten(counts)
+    idx = 0
+    for turns in range(1, draws_left + 1):
+        if shanten == 0:
+            for tile_id in wall[idx:idx + players_num - 1]:
+                if policy.useful(counts, shanten, tile_id):
+                    return turns, False
+        idx += players_num - 1
+        tile_id = wall[idx]
+        idx += 1
+        if policy.useful(counts, shanten, tile_id):
+            if shanten == 0:
+                return turns, True
+            counts[tile_id] += 1
+            shanten -= 1
+            counts[policy.discard(counts, shanten)] -= 1
+    return 0, False
+
+
+def test_discard_advisor() -> None:
+    # bamboo 123 + characters 456 + dots 789 + dots 55 + dragons1 + winds3, discard one of the 2 honors to wait for dots 5 or the honor
+    player = MahjongPlayer(0)
+    player.tiles_hold = [MahjongTile(tile_type, number) for tile_type, numbers in [('bamboo', [1, 2, 3]), ('characters', [4, 5, 6]), ('dots', [5, 5, 7, 8, 9])] for number in numbers]
+    player.tiles_hold += [MahjongTile('dragons', 1), MahjongTile('winds', 3), MahjongTile('winds', 3)]
+    view = seat_view(player)
+    print(view['draws_left'], sum(view['unseen']))  # 30 122
+    advisor = DiscardAdvisor(workers=1, time_budget=None, samples=200)
+    advice = advisor.advise(view)
+    print(advice[0]['tile'], advice[0]['shanten'], advice[0]['win_rate'] > advice[-1]['win_rate'])  # dragons1 0 True
+    print(advisor.advise(view, seed=1) == advisor.advise(view, seed=1))  # True
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING
+
+from hand_cache import cached_calculate_shanten
+from tiles import MahjongTile
+from utils import input_list, input_player_action, input_yes
+
+if TYPE_CHECKING:
+    from player import MahjongPlayer
+
+class MahjongAgent:
+    """
+        Decide for the player at one seat. Every decision of the game goes through the agent of the player, so that the game can run
+        interactively with `ConsoleAgent`, or headless with bots.
+    """
+    def choose_claim(self, player: MahjongPlayer, hu_bool: bool, kong_bool: bool, pong_bool: bool, chow_bool: bool, chow_seqs: None | list[list[MahjongTile]]) -> str | int:
+        """
+            Choose one of the available actions, the same as `utils.input_player_action`.
+
+            Returns:
+                str | int: 'hu', 'kong', 'pong', or 'skip', and the index in `chow_seqs` to chow.
+        """
+        raise NotImplementedError
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        """
+            Choose a tile in `player.tiles_hold` to discard.
+
+            Returns:
+                MahjongTile: The tile to discard.
+        """
+        raise NotImplementedError
+
+    def choose_kong(self, player: MahjongPlayer, kong_seqs: list[MahjongTile | list[MahjongTile]]) -> int:
+        """
+            Choose which kong to declare from the wall, a concealed kong seq or a tile to kong from the declared pong.
+
+            Returns:
+                int: The index in `kong_seqs`.
+        """
+        raise NotImplementedError
+
+    def confirm(self, description: str) -> bool:
+        """
+            Confirm a step of the game, like rolling dice or starting the next round.
+
+            Returns:
+                bool: Whether to continue.
+        """
+        return True
+
+class ConsoleAgent(MahjongAgent):
+    """
+        Ask the player with console prompts.
+    """
+    def choose_claim(self, player: MahjongPlayer, hu_bool: bool, kong_bool: bool, pong_bool: bool, chow_bool: bool, chow_seqs: None | list[list[MahjongTile]]) -> str | int:
+        return input_player_action(hu_bool, kong_bool, pong_bool, chow_bool, chow_seqs)
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        tiles_check = [f'{tile}' for tile in player.tiles_hold]
+        discard_tile = input_list(f'For Player{player.idx} Choose a tile to discard (e.g., bamboo5): ', tiles_check, 'Please enter the existing tile in your hand.')
+        return MahjongTile.get_tiles_from_string(discard_tile)
+
+    def choose_kong(self, player: MahjongPlayer, kong_seqs: list[MahjongTile | list[MahjongTile]]) -> int:
+        kong_idx = input_list(f'Which seq to kong: {' '.join(f'{i}.{kong_seqs[i]}' for i in range(len(kong_seqs)))}?(Only input number) ', [f'{i}' for i in range(len(kong_seqs))], 'Invalid Kong seq.')
+        return int(kong_idx)
+
+    def confirm(self, description: str) -> bool:
+        return input_yes(description)
+
+class RandomAgent(MahjongAgent):
+    """
+        Always call Hu when possible, otherwise choose the actions and the discard tile at random.
+    """
+    def __init__(self, rng: None | random.Random = None) -> None:
+        self.rng = rng if rng is not None else random.Random()
+
+    def choose_claim(self, player: MahjongPlayer, hu_bool: bool, kong_bool: bool, pong_bool: bool, chow_bool: bool, chow_seqs: None | list[list[MahjongTile]]) -> str | int:
+        if hu_bool:
+            return 'hu'
+        actions: list[str | int] = ['skip']
+        if kong_bool:
+            actions.append('kong')
+        if pong_bool:
+            actions.append('pong')
+        if chow_bool and chow_seqs:
+            actions += list(range(len(chow_seqs)))
+        return self.rng.choice(actions)
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        return self.rng.choice(player.tiles_hold)
+
+    def choose_kong(self, player: MahjongPlayer, kong_seqs: list[MahjongTile | list[MahjongTile]]) -> int:
+        return self.rng.randrange(len(kong_seqs))
+
+class ShantenAgent(RandomAgent):
+    """
+        Always call Hu when possible and never claim other actions, discard the tile leaving the smallest shanten number.
+        Ties are broken at random.
+    """
+    def choose_claim(self, player: MahjongPlayer, hu_bool: bool, kong_bool: bool, pong_bool: bool, chow_bool: bool, chow_seqs: None | list[list[MahjongTile]]) -> str | int:
+        return 'hu' if hu_bool else 'skip'
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        counts = list(player.counts)
+        melds_num = len(player.pong) + len(player.kong) + len(player.chow)
+        best_tiles: list[MahjongTile] = []
+        best_shanten = 9
+        for tile in set(player.tiles_hold):
+            counts[tile.tile_id] -= 1
+            shanten = cached_calculate_shanten(counts, melds_num)
+            counts[tile.tile_id] += 1
+            if shanten < best_shanten:
+                best_tiles, best_shanten = [tile], shanten
+            elif shanten == best_shanten:
+                best_tiles.append(tile)
+        # sort before choosing, so that the choice only depends on `self.rng`
+        return self.rng.choice(sorted(best_tiles))
+
+def test_shanten_agent() -> None:
+    from player import MahjongPlayer
+    player = MahjongPlayer(0, ShantenAgent(random.Random(0)))
+    player.tiles_hold = [MahjongTile('bamboo', number) for number in range(1, 10)] + [MahjongTile('dots', 5)] * 2 + [MahjongTile('winds', 1)] * 2 + [MahjongTile('dragons', 1)]
+    print(player.agent.choose_discard(player))  # dragons1
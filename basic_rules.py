@@ -1,14 +1,43 @@
 from collections import Counter
+from collections.abc import Sequence
 
-from tiles import MahjongTile
+from hand_cache import cached_find_pair_id
+from hand_table import count_jokers_needed
+from tiles import SUITED_TILE_ID_NUM, TILE_ID_NUM, TILES, MahjongTile, tiles_to_counts
 
-def check_legal_hand(tiles: list[MahjongTile]) -> list[list[MahjongTile]]:
+# Tile IDs which can start a sequence, the next 2 tile IDs are of the same tile type
+_SEQ_START_IDS: frozenset[int] = frozenset(
+    tile_id for tile_id in range(TILE_ID_NUM - 2) if TILES[tile_id].tile_type == TILES[tile_id + 2].tile_type
+)
+
+def check_legal_hand(tiles: list[MahjongTile], joker: None | MahjongTile = None) -> list[list[MahjongTile]]:
+    # With jokers in hand, only the count of jokers needed is looked up, see `hand_table.count_jokers_needed`,
+    # and the legal hand is returned as the other tiles and the jokers.
+    if len(tiles) % 3 != 2:
+        return []
+
+    if joker is not None and joker in tiles:
+        counts = tiles_to_counts(tiles)
+        if count_jokers_needed(counts, joker.tile_id) > counts[joker.tile_id]:
+            return []
+        return [[tile for tile in tiles if tile != joker], [joker] * counts[joker.tile_id]]
+
+    # table lookup for every suit, see `hand_table`, cached by the canonical hand in `hand_cache`
+    pair_id = cached_find_pair_id(tiles_to_counts(tiles))
+    if pair_id < 0:
+        return []
+    melds = remove_pairs_from_list(tiles, [TILES[pair_id]] * 2)
+    return [melds, [TILES[pair_id]] * 2]
+
+def check_legal_hand_recursive(tiles: list[MahjongTile]) -> list[list[MahjongTile]]:
+    # The backtracking search replaced by the table lookup in `check_legal_hand`, kept as the reference for benchmarks.
+    # Different from `check_legal_hand`, honors with consecutive numbers are also tried as chow here.
     if len(tiles) % 3 != 2:
         return []
 
-    tiles_tuple = tuple(sorted((tile.tile_type, tile.number) for tile in tiles))
+    tiles_tuple = tuple(sorted(tile.tile_id for tile in tiles))
     tiles_counts = Counter(tiles_tuple)
-    pair: list[tuple[str, int]] = []
+    pair: list[int] = []
 
     def try_melds_pair(start_idx: int = 0, pair_used: bool = False) -> bool:
         # The legal hand should have a pair
@@ -32,9 +61,9 @@ def check_legal_hand(tiles: list[MahjongTile]) -> list[list[MahjongTile]]:
                     return True
                 tiles_counts[tile] += 3
             # Try chow seq in hand, only try until number is 7 (since the max number is 9)
-            if tile[1] <= 7:
-                tile_next = (tile[0], tile[1] + 1)
-                tile_nn = (tile[0], tile[1] + 2)
+            if tile in _SEQ_START_IDS:
+                tile_next = tile + 1
+                tile_nn = tile + 2
                 if tiles_counts[tile_next] > 0 and tiles_counts[tile_nn] > 0:
                     tiles_counts[tile] -= 1
                     tiles_counts[tile_next] -= 1
@@ -50,52 +79,56 @@ def check_legal_hand(tiles: list[MahjongTile]) -> list[list[MahjongTile]]:
     legal_hand_bool = try_melds_pair()
     if not legal_hand_bool:
         return []
-    melds = remove_pairs_from_list(tiles, pair)
-    return [melds, [MahjongTile(*pair[0])] * 2]
+    melds = remove_pairs_from_list(tiles, [TILES[tile_id] for tile_id in pair])
+    return [melds, [TILES[pair[0]]] * 2]
 
 def count_identical_tiles(tiles: list[MahjongTile], count_num: int = 4) -> list[list[MahjongTile]]:
     counter = Counter(tiles)
     return [[tile] * count for tile, count in counter.items() if count == count_num]
 
-def find_chow_tiles(tiles_hold: list[MahjongTile], tile_discard_last: MahjongTile, count: int = 3) -> list[list[MahjongTile]]:
-    if tile_discard_last not in tiles_hold:
-        tiles_hold += [tile_discard_last]
-    tiles_hold = sorted((tile for tile in tiles_hold if tile.tile_type == tile_discard_last.tile_type), key=lambda tile: tile.number)
-
-    # Remove duplicates
-    tiles_unique: list[MahjongTile] = []
-    for tile in tiles_hold:
-        if not tiles_unique or tile.number != tiles_unique[-1].number:
-            tiles_unique.append(tile)
+def find_chow_seqs(suit_masks: Sequence[int], tile_discard_last: MahjongTile, count: int = 3) -> list[list[MahjongTile]]:
+    """
+        Find the chow seqs with `tile_discard_last` from the suit bitmasks of the hand, see `tiles.counts_to_suit_masks`.
 
+        Returns:
+            list: The chow seqs in the order of the first tile.
+    """
     chow_tiles: list[list[MahjongTile]] = []
-    if tile_discard_last.tile_type not in ['bamboo', 'characters', 'dots']:
+    tile_id = tile_discard_last.tile_id
+    if tile_id >= SUITED_TILE_ID_NUM:
         return chow_tiles
 
-    for i in range(len(tiles_unique) - count + 1):
-        if all(tiles_unique[i + j].number == tiles_unique[i].number + j for j in range(count)):
-            seq = tiles_unique[i:i + count]
-            if tile_discard_last in seq:
-                chow_tiles.append(seq)
-
+    suit_start = tile_id - tile_id % 9
+    mask = suit_masks[suit_start // 9] | 1 << (tile_id - suit_start)
+    seq_mask = (1 << count) - 1
+    for number in range(max(tile_id - suit_start - count + 1, 0), min(tile_id - suit_start, 9 - count) + 1):
+        if mask >> number & seq_mask == seq_mask:
+            chow_tiles.append(list(TILES[suit_start + number : suit_start + number + count]))
     return chow_tiles
 
+def find_chow_tiles(tiles_hold: list[MahjongTile], tile_discard_last: MahjongTile, count: int = 3) -> list[list[MahjongTile]]:
+    # only the suit of `tile_discard_last` is needed
+    suit_masks = [0] * 3
+    for tile in tiles_hold:
+        if tile.tile_id < SUITED_TILE_ID_NUM:
+            suit_masks[tile.tile_id // 9] |= 1 << tile.tile_id % 9
+    return find_chow_seqs(suit_masks, tile_discard_last, count)
+
 def find_identical_tiles(tiles_hold: list[MahjongTile], tile_discard_last: MahjongTile) -> int:
     # count `tile_discard_last` in `tiles_hold`
     # if return 3: can pong; if return 4: can kong(Exposed kong)
-    count_hold = sum(1 for tile in tiles_hold if tile.tile_type == tile_discard_last.tile_type and tile.number == tile_discard_last.number)
-    return count_hold + 1
+    return tiles_hold.count(tile_discard_last) + 1
 
 def find_tiles_in_tiles(source_l: list[MahjongTile], target_l: list[MahjongTile]) -> set[MahjongTile]:
     target_set = set(target_l)
     return {tile for tile in source_l if tile in target_set}
 
-def remove_pairs_from_list(source_l: list[MahjongTile], target: list[tuple[str, int]]) -> list[MahjongTile]:
+def remove_pairs_from_list(source_l: list[MahjongTile], target: Sequence[MahjongTile | tuple[str, int]]) -> list[MahjongTile]:
     result_l = source_l.copy()
     for item in target:
         if item in result_l:
             result_l.remove(item)  # type: ignore
-    result_l.sort(key=lambda x: f'{x.tile_type}{x.number}')
+    result_l.sort(key=lambda x: x.tile_id)
     return result_l
 
 # Test code for these basic rules
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import TypedDict
+
+from advisor import DiscardAdvisor, seat_view
+from agents import MahjongAgent, RandomAgent
+from basic_rules import check_legal_hand, check_legal_hand_recursive, count_identical_tiles, find_chow_tiles
+from events import LogLevel, log
+from game import MahjongGame, players_num
+from hand_table import calculate_shanten, iter_decompositions
+from option_config import set_options_config
+from player import MahjongPlayer, check_chow, check_concealed_kong, check_exposed_kong, check_exposed_kong_from_pong, check_hu_from_discard, check_hu_from_wall, check_pong
+from runner import play_game
+from scoring import WinContext, score_hand
+from state import GameState
+from tiles import TILES, MahjongTile, WindPosition, counts_to_suit_masks, tiles_to_counts
+
+baseline_path: str = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+class BenchResult(TypedDict):
+    ops_per_sec: float
+    peak_kib: float  # the peak memory allocated during one call
+
+def bench(func: Callable[[], object], min_time: float = 0.2) -> float:
+    """
+        Call `func` repeatedly for at least `min_time` seconds.
+
+        Returns:
+            float: Calls per second.
+    """
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+def bench_check_legal_hand() -> None:
+    hands = hard_hands() + random_hands(random.Random(0), 50)
+    print(f'check_legal_hand on {len(hands)} hands:')
+    for name, check in [('recursive', check_legal_hand_recursive), ('table', check_legal_hand)]:
+        hands_per_sec = bench(lambda: [check(hand) for hand in hands]) * len(hands)
+        print(f'{name:>12}: {hands_per_sec:12.0f} hands/sec')
+
+def bench_check_legal_hands_batch(hands_num: int = 1_000_000) -> None:
+    try:
+        from hand_batch import check_legal_hands, random_counts
+    except ImportError:
+        print('check_legal_hands(batch): numpy is not installed, skipped.')
+        return
+    import numpy as np
+
+    # repeat a smaller random corpus, generating hands in python is much slower than checking them
+    counts = np.tile(random_counts(random.Random(0), 10_000), (hands_num // 10_000, 1))
+    check_legal_hands(counts[:1])  # build the tables before timing
+    start = time.perf_counter()
+    check_legal_hands(counts)
+    print(f'check_legal_hands(batch) on {len(counts)} hands: {len(counts) / (time.perf_counter() - start):12.0f} hands/sec')
+
+def bench_memory(func: Callable[[], object]) -> float:
+    """
+        Call `func` once with `tracemalloc` on.
+
+        Returns:
+            float: The peak memory allocated during the call, in KiB.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+def benchmark_cases() -> dict[str, Callable[[], object]]:
+    """
+        The functions to benchmark, every call of one function is one op. The inputs are fixed, so that the results are comparable
+        across runs.
+
+        Returns:
+            dict: The name and the function of every case.
+    """
+    rng = random.Random(0)
+    hard = hard_hands()
+    hard_counts = [tiles_to_counts(hand) for hand in hard]
+    hands = random_hands(rng, 100, 3)
+    hands_hold = [hand[:13] for hand in hands]
+    tiles_discard = [hand[13] for hand in hands]
+    counts_hold = [tiles_to_counts(hand) for hand in hands_hold]
+    suit_masks_hold = [counts_to_suit_masks(counts) for counts in counts_hold]
+    counts = [tiles_to_counts(hand) for hand in hands]
+    pongs = [[[tile] * 3 for tile in set(hand[:3])] for hand in hands]
+    # the same hands with 1 to 3 tiles replaced by the joker
+    joker = MahjongTile('winds', 1)
+    joker_hands = [hand[:14 - i % 3 - 1] + [joker] * (i % 3 + 1) for i, hand in enumerate(hands)]
+    context = WinContext(self_draw=True, dealer=False, seat_wind=WindPosition.EAST)
+    options_config = set_options_config()
+    # the rollouts of one hand, with the hands memoized by the previous calls
+    player = MahjongPlayer(0)
+    player.tiles_hold = hands[0]
+    view = seat_view(player)
+    advisor = DiscardAdvisor(workers=1, time_budget=None, samples=16)
+    # the snapshot of a dealt game, for search algorithms
+    dealt = MahjongGame(options_config, [RandomAgent(random.Random(seat)) for seat in range(players_num)], rng=0)
+    dealt.start_game()
+    state = GameState.from_game(dealt)
+
+    def deal() -> None:
+        agents: list[MahjongAgent] = [RandomAgent(random.Random(seat)) for seat in range(players_num)]
+        MahjongGame(options_config, agents, rng=0).start_game()
+
+    return {
+        'check_legal_hand(hard)': lambda: [check_legal_hand(hand) for hand in hard],
+        'check_legal_hand(random)': lambda: [check_legal_hand(hand) for hand in hands],
+        'check_legal_hand(joker)': lambda: [check_legal_hand(hand, joker) for hand in joker_hands],
+        'find_chow_tiles': lambda: [find_chow_tiles(hand, tile) for hand, tile in zip(hands_hold, tiles_discard)],
+        'count_identical_tiles': lambda: [count_identical_tiles(hand) for hand in hands],
+        'check_chow': lambda: [check_chow(suit_masks, tile) for suit_masks, tile in zip(suit_masks_hold, tiles_discard)],
+        'check_pong': lambda: [check_pong(counts, tile) for counts, tile in zip(counts_hold, tiles_discard)],
+        'check_exposed_kong': lambda: [check_exposed_kong(counts, tile) for counts, tile in zip(counts_hold, tiles_discard)],
+        'check_concealed_kong': lambda: [check_concealed_kong(counts_) for counts_ in counts],
+        'check_exposed_kong_from_pong': lambda: [check_exposed_kong_from_pong(counts_, pong) for counts_, pong in zip(counts, pongs)],
+        'check_hu_from_wall': lambda: [check_hu_from_wall(hand) for hand in hands],
+        'check_hu_from_discard': lambda: [check_hu_from_discard(hand, tile) for hand, tile in zip(hands_hold, tiles_discard)],
+        'iter_decompositions(hard)': lambda: [list(iter_decompositions(counts_)) for counts_ in hard_counts],
+        'score_hand(hard)': lambda: [score_hand(hand, [], [], [], context) for hand in hard],
+        'calculate_shanten(random)': lambda: [calculate_shanten(counts_) for counts_ in counts_hold],
+        'advise(16 samples)': lambda: advisor.advise(view),
+        'GameState.clone': state.clone,
+        'build_walls_and_deal': deal,
+        'game(random)': lambda: play_game(options_config, 0, agent='random'),
+        'game(shanten)': lambda: play_game(options_config, 0, agent='shanten'),
+    }
+
+def compare_baseline(results: dict[str, BenchResult], baseline: dict[str, BenchResult], tolerance: float = 0.2) -> list[str]:
+    """
+        Compare the results with the baseline, a case regresses if it is slower or takes more memory by more than `tolerance`.
+        Cases missing in the baseline are not compared.
+
+        Returns:
+            list: The descriptions of the regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f'{name}: {result['ops_per_sec']:.1f} ops/sec, baseline {base['ops_per_sec']:.1f} ops/sec')
+        if result['peak_kib'] > base['peak_kib'] * (1 + tolerance) + 1:
+            regressions.append(f'{name}: {result['peak_kib']:.1f} KiB peak, baseline {base['peak_kib']:.1f} KiB peak')
+    return regressions
+
+def hard_hands() -> list[list[MahjongTile]]:
+    # The pure suit hands with many overlapping decompositions, from `basic_rules.test_check_legal_hand`
+    return [
+        [MahjongTile('bamboo', number) for number in [1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5]],
+        [MahjongTile('bamboo', number) for number in [4, 4, 3, 3, 3, 2, 3, 4, 4, 5, 6]],
+        [MahjongTile('bamboo', number) for number in [1, 2, 3, 2, 3, 4, 4, 4, 4, 8, 8, 8, 5, 6]],
+    ]
+
+def load_baseline(path: str = baseline_path) -> dict[str, BenchResult]:
+    """
+        Returns:
+            dict: The stored results, empty if there is no baseline yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def random_hands(rng: random.Random, hands_num: int, suit_num: int = 1) -> list[list[MahjongTile]]:
+    """
+        Draw 14 tiles of the first `suit_num` suits from a full set of tiles, for `hands_num` times.
+
+        Returns:
+            list: The hands.
+    """
+    all_tiles = [TILES[tile_id] for tile_id in range(9 * suit_num) for _ in range(4)]
+    return [rng.sample(all_tiles, 14) for _ in range(hands_num)]
+
+def run_suite(min_time: float = 0.2, names: None | list[str] = None) -> dict[str, BenchResult]:
+    """
+        Time every case in `benchmark_cases` and measure its peak memory, the game events are not logged.
+
+        Args:
+            min_time: The least seconds to time every case.
+            names: The cases to run, all cases by default.
+
+        Returns:
+            dict: The result of every case.
+    """
+    results: dict[str, BenchResult] = {}
+    with log.at_level(LogLevel.SILENT):
+        for name, func in benchmark_cases().items():
+            if names is not None and name not in names:
+                continue
+            func()  # warm up, e.g., load the hand tables
+            results[name] = BenchResult(ops_per_sec=bench(func, min_time), peak_kib=bench_memory(func))
+    return results
+
+def save_baseline(results: dict[str, BenchResult], path: str = baseline_path) -> None:
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def test_compare_baseline() -> None:
+    baseline = {'check_pong': BenchResult(ops_per_sec=1000.0, peak_kib=10.0), 'game(random)': BenchResult(ops_per_sec=30.0, peak_kib=500.0)}
+    results = {'check_pong': BenchResult(ops_per_sec=900.0, peak_kib=10.5), 'game(random)': BenchResult(ops_per_sec=20.0, peak_kib=500.0)}
+    print(compare_baseline(results, baseline))  # ['game(random): 20.0 ops/sec, baseline 30.0 ops/sec']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the rule checks and full games, and compare with the stored baseline.')
+    parser.add_argument('cases', nargs='*', help='The cases to run, all cases by default.')
+    parser.add_argument('--min-time', type=float, default=0.2, help='The least seconds to time every case.')
+    parser.add_argument('--baseline', default=baseline_path, help='The baseline JSON file.')
+    parser.add_argument('--save', action='store_true', help='Store the results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='The relative slowdown or memory growth flagged as a regression.')
+    parser.add_argument('--legacy', action='store_true', help='Also compare the recursive and the table legal hand checks, and the batch checks.')
+    args = parser.parse_args()
+
+    if args.legacy:
+        bench_check_legal_hand()
+        bench_check_legal_hands_batch()
+
+    results = run_suite(args.min_time, args.cases or None)
+    baseline = load_baseline(args.baseline)
+    print(f'{'case':<30}{'ops/sec':>14}{'baseline':>14}{'peak KiB':>12}')
+    for name, result in results.items():
+        base_ops = f'{baseline[name]['ops_per_sec']:14.1f}' if name in baseline else f'{'-':>14}'
+        print(f'{name:<30}{result['ops_per_sec']:14.1f}{base_ops}{result['peak_kib']:12.1f}')
+
+    regressions = compare_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if args.save:
+        save_baseline({**baseline, **results}, args.baseline)
+        print(f'Saved the baseline to {args.baseline}')
+    elif regressions:
+        raise SystemExit(1)
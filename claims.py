@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, TypedDict
+
+from tiles import SUITED_TILE_ID_NUM, TILE_ID_NUM, MahjongTile, WindPosition
+
+if TYPE_CHECKING:
+    from player import MahjongPlayer
+
+class Claims(TypedDict):
+    # bitmasks of the seats(`WindPosition` values) which can claim the discard tile
+    hu: int
+    kong: int
+    pong: int
+    chow: int  # only the next seat of the discarding one
+
+class ClaimIndex:
+    """
+        The seats which can claim every tile ID when it is discarded, kept up to date by the players of one table as their hands change.
+        Pong, kong and chow are updated on every tile drawn or discarded, the waits of a seat are only indexed again when a tile is
+        discarded by another seat, as the waits are computed on demand by `MahjongPlayer.waits`.
+    """
+    def __init__(self) -> None:
+        # the bitmask of seats for every tile ID
+        self.hu_seats: list[int] = [0] * TILE_ID_NUM
+        self.kong_seats: list[int] = [0] * TILE_ID_NUM
+        self.pong_seats: list[int] = [0] * TILE_ID_NUM
+        self.chow_seats: list[int] = [0] * TILE_ID_NUM
+        self.players: dict[int, MahjongPlayer] = {}  # seat and player
+        self.waits: dict[int, frozenset[MahjongTile]] = {}  # the waits indexed in `self.hu_seats` of every seat
+        self.hu_dirty: int = 0  # the bitmask of seats whose hands changed after the waits are indexed
+
+    def add_player(self, player: MahjongPlayer, position: WindPosition) -> None:
+        """
+            Index the hand of the player at `position`, and keep it up to date as the hand changes.
+
+            Returns:
+                None.
+        """
+        self.players[position.value] = player
+        player.claims = self
+        player.claims_seat = position.value
+        self.rebuild(position.value)
+
+    def rebuild(self, seat: int) -> None:
+        """
+            Index the whole hand of the seat again.
+
+            Returns:
+                None.
+        """
+        bit = 1 << seat
+        counts = self.players[seat].counts
+        for tile_id in range(TILE_ID_NUM):
+            self.hu_seats[tile_id] &= ~bit
+            self._set_count(bit, tile_id, counts[tile_id])
+        for suit_start in range(0, SUITED_TILE_ID_NUM, 9):
+            self._set_chows(seat, suit_start, 0, 9)
+        self.waits[seat] = frozenset()
+        self.hu_dirty |= bit
+
+    def resolve(self, tile: MahjongTile, position: WindPosition) -> Claims:
+        """
+            Find the other seats which can claim `tile` discarded by the seat at `position`.
+
+            Returns:
+                Claims: The seats for every action.
+        """
+        others = 0b1111 & ~(1 << position.value)
+        if self.hu_dirty & others:
+            for seat in range(4):
+                if self.hu_dirty & others & 1 << seat:
+                    self._index_waits(seat)
+        tile_id = tile.tile_id
+        return Claims(
+            hu=self.hu_seats[tile_id] & others,
+            kong=self.kong_seats[tile_id] & others,
+            pong=self.pong_seats[tile_id] & others,
+            chow=self.chow_seats[tile_id] & 1 << (position.value + 1) % 4,
+        )
+
+    def tile_changed(self, seat: int, tile_id: int, count: int) -> None:
+        """
+            Update the index after the count of `tile_id` in the hand of the seat changes to `count`.
+
+            Returns:
+                None.
+        """
+        self._set_count(1 << seat, tile_id, count)
+        if tile_id < SUITED_TILE_ID_NUM:
+            suit_start = tile_id - tile_id % 9
+            number = tile_id - suit_start
+            self._set_chows(seat, suit_start, max(number - 2, 0), min(number + 3, 9))
+        self.hu_dirty |= 1 << seat
+
+    def _index_waits(self, seat: int) -> None:
+        bit = 1 << seat
+        for tile in self.waits[seat]:
+            self.hu_seats[tile.tile_id] &= ~bit
+        waits = self.players[seat].waits
+        for tile in waits:
+            self.hu_seats[tile.tile_id] |= bit
+        self.waits[seat] = waits
+        self.hu_dirty &= ~bit
+
+    def _set_chows(self, seat: int, suit_start: int, number_start: int, number_stop: int) -> None:
+        bit = 1 << seat
+        mask = self.players[seat].suit_masks[suit_start // 9]
+        for number in range(number_start, number_stop):
+            if chow_possible(mask, number):
+                self.chow_seats[suit_start + number] |= bit
+            else:
+                self.chow_seats[suit_start + number] &= ~bit
+
+    def _set_count(self, bit: int, tile_id: int, count: int) -> None:
+        if count >= 2:
+            self.pong_seats[tile_id] |= bit
+        else:
+            self.pong_seats[tile_id] &= ~bit
+        if count == 3:
+            self.kong_seats[tile_id] |= bit
+        else:
+            self.kong_seats[tile_id] &= ~bit
+
+def chow_possible(suit_mask: int, number: int) -> bool:
+    """
+        Whether the numbers in `suit_mask` (see `tiles.counts_to_suit_masks`) can chow the tile with 0-based `number`.
+
+        Returns:
+            bool: True if the other 2 tiles of one chow seq are in hand.
+    """
+    for seq_start in range(max(number - 2, 0), min(number, 6) + 1):
+        seq_mask = 0b111 << seq_start & ~(1 << number)
+        if suit_mask & seq_mask == seq_mask:
+            return True
+    return False
+
+def test_claim_index() -> None:
+    from player import MahjongPlayer
+    claims = ClaimIndex()
+    players = [MahjongPlayer(i) for i in range(4)]
+    for player, position in zip(players, WindPosition):
+        claims.add_player(player, position)
+    players[1].tiles_hold = [MahjongTile('bamboo', number) for number in [2, 3, 5, 5, 5]] + [MahjongTile('dots', 1)] * 2 + [MahjongTile('winds', 1)] * 3 + [MahjongTile('dragons', 1)] * 3
+    players[2].add_tile(MahjongTile('bamboo', 4))
+    players[2].add_tile(MahjongTile('bamboo', 4))
+    result = claims.resolve(MahjongTile('bamboo', 4), WindPosition.EAST)
+    print(result)  # {'hu': 2, 'kong': 0, 'pong': 4, 'chow': 2}
+    players[1].discard_tile(MahjongTile('bamboo', 3))
+    print(claims.resolve(MahjongTile('bamboo', 4), WindPosition.EAST))  # {'hu': 0, 'kong': 0, 'pong': 4, 'chow': 0}
+    print(claims.resolve(MahjongTile('bamboo', 5), WindPosition.NORTH))  # {'hu': 0, 'kong': 2, 'pong': 2, 'chow': 0}
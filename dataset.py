@@ -0,0 +1,352 @@
+import argparse
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+import os
+import random
+from typing import Any, Literal
+
+import numpy as np
+import numpy.typing as npt
+
+from advisor import seat_view
+from agents import MahjongAgent
+from events import LogLevel, log
+from game import MahjongGame, players_num
+from hand_batch import check_legal_hands, random_counts
+from option_config import set_options_config
+from player import MahjongPlayer
+from runner import agent_types, game_seed
+from seeding import derive_seed, spawn_rng
+from tiles import PLAYING_TILE_ID_NUM, TILE_ID_NUM, MahjongTile
+
+# Labeled examples are written as two tables of fixed-width columns, in files of `chunk_rows` rows, named
+# `{table}-{shard:05d}-{chunk:04d}.npz` (or `.arrow`). Only the chunk being filled is kept in memory.
+#   hands: a hand of 3n + 1 tiles and one more tile, labeled by whether they are a legal hand and by the waits of the hand,
+#       `random_hands` has the same columns for the hands of `write_random_hands`
+#   decisions: what a seat sees at every decision of a game, labeled by the choice of its agent
+# The name, dtype, and width of every column, width 0 for a scalar column.
+HAND_COLUMNS: dict[str, tuple[type[np.generic], int]] = {
+    'counts': (np.int8, PLAYING_TILE_ID_NUM),  # the count of every tile ID in the hand of 3n + 1 tiles
+    'tile': (np.int8, 0),  # the tile ID added to the hand
+    'win': (np.bool_, 0),  # whether the hand and the tile are a legal hand, the same as `basic_rules.check_legal_hand`
+    'waits': (np.bool_, PLAYING_TILE_ID_NUM),  # the tiles completing the hand to a legal hand, the same as `hand_table.find_waits`
+}
+DECISION_COLUMNS: dict[str, tuple[type[np.generic], int]] = {
+    'game_idx': (np.int32, 0),
+    'seat': (np.int8, 0),  # the value of the `WindPosition` of the seat
+    'hand': (np.int8, TILE_ID_NUM),  # the count of every tile ID in hand, bonus tiles included
+    'unseen': (np.int8, TILE_ID_NUM),  # the count of every tile ID not seen by the seat, see `advisor.seat_view`
+    'melds_num': (np.int8, 0),
+    'draws_left': (np.int16, 0),
+    'kind': (np.int8, 0),  # the index in `DECISION_KINDS`
+    'tile': (np.int8, 0),  # the discard tile to claim, -1 for the other decisions
+    'choices': (np.int8, 0),  # the bits of `CLAIM_BITS` available to claim, the count of kong seqs to kong, 0 to discard
+    'label': (np.int8, 0),  # the tile ID to discard, the `CLAIM_LABELS` to claim, the index of the kong seq to kong
+}
+DECISION_KINDS: tuple[str, ...] = ('discard', 'claim', 'kong')
+CLAIM_BITS: dict[str, int] = {'hu': 1, 'kong': 2, 'pong': 4, 'chow': 8}
+CLAIM_LABELS: dict[str, int] = {'skip': 0, 'hu': 1, 'kong': 2, 'pong': 3}  # and 4 + the index of the chow seq
+
+FileFormat = Literal['npz', 'arrow']
+
+class ChunkWriter:
+    """
+        Buffer the rows of one table in preallocated columns, and write every `chunk_rows` rows as one file.
+    """
+    def __init__(self, out_dir: str, table: str, shard: int, columns: dict[str, tuple[type[np.generic], int]], chunk_rows: int = 1 << 16, file_format: FileFormat = 'npz', finish: None | Callable[[dict[str, npt.NDArray[Any]]], None] = None) -> None:
+        """
+        Args:
+            out_dir: The directory of the files.
+            table: The name of the table, the prefix of the file names.
+            shard: The index of the writer, so that the writers of all processes write different files.
+            columns: The name, dtype, and width of every column, like `HAND_COLUMNS`.
+            chunk_rows: The count of rows in every file, except the last one.
+            file_format: 'npz' for compressed NumPy files, 'arrow' for Arrow IPC files, which needs pyarrow.
+            finish: Fill the columns computed for a whole chunk at once, before writing.
+        """
+        self.out_dir = out_dir
+        self.table = table
+        self.shard = shard
+        self.chunk_rows = chunk_rows
+        self.file_format = file_format
+        self.finish = finish
+        self.columns: dict[str, npt.NDArray[Any]] = {name: np.zeros((chunk_rows, width) if width else chunk_rows, dtype=dtype) for name, (dtype, width) in columns.items()}
+        self.size: int = 0  # the rows in the current chunk
+        self.chunks_num: int = 0
+        self.rows_num: int = 0  # the rows written to files
+
+    def add(self, **values: Any) -> None:
+        """
+            Add one row, the columns not given are 0.
+
+            Returns:
+                None.
+        """
+        for name, value in values.items():
+            self.columns[name][self.size] = value
+        self.size += 1
+        if self.size == self.chunk_rows:
+            self.flush()
+
+    def add_rows(self, **values: npt.NDArray[Any]) -> None:
+        """
+            Add the rows of whole columns, all of the same length.
+
+            Returns:
+                None.
+        """
+        rows_num = len(next(iter(values.values())))
+        start = 0
+        while start < rows_num:
+            stop = min(start + self.chunk_rows - self.size, rows_num)
+            for name, value in values.items():
+                self.columns[name][self.size:self.size + stop - start] = value[start:stop]
+            self.size += stop - start
+            start = stop
+            if self.size == self.chunk_rows:
+                self.flush()
+
+    def close(self) -> int:
+        """
+            Write the rows left.
+
+            Returns:
+                int: The count of rows written by this writer.
+        """
+        if self.size:
+            self.flush()
+        return self.rows_num
+
+    def flush(self) -> None:
+        """
+            Write the rows of the current chunk as one file, and start the next chunk.
+
+            Returns:
+                None.
+        """
+        arrays = {name: column[:self.size] for name, column in self.columns.items()}
+        if self.finish is not None:
+            self.finish(arrays)
+        path = os.path.join(self.out_dir, f'{self.table}-{self.shard:05d}-{self.chunks_num:04d}.{self.file_format}')
+        if self.file_format == 'arrow':
+            _write_arrow(path, arrays)
+        else:
+            np.savez_compressed(path, **arrays)  # type: ignore[arg-type]
+        self.rows_num += self.size
+        self.chunks_num += 1
+        self.size = 0
+        for column in self.columns.values():
+            column.fill(0)
+
+class DecisionRecorder:
+    """
+        Record the decisions of all seats at the tables of one process, shared by their `RecordingAgent`s. Every discard and every
+        claim of a discard is also a hand example, unless a bonus tile is in hand or discarded.
+    """
+    def __init__(self, out_dir: str, shard: int, chunk_rows: int = 1 << 16, file_format: FileFormat = 'npz') -> None:
+        self.hands = ChunkWriter(out_dir, 'hands', shard, HAND_COLUMNS, chunk_rows, file_format, label_hands)
+        self.decisions = ChunkWriter(out_dir, 'decisions', shard, DECISION_COLUMNS, chunk_rows, file_format)
+        self.game_idx: int = 0  # the index of the game being played
+        self.last_discard: int = -1  # the tile ID of the last discard at the table, the tile to claim
+
+    def add(self, player: MahjongPlayer, kind: str, tile_id: int, choices: int, label: int) -> None:
+        view = seat_view(player)
+        hand = np.bincount(view['tiles_hold'], minlength=TILE_ID_NUM).astype(np.int8)
+        self.decisions.add(
+            game_idx=self.game_idx, seat=_seat(player), hand=hand, unseen=view['unseen'], melds_num=view['melds_num'],
+            draws_left=view['draws_left'], kind=DECISION_KINDS.index(kind), tile=tile_id, choices=choices, label=label,
+        )
+        if kind == 'discard':
+            hand[label] -= 1
+            tile_id = label
+        if 0 <= tile_id < PLAYING_TILE_ID_NUM and not hand[PLAYING_TILE_ID_NUM:].any():
+            self.hands.add(counts=hand[:PLAYING_TILE_ID_NUM], tile=tile_id)
+
+    def close(self) -> dict[str, int]:
+        """
+            Returns:
+                dict: The count of rows written to every table.
+        """
+        return {'hands': self.hands.close(), 'decisions': self.decisions.close()}
+
+class RecordingAgent(MahjongAgent):
+    """
+        Play with `agent`, and add every decision to `recorder`.
+    """
+    def __init__(self, agent: MahjongAgent, recorder: DecisionRecorder) -> None:
+        self.agent = agent
+        self.recorder = recorder
+
+    def choose_claim(self, player: MahjongPlayer, hu_bool: bool, kong_bool: bool, pong_bool: bool, chow_bool: bool, chow_seqs: None | list[list[MahjongTile]]) -> str | int:
+        choice = self.agent.choose_claim(player, hu_bool, kong_bool, pong_bool, chow_bool, chow_seqs)
+        choices = hu_bool * CLAIM_BITS['hu'] | kong_bool * CLAIM_BITS['kong'] | pong_bool * CLAIM_BITS['pong'] | chow_bool * CLAIM_BITS['chow']
+        label = 4 + choice if isinstance(choice, int) else _claim_label(choice)
+        # with 3n + 2 tiles the player claims from its own draw, otherwise the last discard
+        tile_id = self.recorder.last_discard if len(player.tiles_hold) % 3 == 1 else -1
+        self.recorder.add(player, 'claim', tile_id, choices, label)
+        return choice
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        tile = self.agent.choose_discard(player)
+        self.recorder.add(player, 'discard', -1, 0, tile.tile_id)
+        self.recorder.last_discard = tile.tile_id
+        return tile
+
+    def choose_kong(self, player: MahjongPlayer, kong_seqs: list[MahjongTile | list[MahjongTile]]) -> int:
+        kong_idx = self.agent.choose_kong(player, kong_seqs)
+        self.recorder.add(player, 'kong', -1, len(kong_seqs), kong_idx)
+        return kong_idx
+
+    def confirm(self, description: str) -> bool:
+        return self.agent.confirm(description)
+
+def label_hands(arrays: dict[str, npt.NDArray[Any]]) -> None:
+    """
+        Fill the 'win' and 'waits' columns of hand examples from the 'counts' and 'tile' columns, with batched legal hand checks.
+
+        Returns:
+            None.
+    """
+    counts = arrays['counts'].copy()
+    rows = np.arange(len(counts))
+    counts[rows, arrays['tile']] += 1
+    arrays['win'][:] = check_legal_hands(counts)[0]
+    counts[rows, arrays['tile']] -= 1
+    # a tile already 4 in hand makes an invalid hand, which is not legal, the same as `hand_table.find_waits`
+    for tile_id in range(PLAYING_TILE_ID_NUM):
+        counts[:, tile_id] += 1
+        arrays['waits'][:, tile_id] = check_legal_hands(counts)[0]
+        counts[:, tile_id] -= 1
+
+def write_game_examples(out_dir: str, games_num: int, options_config: dict[str, bool | int], master_seed: int = 0, workers: None | int = None, agent: str = 'shanten', chunk_rows: int = 1 << 16, file_format: FileFormat = 'npz', shard_games: int = 1024) -> dict[str, int]:
+    """
+        Play `games_num` headless games, and write the decisions and the hands seen at the decisions. Game `i` is the same game as
+        `runner.play_game(options_config, runner.game_seed(master_seed, i), i, agent)`.
+
+        Args:
+            shard_games: The count of games played by one task, the tasks write their own files.
+
+        Returns:
+            dict: The count of rows written to every table.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = ((_game_shard, out_dir, shard, shard * shard_games, min((shard + 1) * shard_games, games_num), options_config, master_seed, agent, chunk_rows, file_format) for shard in range((games_num + shard_games - 1) // shard_games))
+    rows = {'hands': 0, 'decisions': 0}
+    for shard_rows in _run_tasks(tasks, workers):
+        for table, rows_num in shard_rows.items():
+            rows[table] += rows_num
+    return rows
+
+def write_random_hands(out_dir: str, hands_num: int, seed: int = 0, workers: None | int = None, chunk_rows: int = 1 << 16, file_format: FileFormat = 'npz') -> int:
+    """
+        Write `hands_num` random hand examples, half of the hands are built from melds and a pair, see `hand_batch.random_counts`.
+        Every chunk is one task, seeded with `seeding.derive_seed(seed, 'hands', chunk)`.
+
+        Returns:
+            int: The count of rows written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = ((_random_hands_shard, out_dir, shard, min(chunk_rows, hands_num - shard * chunk_rows), seed, file_format) for shard in range((hands_num + chunk_rows - 1) // chunk_rows))
+    return sum(_run_tasks(tasks, workers))
+
+def _claim_label(choice: str) -> int:
+    # the agents may answer with the short forms of `utils.input_player_action`
+    return {'h': CLAIM_LABELS['hu'], 'k': CLAIM_LABELS['kong'], 'p': CLAIM_LABELS['pong']}.get(choice[:1], CLAIM_LABELS['skip'])
+
+def _game_shard(out_dir: str, shard: int, start: int, stop: int, options_config: dict[str, bool | int], master_seed: int, agent: str, chunk_rows: int, file_format: FileFormat) -> dict[str, int]:
+    recorder = DecisionRecorder(out_dir, shard, chunk_rows, file_format)
+    with log.at_level(LogLevel.SILENT):
+        for game_idx in range(start, stop):
+            seed = game_seed(master_seed, game_idx)
+            agents: list[MahjongAgent] = [RecordingAgent(agent_types[agent](spawn_rng(seed, seat)), recorder) for seat in range(players_num)]
+            recorder.game_idx = game_idx
+            recorder.last_discard = -1
+            game = MahjongGame(options_config, agents, rng=seed)
+            game.start_game()
+            game.play_round()
+    return recorder.close()
+
+def _random_hands_shard(out_dir: str, shard: int, rows_num: int, seed: int, file_format: FileFormat) -> int:
+    shard_seed = derive_seed(seed, 'hands', shard)
+    counts = random_counts(random.Random(shard_seed), rows_num)
+    # remove one of the 14 tiles of every hand as the tile added to the hand
+    picks = np.random.default_rng(shard_seed).integers(14, size=rows_num)
+    tiles = (counts.cumsum(axis=1) > picks[:, None]).argmax(axis=1).astype(np.int8)
+    counts[np.arange(rows_num), tiles] -= 1
+    writer = ChunkWriter(out_dir, 'random_hands', shard, HAND_COLUMNS, rows_num, file_format, label_hands)
+    writer.add_rows(counts=counts, tile=tiles)
+    return writer.close()
+
+def _run_tasks(tasks: Iterable[tuple[Any, ...]], workers: None | int) -> Iterator[Any]:
+    # the same scheme as `runner.iter_games`: at most 2 tasks per worker are in flight
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for func, *args in tasks:
+            yield func(*args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[Any]] = deque()
+        for func, *args in tasks:
+            pending.append(executor.submit(func, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _seat(player: MahjongPlayer) -> int:
+    return player.position.value if player.position is not None else player.idx
+
+def _write_arrow(path: str, arrays: dict[str, npt.NDArray[Any]]) -> None:
+    try:
+        import pyarrow as pa  # type: ignore[import-not-found, import-untyped, unused-ignore]
+    except ImportError as e:
+        raise ImportError('Writing Arrow files needs pyarrow, install it with `pip install pyarrow`, or write .npz files.') from e
+    columns = {
+        name: pa.FixedSizeListArray.from_arrays(pa.array(array.reshape(-1)), array.shape[1]) if array.ndim == 2 else pa.array(array)
+        for name, array in arrays.items()
+    }
+    table = pa.table(columns)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd')) as writer:
+        writer.write_table(table)
+
+def test_write_examples() -> None:
+    import tempfile
+    from hand_table import find_waits
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        print(write_random_hands(out_dir, 1000, workers=1, chunk_rows=300))  # 1000
+        rows = write_game_examples(out_dir, 6, set_options_config(), workers=1, chunk_rows=100, shard_games=4)
+        files = sorted(os.listdir(out_dir))
+        chunks = {name: np.load(os.path.join(out_dir, name)) for name in files}
+        print(files[0], files[-1], len(chunks['random_hands-00003-0000.npz']['tile']))  # decisions-00000-0000.npz random_hands-00003-0000.npz 100
+        # every chunk has `chunk_rows` rows, except the last one of every shard
+        print(all(len(chunks[name]['label']) == 100 for name in files[:-1] if name.startswith('decisions') and name[:15] == files[files.index(name) + 1][:15]))  # True
+        print(sum(len(chunk['label']) for name, chunk in chunks.items() if name.startswith('decisions')) == rows['decisions'])  # True
+        mismatch = 0
+        for name, chunk in chunks.items():
+            if 'hands' in name:
+                for counts, tile, win, waits in zip(chunk['counts'], chunk['tile'], chunk['win'], chunk['waits']):
+                    mismatch += win != bool(waits[tile]) or np.flatnonzero(waits).tolist() != find_waits(counts.tolist())
+        print(mismatch)  # 0
+        decisions = chunks['decisions-00000-0000.npz']
+        discards = decisions['kind'] == DECISION_KINDS.index('discard')
+        print(decisions['hand'].shape, bool((decisions['hand'][discards, decisions['label'][discards]] > 0).all()))  # (100, 42) True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write labeled hand and decision examples in chunks of compressed NumPy or Arrow files.')
+    parser.add_argument('out_dir', help='The directory of the files.')
+    parser.add_argument('--games', type=int, default=0, help='Write the decisions and the hands of this count of headless games.')
+    parser.add_argument('--random-hands', type=int, default=0, help='Write this count of random hand examples.')
+    parser.add_argument('--seed', type=int, default=0, help='The master seed.')
+    parser.add_argument('--workers', type=int, default=None, help='The count of worker processes, os.cpu_count() by default.')
+    parser.add_argument('--agent', choices=list(agent_types), default='shanten', help='The bot of all players.')
+    parser.add_argument('--chunk-rows', type=int, default=1 << 16, help='The count of rows in every file.')
+    parser.add_argument('--format', choices=['npz', 'arrow'], default='npz', help='Compressed NumPy files, or Arrow IPC files with pyarrow.')
+    args = parser.parse_args()
+
+    if args.random_hands:
+        print(f'hands: {write_random_hands(args.out_dir, args.random_hands, args.seed, args.workers, args.chunk_rows, args.format)} rows')
+    if args.games:
+        for table, rows_num in write_game_examples(args.out_dir, args.games, set_options_config(), args.seed, args.workers, args.agent, args.chunk_rows, args.format).items():
+            print(f'{table}: {rows_num} rows')
@@ -0,0 +1,113 @@
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from enum import IntEnum
+import json
+from typing import Any, TextIO
+
+class LogLevel(IntEnum):
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    SILENT = 100  # no events at all, for headless games
+
+class LogEvent:
+    """
+        One structured event: the event name, the message template, and the fields to fill the template.
+        The message is only formatted when a sink asks for it.
+    """
+    __slots__ = ('level', 'event', 'template', 'fields')
+
+    def __init__(self, level: LogLevel, event: str, template: str, fields: dict[str, Any]) -> None:
+        self.level = level
+        self.event = event
+        self.template = template
+        self.fields = fields
+
+    @property
+    def message(self) -> str:
+        return self.template.format(**self.fields)
+
+LogSink = Callable[[LogEvent], None]
+
+class EventLogger:
+    """
+        Send events to the sinks, events below `self.level` are dropped before any formatting.
+
+        For arguments which are costly to compute, guard the call with `self.debug_on` or `self.info_on`:
+
+            if log.debug_on:
+                log.debug('check_pong', 'tiles_hold: {tiles_hold}', tiles_hold=sorted(tiles_hold))
+    """
+    def __init__(self, level: LogLevel = LogLevel.INFO, sinks: None | list[LogSink] = None) -> None:
+        self.sinks: list[LogSink] = sinks if sinks is not None else [console_sink]
+        self.set_level(level)
+
+    @contextmanager
+    def at_level(self, level: LogLevel) -> Iterator[None]:
+        """
+            Temporarily set the level, e.g., `with log.at_level(LogLevel.SILENT):` to run games silently.
+        """
+        level_prev = self.level
+        self.set_level(level)
+        try:
+            yield
+        finally:
+            self.set_level(level_prev)
+
+    def debug(self, event: str, template: str, **fields: Any) -> None:
+        if self.debug_on:
+            self.emit(LogEvent(LogLevel.DEBUG, event, template, fields))
+
+    def emit(self, log_event: LogEvent) -> None:
+        for sink in self.sinks:
+            sink(log_event)
+
+    def info(self, event: str, template: str, **fields: Any) -> None:
+        if self.info_on:
+            self.emit(LogEvent(LogLevel.INFO, event, template, fields))
+
+    def set_level(self, level: LogLevel) -> None:
+        self.level = level
+        self.debug_on = level <= LogLevel.DEBUG
+        self.info_on = level <= LogLevel.INFO
+        self.warning_on = level <= LogLevel.WARNING
+
+    def warning(self, event: str, template: str, **fields: Any) -> None:
+        if self.warning_on:
+            self.emit(LogEvent(LogLevel.WARNING, event, template, fields))
+
+class JsonlSink:
+    """
+        Write every event as one JSON line, fields are written with `str` if they are not JSON types.
+    """
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+
+    def __call__(self, log_event: LogEvent) -> None:
+        record = {'level': log_event.level.name, 'event': log_event.event, **log_event.fields}
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+class ListSink:
+    """
+        Keep all events in memory.
+    """
+    def __init__(self) -> None:
+        self.events: list[LogEvent] = []
+
+    def __call__(self, log_event: LogEvent) -> None:
+        self.events.append(log_event)
+
+def console_sink(log_event: LogEvent) -> None:
+    print(log_event.message)
+
+# The logger shared by the game engine
+log: EventLogger = EventLogger()
+
+def test_event_logger() -> None:
+    sink = ListSink()
+    logger = EventLogger(LogLevel.INFO, [sink])
+    logger.debug('draw', 'Player{player} draws {tile}', player=0, tile='bamboo1')
+    logger.info('discard', 'Player{player} discards {tile}', player=0, tile='bamboo1')
+    with logger.at_level(LogLevel.SILENT):
+        logger.warning('discard', 'Player{player} discards {tile}', player=1, tile='dots2')
+    print([(log_event.event, log_event.message) for log_event in sink.events])  # [('discard', 'Player0 discards bamboo1')]
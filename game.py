@@ -1,9 +1,19 @@
-from collections import deque
 import random
-
-from player import ActionPlayer, MahjongPlayer, check_chow, check_concealed_kong, check_exposed_kong, check_exposed_kong_from_pong, check_hu_from_discard, check_hu_from_wall, check_pong
-from tiles import MahjongTile, WindPosition, shuffle_tiles
-from utils import input_list, input_yes
+from typing import TYPE_CHECKING, Literal, TypedDict
+
+from agents import MahjongAgent
+from claims import ClaimIndex, Claims
+from events import log
+from player import ActionPlayer, MahjongPlayer, check_chow, check_concealed_kong, check_exposed_kong_from_pong, check_hu_from_discard, check_hu_from_wall
+from record import Action, GameRecord
+from rules import RuleSet, compile_rules
+from scoring import Score, ScoreTable, WinContext, score_hand
+from seeding import new_seed
+from tiles import TILES, MahjongTile, WindPosition
+from wall import Wall
+
+if TYPE_CHECKING:
+    from profiler import GameProfiler
 
 dice_num:int = 2
 
@@ -11,39 +21,68 @@ players_num:int = 4
 
 positions_seq: list[WindPosition] = [WindPosition.EAST, WindPosition.SOUTH, WindPosition.WEST, WindPosition.NORTH]
 
+class RoundResult(TypedDict):
+    dealer_position: WindPosition
+    hu_position: None | WindPosition  # None when draw
+    hu_player_idx: int  # -1 when draw
+    hu_type: None | Literal['wall', 'discard']
+    turns: int
+    fan: int  # the fan of the winning hand, 0 when draw
+
 class MahjongGame:
-    def __init__(self, options_config: dict[str, bool]) -> None:
-        self.tiles: None | deque[MahjongTile] = None
-        self.options_config: dict[str, bool] = options_config
-        self.players: list[MahjongPlayer] = [MahjongPlayer(i) for i in range(players_num)]
+    def __init__(self, options_config: dict[str, bool | int] | RuleSet, agents: None | list[MahjongAgent] = None, record: bool = False, profiler: 'None | GameProfiler' = None, rng: None | int | random.Random = None) -> None:
+        """
+        Args:
+            options_config: The options from `option_config.set_options_config`, or compiled by `rules.compile_rules`.
+            agents: The agent of every player, by default every player is asked with console prompts(`ConsoleAgent`).
+            record: Whether to record every round in `self.record`, see `record.GameRecord`.
+            profiler: Time the phases and count the rule checks of this game, see `profiler.GameProfiler`.
+            rng: The seed of the random stream of this table to shuffle and roll dice, or the stream itself. A fresh seed by default,
+                so that every table can be replayed from `self.seed`. Derive the streams of the agents with `seeding.spawn_rng`.
+        """
+        if isinstance(rng, random.Random):
+            self.seed: None | int = None  # unknown when the stream is given
+            self.rng: random.Random = rng
+        else:
+            self.seed = rng if rng is not None else new_seed()
+            self.rng = random.Random(self.seed)
+        self.wall: Wall = Wall()  # reused by every round
+        self.claims: ClaimIndex = ClaimIndex()  # the seats which can claim every tile
+        self.rules: RuleSet = compile_rules(options_config)  # shared by all games with the same options
+        self.options_config: dict[str, bool | int] = self.rules.options_config
+        self.players: list[MahjongPlayer] = [MahjongPlayer(i, agents[i] if agents else None, self.rules) for i in range(players_num)]
         self.position_players: None | dict[WindPosition, MahjongPlayer] = None  # map position and player
         self.dealer_position: WindPosition = WindPosition.EAST  # The player at EAST position is the starting dealer
         self.current_position: WindPosition = self.dealer_position  # Current position in game; The starting position is the starting dealer
         self.joker: None | MahjongTile = None
         self.draw_tile_bool: bool = True
         self.hu_position: WindPosition | None = None
+        self.hu_type: None | Literal['wall', 'discard'] = None
+        self.hu_score: None | Score = None  # the score of the winning hand in the current round
+        self.score_table: ScoreTable = self.rules.score_table  # the patterns to score the winning hands
+        self.turns: int = 0  # turns in the current round
         self.game_over: bool = False
+        self.record_bool: bool = record
+        self.record: None | GameRecord = None  # the record of the current round
+        if profiler is not None:
+            profiler.attach(self)
 
-    def build_walls(self) -> list[MahjongTile]:
+    def build_walls(self) -> int:
         """
-        Shuffle tiles, then build wall at every table position.
+        Shuffle tiles in `self.wall`, then build wall at every table position.
 
         Returns:
-            list: The initial tiles after shuffle.
+            int: The count of tiles in the wall at every table position.
         """
-        tiles = shuffle_tiles(self.options_config)
-        assert len(tiles) % 4 == 0, 'The number of tiles is not divisible by 4.'
-        part_tiles_num = len(tiles) // 4
-        print('After shuffling:')
-        print(tiles)
-
-        for i, position in enumerate(positions_seq):
-            print(f'The tiles at position {position}')
-            for idx, tile in enumerate(tiles[i * part_tiles_num : (i + 1) * part_tiles_num]):
-                tile.wall_pos = position
-                tile.wall_idx = idx
-                print(f'Tile {tile.tile_type}{tile.number} is at {tile.wall_idx}')
-        return tiles
+        self.wall.shuffle(self.rules.tile_ids, self.rng)
+        assert len(self.wall) % 4 == 0, 'The number of tiles is not divisible by 4.'
+        part_tiles_num = len(self.wall) // 4
+        if log.debug_on:
+            tiles = list(self.wall)
+            log.debug('shuffle', 'After shuffling:\n{tiles}', tiles=tiles)
+            for i, position in enumerate(positions_seq):
+                log.debug('wall', 'The tiles at position {position}: {tiles}', position=position, tiles=tiles[i * part_tiles_num : (i + 1) * part_tiles_num])
+        return part_tiles_num
 
     def check_current_player(self, current_player: MahjongPlayer, action_choices: dict[WindPosition, ActionPlayer], draw_tile: None | MahjongTile) -> None:
         cur_pos = self.find_position(current_player)
@@ -51,16 +90,18 @@ class MahjongGame:
         pos_actions['player_idx'] = current_player.idx
 
         # when check hu, the hu_tiles should contain that draw_tile
-        action_hu = check_hu_from_wall(current_player.tiles_hold)
-        print(f'debug hu from draw: action_hu{action_hu}')
+        action_hu = check_hu_from_wall(current_player.tiles_hold, self.joker)
+        if log.debug_on:
+            log.debug('check_hu', 'debug hu from draw: action_hu{action_hu}', action_hu=action_hu)
         if action_hu != [] and action_hu and draw_tile:
             pos_actions['hu'] = {cur_pos: action_hu}  # the value of the key 'hu' is the completed legal hand
 
         # when check kong, draw_tile can be None
-        action_kong = check_concealed_kong(current_player.tiles_hold)
-        action_kong_from_pong = check_exposed_kong_from_pong(current_player.tiles_hold, current_player.pong)
+        action_kong = check_concealed_kong(current_player.counts)
+        action_kong_from_pong = check_exposed_kong_from_pong(current_player.counts, current_player.pong)
         action_kong.extend(action_kong_from_pong)  # type: ignore
-        print(f'debug kong from draw: action_kong{action_kong}')
+        if log.debug_on:
+            log.debug('check_kong', 'debug kong from draw: action_kong{action_kong}', action_kong=action_kong)
 
         if action_kong != [] and action_kong:
             pos_actions['kong'] = {cur_pos: action_kong}  # type: ignore
@@ -71,43 +112,47 @@ class MahjongGame:
             self.kong_from_wall(current_player, pos_actions)
 
     def check_other_players(self, current_player: MahjongPlayer, tile_to_discard: MahjongTile, action_choices: dict[WindPosition, ActionPlayer]) -> None:
-        if isinstance(current_player.position, WindPosition):
-            cur_pos = self.find_position(current_player)
-            for player in self.players:
-                if player != current_player:
-                    pos_actions = action_choices[self.find_position(player)]
-                    pos_actions['player_idx'] = player.idx
-                    print(f'Player{player.idx} check action options.')
-                    action_hu = check_hu_from_discard(player.tiles_hold, tile_to_discard)
-                    if action_hu != [] and action_hu:
-                        pos_actions['hu'] = {cur_pos: action_hu}  # the value of the key 'hu' is the completed legal hand
-                    kong_tile = check_exposed_kong(player.tiles_hold, tile_to_discard)
-                    if kong_tile:
-                        pos_actions['kong'] = {cur_pos: [kong_tile] * 4}
-                        # also as an action to pong
-                        pos_actions['pong'] = {cur_pos: [kong_tile] * 3}
-                    action_pong = check_pong(player.tiles_hold, tile_to_discard)
-                    if action_pong != [] and action_pong:
-                        pos_actions['pong'] = {cur_pos: action_pong}
-                    # Next player, check hu, kong, pong, and chow
-                    if player.position == current_player.position + 1:
-                        pos_actions['chow'] = check_chow(player.tiles_hold, tile_to_discard)
-                    action = player.choose_action(pos_actions)
-                    print(f'debug action selections: action: {action}, {type(action)}')
-                    if action in {'hu', 'h'}:
-                        action_choices[self.find_position(player)] = ActionPlayer(player_idx=pos_actions['player_idx'], chow=[], hu=pos_actions['hu'], kong={}, pong={})
-                    elif action in {'kong', 'k'}:
-                        action_choices[self.find_position(player)] = ActionPlayer(player_idx=pos_actions['player_idx'], chow=[], hu={}, kong=pos_actions['kong'], pong={})
-                    elif action in {'pong', 'p'}:
-                        action_choices[self.find_position(player)] = ActionPlayer(player_idx=pos_actions['player_idx'], chow=[], hu={}, kong={}, pong=pos_actions['pong'])
-                    elif isinstance(action, int):
-                        print(f'debug {[pos_actions['chow'][action]]}')
-                        action_choices[self.find_position(player)] = ActionPlayer(player_idx=pos_actions['player_idx'], chow=[pos_actions['chow'][action]], hu={}, kong={}, pong={})
-                    elif action in {'skip', 's', ''}:
-                        action_choices[self.find_position(player)] = ActionPlayer(player_idx=pos_actions['player_idx'], chow=[], hu={}, kong={}, pong={})
-                    print(pos_actions)
-            print(action_choices)
-            self.decide_other_player_action(current_player.position, action_choices, tile_to_discard)
+        if isinstance(current_player.position, WindPosition) and self.position_players is not None:
+            cur_pos = current_player.position
+            # one lookup for the seats which can claim the discard tile, only these players are asked
+            claims = self.claims.resolve(tile_to_discard, cur_pos)
+            claim_seats = claims['hu'] | claims['kong'] | claims['pong'] | claims['chow']
+            if log.debug_on:
+                log.debug('claims', 'Claims of {tile}: {claims}', tile=tile_to_discard, claims=claims)
+            # the seats which choose every action
+            chosen = Claims(hu=0, kong=0, pong=0, chow=0)
+            for pos in positions_seq:
+                seat_bit = 1 << pos.value
+                if not claim_seats & seat_bit:
+                    continue
+                player = self.position_players[pos]
+                pos_actions = action_choices[pos]
+                pos_actions['player_idx'] = player.idx
+                if claims['hu'] & seat_bit:
+                    pos_actions['hu'] = {cur_pos: check_hu_from_discard(player.tiles_hold, tile_to_discard, self.joker)}  # the value of the key 'hu' is the completed legal hand
+                if claims['kong'] & seat_bit:
+                    pos_actions['kong'] = {cur_pos: [tile_to_discard] * 4}
+                if claims['pong'] & seat_bit:
+                    pos_actions['pong'] = {cur_pos: [tile_to_discard] * 3}
+                if claims['chow'] & seat_bit:
+                    pos_actions['chow'] = check_chow(player.suit_masks, tile_to_discard)
+                action = player.choose_action(pos_actions)
+                if log.debug_on:
+                    log.debug('action', 'debug action selections: action: {action}', action=action)
+                if action in {'hu', 'h'}:
+                    chosen['hu'] |= seat_bit
+                elif action in {'kong', 'k'}:
+                    chosen['kong'] |= seat_bit
+                elif action in {'pong', 'p'}:
+                    chosen['pong'] |= seat_bit
+                elif isinstance(action, int):
+                    chosen['chow'] |= seat_bit
+                    pos_actions['chow'] = [pos_actions['chow'][action]]
+                if log.debug_on:
+                    log.debug('actions', '{pos_actions}', pos_actions=pos_actions)
+            if log.debug_on:
+                log.debug('actions', 'Chosen claims: {chosen}', chosen=chosen)
+            self.decide_other_player_action(cur_pos, chosen, action_choices, tile_to_discard)
 
     def choose_table_position(self) -> None:
         """
@@ -123,7 +168,8 @@ class MahjongGame:
                     player.is_dealer = True
                 # set position for every player
                 player.position = pos
-                print(f'Player{player.idx} sits at position {pos}')
+                self.claims.add_player(player, pos)
+                log.info('seat', 'Player{player} sits at position {position}', player=player.idx, position=pos)
 
     def chow(self, player_chow_pos: WindPosition, player_chow_seq: list[list[MahjongTile]], tile: MahjongTile) -> None:
         """
@@ -135,24 +181,23 @@ class MahjongGame:
         if self.position_players is not None:
             player_chow = self.position_players[player_chow_pos]
             player_chow.declare_chow(player_chow_seq, tile)
+            if self.record is not None:
+                self.record.add_action(Action.CHOW, player_chow_pos, min(player_chow_seq[0]))
             self.draw_tile_bool = False
             self.current_position = player_chow_pos
 
     def deal_starting_tiles(self) -> None:
         """
         Build walls, roll dice by the dealer, and start drawing tiles for 4 players.
-        Set `self.tiles` begin with the one whose position determined by the dice.
+        Build `self.wall` to begin with the one whose position determined by the dice.
 
         Returns:
             None.
         """
         if self.position_players and self.options_config:
-            tiles = self.build_walls()
-            print(f'before decide starting tiles position, len(tile):{len(tiles)}')
-            print(tiles)
-            part_tiles_num = len(tiles) // 4
+            part_tiles_num = self.build_walls()
             pos_num, wall_idx = self.decide_initial_draw_position()
-            print(f'pos_num at {pos_num}, wall_idx at {wall_idx}')
+            log.debug('draw_position', 'pos_num at {pos_num}, wall_idx at {wall_idx}', pos_num=pos_num, wall_idx=wall_idx)
             if pos_num % 4 == 1:
                 pos_start = self.dealer_position
                 pos_num = 0
@@ -165,12 +210,14 @@ class MahjongGame:
             else:
                 pos_start = self.dealer_position + 3
                 pos_num = 3
-            print(f'pos_num at {pos_start}, wall_idx at {wall_idx}')
+            log.info('draw_position', 'Start drawing at position {position}, after {wall_idx} stacks', position=pos_start, wall_idx=wall_idx)
             # Skip `wall_idx` stacks in the wall at the given position
-            tiles = tiles[part_tiles_num * pos_num + wall_idx * 2 :] + tiles[0 : part_tiles_num * pos_num + wall_idx * 2]
-            print(f'after decide starting tiles position, len(tile):{len(tiles)}')
-            print(tiles)
-            self.tiles = deque(tiles)
+            self.wall.start = part_tiles_num * pos_num + wall_idx * 2
+            if log.debug_on:
+                log.debug('wall', 'after decide starting tiles position, len(tile):{tiles_num}\n{tiles}', tiles_num=len(self.wall), tiles=list(self.wall))
+            if self.record_bool:
+                seat_players = [self.position_players[position].idx for position in positions_seq]
+                self.record = GameRecord(self.options_config, self.dealer_position, seat_players, self.wall, self.seed or 0)
 
             # draw 13 tiles for every player, 4 * (4 -1 ) + 1 = 13
             for i in range(4):
@@ -179,20 +226,20 @@ class MahjongGame:
                     player = self.position_players[self.current_position + idx_pos]
                     # draw 1 stack(4 tiles) until all players have 12 tiles
                     # draw one last tile
-                    player.draw_tiles(self.tiles, 4) if i !=3 else player.draw_tiles(self.tiles)
+                    player.draw_tiles(self.wall, 4) if i !=3 else player.draw_tiles(self.wall)
             # draw one more tile for dealer to have 14 tiles, and no need for the dealer to draw tile at the beginning of the round with 14 tiles in hand
-            self.position_players[self.dealer_position].draw_tiles(self.tiles)
+            self.position_players[self.dealer_position].draw_tiles(self.wall)
             self.draw_tile_bool = False
 
-            # decide joker tile
-            joker_c = self.options_config['joker']
-            # if joker_c is bool, both isinstance(joker_c, int) and isinstance(joker_c, bool) are True
-            # Here if joker_c is bool and False, the game doesn't use joker tile.
-            if joker_c and isinstance(joker_c, int):
-                draw_for_joker = self.tiles.popleft()
-                print(f'Draw one more from the wall: {draw_for_joker}. \nThe joker tile in the game: {draw_for_joker + joker_c}')
+            # decide joker tile, the offset is 0 or 1 from the drawn tile, see `option_config.decide_joker_config`
+            if self.rules.joker_ids is not None:
+                draw_for_joker = self.wall.draw()
+                self.joker = TILES[self.rules.joker_ids[draw_for_joker.tile_id]]
+                log.info('joker', 'Draw one more from the wall: {tile}. \nThe joker tile in the game: {joker}', tile=draw_for_joker, joker=self.joker)
+                for player in self.players:
+                    player.set_joker(self.joker)
 
-            input_yes(f'Start game? (yes, default): ')
+            self.position_players[self.dealer_position].agent.confirm(f'Start game? (yes, default): ')
 
     def decide_initial_draw_position(self) -> tuple[int, int]:
         """
@@ -201,37 +248,51 @@ class MahjongGame:
         Returns:
             tuple[int, int]: The sum of dice is to decide the start position, the min one of dice is to decide the stack index at that position.
         """
-        input_dealer_bool = input_yes(f'To determine initial draw position, dealer roll dice? (yes, default): ')
-        if input_dealer_bool:
-            dice_rolls = [random.randint(1, 6) for _ in range(2)]
+        dealer = self.position_players[self.dealer_position] if self.position_players else self.players[0]
+        dealer.agent.confirm(f'To determine initial draw position, dealer roll dice? (yes, default): ')
+        dice_rolls = [self.rng.randint(1, 6) for _ in range(2)]
         pos_num, wall_idx = sum(dice_rolls), min(dice_rolls)
         return pos_num, wall_idx
 
-    def decide_other_player_action(self, current_player_pos: WindPosition, action_choices: dict[WindPosition, ActionPlayer], tile: MahjongTile) -> None:
-        player_chow_seq = None
+    def decide_other_player_action(self, current_player_pos: WindPosition, chosen: Claims, action_choices: dict[WindPosition, ActionPlayer], tile: MahjongTile) -> None:
+        """
+        Carry out the claim with the highest priority.
+
+        Args:
+            current_player_pos: The position of the player discarding `tile`.
+            chosen: The seats which choose every action, from `self.check_other_players`.
+            action_choices: The actions of every position, the legal hand of Hu and the chow seq are used.
+            tile: The discard tile.
+
+        Returns:
+            None.
+        """
+        if not (chosen['hu'] | chosen['kong'] | chosen['pong'] | chosen['chow']):
+            return
         player_kong_pos = None
         player_pong_pos = None
 
         for i in range(1, players_num):
-            if action_choices[current_player_pos + i]['hu'] != {}:
+            pos = current_player_pos + i
+            seat_bit = 1 << pos.value
+            if chosen['hu'] & seat_bit:
                 # Hu takes the highest priority; if multiple players can Hu, the player closest to the dealer takes precedence
-                self.hu_from_discard(action_choices[current_player_pos + i]['hu'], current_player_pos + i, current_player_pos, tile)
-            if action_choices[current_player_pos + i]['kong'] != {} and player_kong_pos == None:
-                player_kong_pos = current_player_pos + i
-            if action_choices[current_player_pos + i]['pong'] != {} and player_pong_pos == None:
-                player_pong_pos = current_player_pos + i
-            if action_choices[current_player_pos + i]['chow'] != []:
-                player_chow_seq = action_choices[current_player_pos + i]['chow']
+                self.hu_from_discard(action_choices[pos]['hu'], pos, current_player_pos, tile)
+                return
+            if chosen['kong'] & seat_bit and player_kong_pos is None:
+                player_kong_pos = pos
+            if chosen['pong'] & seat_bit and player_pong_pos is None:
+                player_pong_pos = pos
 
         # priority: kong/pong > chow
-        if player_kong_pos:
+        if player_kong_pos is not None:
             # at most 1 player can appear in the list
             self.exposed_kong(player_kong_pos, tile)
-        elif player_pong_pos:
+        elif player_pong_pos is not None:
             # at most 1 player can appear in the list
             self.pong(player_pong_pos, tile)
-        elif player_chow_seq:
-            self.chow(current_player_pos + 1, player_chow_seq, tile)
+        elif chosen['chow']:
+            self.chow(current_player_pos + 1, action_choices[current_player_pos + 1]['chow'], tile)
 
     def decide_players_position(self, dice_rolls_players: list[int]) -> None:
         """
@@ -248,8 +309,7 @@ class MahjongGame:
         players_position = {pos: player for pos, (_, player) in zip(positions_seq, sorted_players)}
         self.position_players = players_position
         self.players = [player for _, player in sorted_players]
-        print(f'Already determined the dealer: Player{players_position[WindPosition.EAST].idx}')
-        print(f'self.players: {self.players}')
+        log.info('dealer', 'Already determined the dealer: Player{player}', player=players_position[WindPosition.EAST].idx)
         self.choose_table_position()
 
     def determine_first_dealer(self) -> None:
@@ -261,17 +321,18 @@ class MahjongGame:
         """
         dice_rolls_players = []
         for i in range(players_num):
-            input_bool = input_yes(f'To determine dealer, Player {i} roll dice? (yes, default): ')
-            if input_bool:
-                dice_rolls = [random.randint(1, 6) for _ in range(2)]
-                print(f'Player{i} roll dice: {dice_rolls}')
-                dice_rolls_players.append(sum(dice_rolls))
+            self.players[i].agent.confirm(f'To determine dealer, Player {i} roll dice? (yes, default): ')
+            dice_rolls = [self.rng.randint(1, 6) for _ in range(2)]
+            log.info('dice', 'Player{player} roll dice: {dice_rolls}', player=i, dice_rolls=dice_rolls)
+            dice_rolls_players.append(sum(dice_rolls))
         self.decide_players_position(dice_rolls_players)
 
     def exposed_kong(self, player_kong_pos: WindPosition, tile: MahjongTile) -> None:
-        if self.position_players is not None and self.tiles is not None:
+        if self.position_players is not None:
             player_kong = self.position_players[player_kong_pos]
-            player_kong.declare_exposed_kong(self.tiles, tile)
+            player_kong.declare_exposed_kong(self.wall, tile)
+            if self.record is not None:
+                self.record.add_action(Action.EXPOSED_KONG, player_kong_pos, tile)
             self.draw_tile_bool = False
             self.current_position = player_kong_pos
 
@@ -286,26 +347,37 @@ class MahjongGame:
         if self.position_players is not None:
             player_hu = self.position_players[player_hu_pos]
             player_hu.call_hu_from_discard(hu_tiles, tile, self.position_players[current_player_pos].idx)
+            if self.record is not None:
+                self.record.add_action(Action.HU_DISCARD, player_hu_pos, tile)
             self.hu_position = player_hu_pos
+            self.hu_type = 'discard'
+            self.hu_score = self.score_hu(player_hu, player_hu.tiles_hold + [tile], False)
 
     def hu_from_wall(self, pos_actions: ActionPlayer, tile: MahjongTile) -> None:
         if self.position_players is not None:
-            print(f'debug hu from wall, pos_actions:{pos_actions}')
+            log.debug('hu', 'debug hu from wall, pos_actions:{pos_actions}', pos_actions=pos_actions)
             player_hu = self.position_players[self.current_position]
             player_hu.call_hu_from_wall(pos_actions['hu'], tile)
+            if self.record is not None:
+                self.record.add_action(Action.HU_WALL, self.current_position, tile)
             self.hu_position = self.current_position
+            self.hu_type = 'wall'
+            self.hu_score = self.score_hu(player_hu, player_hu.tiles_hold, True)
 
     def kong_from_wall(self, current_player: MahjongPlayer, pos_actions: ActionPlayer) -> None:
-        print(f'debug kong from wall, pos_actions:{pos_actions}')
+        log.debug('kong', 'debug kong from wall, pos_actions:{pos_actions}', pos_actions=pos_actions)
         kong_seqs = pos_actions['kong'][self.current_position]
-        if isinstance(kong_seqs, list) and isinstance(self.tiles, deque):
-            print(f'Self kong: {kong_seqs}')
-            kong_idx = input_list(f'Which seq to kong: {' '.join(f'{i}.{kong_seqs[i]}' for i in range(len(kong_seqs)))}?(Only input number) ', [f'{i}' for i in range(len(kong_seqs))], 'Invalid Kong seq.')
-            kong_seq = kong_seqs[int(kong_idx)]
+        if isinstance(kong_seqs, list):
+            log.info('kong', 'Self kong: {kong_seqs}', kong_seqs=kong_seqs)
+            kong_seq = kong_seqs[current_player.agent.choose_kong(current_player, kong_seqs)]
             if isinstance(kong_seq, MahjongTile):
-                current_player.declare_exposed_kong_from_pong(self.tiles, kong_seq)
+                current_player.declare_exposed_kong_from_pong(self.wall, kong_seq)
+                if self.record is not None:
+                    self.record.add_action(Action.KONG_FROM_PONG, self.current_position, kong_seq)
             elif isinstance(kong_seq, list) and len(kong_seq) == 4:
-                current_player.declare_concealed_kong(self.tiles, kong_seq)
+                current_player.declare_concealed_kong(self.wall, kong_seq)
+                if self.record is not None:
+                    self.record.add_action(Action.CONCEALED_KONG, self.current_position, kong_seq[0])
             self.draw_tile_bool = False
 
     def next_dealer(self) -> None:
@@ -329,52 +401,81 @@ class MahjongGame:
         """
         self.current_position = self.current_position + 1
 
-    def pong(self, player_pong_pos: WindPosition, tile: MahjongTile) -> None:
-        if self.position_players is not None:
-            player_pong = self.position_players[player_pong_pos]
-            player_pong.declare_pong(tile)
-            self.draw_tile_bool = False
-            self.current_position = player_pong_pos
+    def play_round(self) -> RoundResult:
+        """
+        Play the dealt round until one player calls Hu or no tiles are left in the wall, every decision is made by the agents.
 
-    def run(self) -> None:
-        self.start_game()
-        tile_to_discard = None
-        while self.tiles and len(self.tiles) > 0 and self.position_players is not None and not self.game_over:
+        Returns:
+            RoundResult: The winner and how the round ends.
+        """
+        while self.wall and self.position_players is not None and self.hu_position is None:
+            self.turns += 1
             draw_tile: None | MahjongTile = None
             current_player = self.position_players[self.current_position]
             if self.draw_tile_bool:
-                draw_tile = current_player.draw_tiles(self.tiles)
-            current_player.tiles_hold.sort(key=lambda x: f'{x.tile_type}{x.number}')
-            print('==================================================================')
-            print(f'Position {self.current_position}: Player {current_player.idx}\'s hand: {current_player.tiles_hold}')
+                draw_tile = current_player.draw_tiles(self.wall)
+                if self.record is not None:
+                    self.record.add_action(Action.DRAW, self.current_position, draw_tile)
+            current_player.tiles_hold.sort(key=lambda x: x.tile_id)
+            if log.info_on:
+                log.info('hand', '==================================================================\nPosition {position}: Player {player}\'s hand: {tiles_hold}', position=self.current_position, player=current_player.idx, tiles_hold=list(current_player.tiles_hold))
             action_choices = self.reset_players_actions()
             self.check_current_player(current_player, action_choices, draw_tile)
             self.draw_tile_bool = True
 
-            if self.tiles and self.hu_position is None:
-                tiles_check = [f'{tile.tile_type}{tile.number}'for tile in current_player.tiles_hold]
-                discard_tile = input_list(f'For Player{current_player.idx} Choose a tile to discard (e.g., bamboo5): ', tiles_check, 'Please enter the existing tile in your hand.')
-                tile_to_discard = MahjongTile.get_tiles_from_string(discard_tile)
-                print(f'decide to discard: {tile_to_discard}')
+            if self.wall and self.hu_position is None:
+                tile_to_discard = current_player.agent.choose_discard(current_player)
                 current_player.discard_tile(tile_to_discard)
-                print(f'Player{current_player.idx} discards {discard_tile}')
+                if self.record is not None:
+                    self.record.add_action(Action.DISCARD, self.current_position, tile_to_discard)
+                log.info('discard', 'Player{player} discards {tile}', player=current_player.idx, tile=tile_to_discard)
                 # Every time one player discard one tile, must check other players
                 self.check_other_players(current_player, tile_to_discard, action_choices)
                 if self.draw_tile_bool:
                     self.next_player()
 
+        hu_player_idx = self.position_players[self.hu_position].idx if self.position_players and self.hu_position is not None else -1
+        fan = self.hu_score['fan'] if self.hu_score is not None else 0
+        return RoundResult(dealer_position=self.dealer_position, hu_position=self.hu_position, hu_player_idx=hu_player_idx, hu_type=self.hu_type, turns=self.turns, fan=fan)
+
+    def pong(self, player_pong_pos: WindPosition, tile: MahjongTile) -> None:
+        if self.position_players is not None:
+            player_pong = self.position_players[player_pong_pos]
+            player_pong.declare_pong(tile)
+            if self.record is not None:
+                self.record.add_action(Action.PONG, player_pong_pos, tile)
+            self.draw_tile_bool = False
+            self.current_position = player_pong_pos
+
+    def run(self) -> None:
+        self.start_game()
+        while self.position_players is not None and not self.game_over:
+            self.play_round()
+            dealer = self.position_players[self.dealer_position]
             if self.hu_position is not None:
                 self.next_dealer()
-                print(f'Finish one round!')
-                print(f'The dealer for the new round is Player{self.position_players[self.dealer_position].idx} at {self.dealer_position}')
-                if input_yes(f'Start next round? (yes, default): '):
-                    self.set_new_round()
+                dealer = self.position_players[self.dealer_position]
+                log.info('round_end', 'Finish one round!\nThe dealer for the new round is Player{player} at {position}', player=dealer.idx, position=self.dealer_position)
+            else:
+                log.info('round_end', 'Draw: No Winner.\nStart another new round with Player{player} at {position} as dealer', player=dealer.idx, position=self.dealer_position)
+            if dealer.agent.confirm(f'Start next round? (yes, default): '):
+                self.set_new_round()
+            else:
+                self.game_over = True
+
+    def score_hu(self, player: MahjongPlayer, tiles_hold: list[MahjongTile], self_draw: bool) -> None | Score:
+        """
+        Score the winning hand of `player` with `self.score_table`.
 
-            if len(self.tiles) == 0:
-                print(f'Draw: No Winner.')
-                print(f'Start another new round with Player{self.position_players[self.dealer_position].idx} at {self.dealer_position} as dealer')
-                if input_yes(f'Start next round? (yes, default): '):
-                    self.set_new_round()
+        Returns:
+            None | Score: The fan and the matched patterns, None if the hand is not legal.
+        """
+        seat_wind = player.position if player.position is not None else self.current_position
+        context = WinContext(self_draw=self_draw, dealer=player.is_dealer, seat_wind=seat_wind)
+        score = score_hand(tiles_hold, player.pong, player.kong, player.chow, context, self.joker, self.score_table)
+        if score is not None:
+            log.info('score', 'Player{player} scores {fan} fan: {patterns}', player=player.idx, fan=score['fan'], patterns=score['patterns'])
+        return score
 
     def set_new_round(self) -> None:
         """
@@ -383,18 +484,17 @@ class MahjongGame:
         Returns:
             None.
         """
-        self.tiles = None
         self.current_position = self.dealer_position  # Current position in game; The starting position is the starting dealer
         self.joker = None
         self.draw_tile_bool = True
         self.hu_position =  None
+        self.hu_type = None
+        self.hu_score = None
+        self.turns = 0
+        self.record = None
 
         for player in self.players:
-            player.tiles_hold = []
-            player.tiles_discard = []
-            player.pong = []
-            player.kong = []
-            player.chow = []
+            player.reset()
         self.deal_starting_tiles()
 
     def start_game(self) -> None:
@@ -405,6 +505,8 @@ class MahjongGame:
             None.
         """
         if self.position_players is None:
+            if self.seed is not None:
+                log.info('seed', 'Table seed: {seed}', seed=self.seed)
             self.determine_first_dealer()
         self.deal_starting_tiles()
 
@@ -0,0 +1,121 @@
+import random
+
+import numpy as np
+import numpy.typing as npt
+
+from basic_rules import check_legal_hand
+from hand_table import load_suit_tables
+from tiles import PLAYING_TILE_ID_NUM, SUITED_TILE_ID_NUM, TILES
+
+# Dense versions of the `hand_table` suit tables, indexed by suit key
+_melds_table: None | npt.NDArray[np.bool_] = None
+_pair_table: None | npt.NDArray[np.int8] = None
+
+def check_legal_hands(counts: npt.ArrayLike, chunk_rows: int = 1 << 16) -> tuple[npt.NDArray[np.bool_], npt.NDArray[np.int8]]:
+    """
+        Check a batch of hands at once, the same as `basic_rules.check_legal_hand` for every hand.
+
+        Args:
+            counts: The (N, 34) count matrix, every row is the count of every tile ID(suited and honors) in one hand.
+            chunk_rows: The count of rows checked at once, small chunks keep the temporary arrays in cache.
+
+        Returns:
+            tuple: The (N,) bool array whether every hand is a legal hand, and the (N,) tile ID of the pair, -1 if not a legal hand.
+    """
+    counts = np.asarray(counts)
+    if counts.ndim != 2 or counts.shape[1] != PLAYING_TILE_ID_NUM:
+        raise ValueError(f'Expected a (N, {PLAYING_TILE_ID_NUM}) count matrix, got {counts.shape}.')
+    legal = np.empty(len(counts), dtype=np.bool_)
+    pair_id = np.empty(len(counts), dtype=np.int8)
+    for start in range(0, len(counts), chunk_rows):
+        legal[start:start + chunk_rows], pair_id[start:start + chunk_rows] = _check_legal_hands_chunk(counts[start:start + chunk_rows])
+    return legal, pair_id
+
+def load_dense_tables() -> tuple[npt.NDArray[np.bool_], npt.NDArray[np.int8]]:
+    """
+        Expand the `hand_table` suit tables into arrays over all 5 ** 9 suit keys.
+
+        Returns:
+            tuple: Whether every suit key is melds only, and the pair number of every suit key, -1 if not melds with one pair.
+    """
+    global _melds_table, _pair_table
+    if _melds_table is None or _pair_table is None:
+        melds_keys, pair_keys = load_suit_tables()
+        _melds_table = np.zeros(5 ** 9, dtype=np.bool_)
+        _melds_table[np.fromiter(melds_keys, dtype=np.int64)] = True
+        _pair_table = np.full(5 ** 9, -1, dtype=np.int8)
+        _pair_table[np.fromiter(pair_keys.keys(), dtype=np.int64)] = np.fromiter(pair_keys.values(), dtype=np.int8)
+    return _melds_table, _pair_table
+
+def _check_legal_hands_chunk(counts: npt.NDArray[np.integer]) -> tuple[npt.NDArray[np.bool_], npt.NDArray[np.int8]]:
+    melds_table, pair_table = load_dense_tables()
+    valid = ((counts >= 0) & (counts <= 4)).all(axis=1)
+
+    # (n, 3) suit keys, the same as `hand_table.suit_key`, and 0 for invalid hands to stay in the tables
+    suits = counts[:, :SUITED_TILE_ID_NUM].reshape(-1, 3, 9)
+    suit_keys = suits[:, :, 8].astype(np.int32)
+    for number in range(7, -1, -1):
+        suit_keys *= 5
+        suit_keys += suits[:, :, number]
+    suit_keys[~valid] = 0
+    # whether every suit is melds only, and the pair number of every suit, -1 if the suit is not melds with one pair
+    suit_melds = melds_table[suit_keys]
+    suit_pair = pair_table[suit_keys]
+
+    honors = counts[:, SUITED_TILE_ID_NUM:]
+    honors_pong = (honors == 0) | (honors == 3)
+    honors_melds = honors_pong.all(axis=1)
+    honors_with_pair = (honors_pong | (honors == 2)).all(axis=1) & ((honors == 2).sum(axis=1) == 1)
+
+    # every group(3 suits and honors) is melds, or melds with the only pair
+    groups_ok = (suit_melds | (suit_pair >= 0)).all(axis=1) & (honors_melds | honors_with_pair)
+    pair_groups_num = (suit_pair >= 0).sum(axis=1) + honors_with_pair
+    legal = groups_ok & (pair_groups_num == 1) & valid
+
+    pair_suit = np.argmax(suit_pair >= 0, axis=1)
+    pair_id = np.where(
+        honors_with_pair,
+        SUITED_TILE_ID_NUM + np.argmax(honors == 2, axis=1),
+        pair_suit * 9 + suit_pair[np.arange(len(counts)), pair_suit],
+    )
+    return legal, np.where(legal, pair_id, -1).astype(np.int8)
+
+def random_counts(rng: random.Random, hands_num: int, winning_rate: float = 0.5) -> npt.NDArray[np.int8]:
+    """
+        Generate hands of 14 tiles, part of them built from 4 melds and 1 pair and then one tile may be replaced.
+
+        Returns:
+            NDArray: The (hands_num, 34) count matrix.
+    """
+    counts = np.zeros((hands_num, PLAYING_TILE_ID_NUM), dtype=np.int8)
+    wall = [tile_id for tile_id in range(PLAYING_TILE_ID_NUM) for _ in range(4)]
+    for row in counts:
+        while True:
+            row[:] = 0
+            if rng.random() < winning_rate:
+                for _ in range(4):
+                    tile_id = rng.randrange(PLAYING_TILE_ID_NUM)
+                    if tile_id < SUITED_TILE_ID_NUM and tile_id % 9 <= 6 and rng.random() < 0.6:
+                        row[tile_id:tile_id + 3] += 1
+                    else:
+                        row[tile_id] += 3
+                row[rng.randrange(PLAYING_TILE_ID_NUM)] += 2
+                if rng.random() < 0.3:
+                    row[rng.choice(np.flatnonzero(row))] -= 1
+                    row[rng.randrange(PLAYING_TILE_ID_NUM)] += 1
+            else:
+                for tile_id in rng.sample(wall, 14):
+                    row[tile_id] += 1
+            if row.max() <= 4:
+                break
+    return counts
+
+def test_check_legal_hands() -> None:
+    counts = random_counts(random.Random(0), 2000)
+    legal, pair_id = check_legal_hands(counts)
+    mismatch = 0
+    for row, legal_, pair_id_ in zip(counts, legal, pair_id):
+        legal_hand = check_legal_hand([TILES[tile_id] for tile_id in range(PLAYING_TILE_ID_NUM) for _ in range(row[tile_id])])
+        if bool(legal_hand) != legal_ or (legal_hand and legal_hand[1][0].tile_id != pair_id_):
+            mismatch += 1
+    print(int(legal.sum()) > 0, mismatch)  # True 0
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from typing import Any
+
+from hand_table import calculate_shanten, find_pair_id, find_waits, suit_key
+from tiles import PLAYING_TILE_ID_NUM, SUITED_TILE_ID_NUM, TILE_ID_NUM
+
+# The hand evaluations only depend on the hand up to permuting the 3 suits, and permuting the honors (which only form pongs and pairs).
+# A hand is cached by its canonical key: the sorted suit keys and the sorted honor counts. The results with tile IDs are cached in the
+# canonical order, and mapped back to the tile IDs of the hand.
+
+class HandCache:
+    """
+        A bounded LRU cache with hit, miss and eviction counters. `maxsize` 0 disables the cache.
+        It can be shared by games in threads without a lock, the counters are then approximate.
+    """
+    def __init__(self, maxsize: int = 1 << 16) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+            Returns:
+                Any: The cached value, None if `key` is not cached.
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            # evicted by a game in another thread, e.g., tables of `server.GameServer`
+            pass
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            try:
+                self.entries.popitem(last=False)
+            except KeyError:
+                return
+            self.evictions += 1
+
+    def resize(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        while len(self.entries) > max(maxsize, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, float | int]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+pair_cache: HandCache = HandCache()
+shanten_cache: HandCache = HandCache()
+waits_cache: HandCache = HandCache()
+
+def cache_stats() -> dict[str, dict[str, float | int]]:
+    return {'pair': pair_cache.stats(), 'shanten': shanten_cache.stats(), 'waits': waits_cache.stats()}
+
+def cached_calculate_shanten(counts: Sequence[int], melds_num: int = 0) -> int:
+    """
+        The same as `hand_table.calculate_shanten`, cached by the canonical hand.
+
+        Returns:
+            int: The shanten number.
+    """
+    key, _ = canonical_hand(counts)
+    shanten = shanten_cache.get((key, melds_num))
+    if shanten is None:
+        shanten = calculate_shanten(counts, melds_num)
+        shanten_cache.put((key, melds_num), shanten)
+    return shanten
+
+def cached_find_pair_id(counts: Sequence[int]) -> int:
+    """
+        The same as `hand_table.find_pair_id`, cached by the canonical hand.
+
+        Returns:
+            int: The tile ID of the pair if the hand is legal, otherwise -1.
+    """
+    if any(counts[PLAYING_TILE_ID_NUM:TILE_ID_NUM]):
+        return -1
+    key, tile_ids = canonical_hand(counts)
+    pair_idx = pair_cache.get(key)
+    if pair_idx is None:
+        pair_id = find_pair_id(counts)
+        pair_idx = tile_ids.index(pair_id) if pair_id >= 0 else -1
+        pair_cache.put(key, pair_idx)
+    return tile_ids[pair_idx] if pair_idx >= 0 else -1
+
+def cached_find_waits(counts: Sequence[int]) -> list[int]:
+    """
+        The same as `hand_table.find_waits`, cached by the canonical hand.
+
+        Returns:
+            list: The sorted tile IDs of the waiting tiles.
+    """
+    if any(counts[PLAYING_TILE_ID_NUM:TILE_ID_NUM]):
+        return find_waits(counts)
+    key, tile_ids = canonical_hand(counts)
+    waits_idx = waits_cache.get(key)
+    if waits_idx is None:
+        waits_idx = tuple(tile_ids.index(tile_id) for tile_id in find_waits(counts))
+        waits_cache.put(key, waits_idx)
+    return sorted(tile_ids[idx] for idx in waits_idx)
+
+def canonical_hand(counts: Sequence[int]) -> tuple[tuple[int, ...], list[int]]:
+    """
+        Encode the suited and honor tiles of the hand, the same for all hands which only differ by permuting the suits or the honors.
+
+        Returns:
+            tuple: The canonical key, and the tile ID in the hand of every tile ID in the canonical order.
+    """
+    suits = sorted((suit_key(counts, suit_start), suit_start) for suit_start in range(0, SUITED_TILE_ID_NUM, 9))
+    honors = sorted((counts[tile_id], tile_id) for tile_id in range(SUITED_TILE_ID_NUM, PLAYING_TILE_ID_NUM))
+    key = tuple(suit_key_ for suit_key_, _ in suits) + tuple(count for count, _ in honors)
+    tile_ids = [suit_start + number for _, suit_start in suits for number in range(9)] + [tile_id for _, tile_id in honors]
+    return key, tile_ids
+
+def set_cache_size(maxsize: int) -> None:
+    """
+        Set the size bound of all hand caches, 0 to disable them.
+
+        Returns:
+            None.
+    """
+    for cache in (pair_cache, shanten_cache, waits_cache):
+        cache.resize(maxsize)
+
+def test_hand_cache() -> None:
+    cache = HandCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    print(list(cache.entries), cache.get('b'), cache.stats()['evictions'])  # ['a', 'c'] None 1
+
+    # the same hand in bamboo and in dots shares the entry
+    counts = [0] * TILE_ID_NUM
+    for tile_id in [0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8]:
+        counts[tile_id] += 1
+    counts_dots = counts[9:18] + counts[18:27] + counts[:9] + counts[27:]
+    waits_cache.clear()
+    print(cached_find_waits(counts) == find_waits(counts), cached_find_waits(counts_dots) == find_waits(counts_dots), waits_cache.hits)  # True True 1
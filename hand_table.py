@@ -0,0 +1,481 @@
+import os
+import pickle
+import itertools
+from collections.abc import Iterator, Sequence
+
+from tiles import PLAYING_TILE_ID_NUM, SUITED_TILE_ID_NUM, TILE_ID_NUM
+
+# Every suit (bamboo, characters, dots) is encoded as a base-5 key of its 9 counts, the count of number 1 is the lowest digit.
+# A suit key is looked up in 2 precomputed tables:
+#   `melds_keys`: the suit can be fully decomposed into melds(pong and chow)
+#   `pair_keys`: the suit can be fully decomposed into melds and one pair, mapped to the smallest number of the pair
+# The tables are built on first use and persisted to `table_path`.
+
+SUIT_KEY_BASES: tuple[int, ...] = tuple(5 ** i for i in range(9))
+
+table_path: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hand_table.pickle')
+
+_TABLE_VERSION: int = 1
+
+_tables: None | tuple[frozenset[int], dict[int, int]] = None
+
+_EMPTY_BLOCKS: frozenset[tuple[int, int, int]] = frozenset({(0, 0, 0)})
+
+_blocks_memo: dict[tuple[int, bool], frozenset[tuple[int, int, int]]] = {}
+
+_joker_memo: dict[tuple[int, bool], tuple[int, int]] = {}
+
+_decompositions_memo: dict[int, tuple[tuple[tuple[int, ...], tuple[int, ...]], ...]] = {}
+
+def build_suit_tables() -> tuple[frozenset[int], dict[int, int]]:
+    """
+        Enumerate all suit count vectors (every count <= 4) that can be decomposed into melds, with or without one pair.
+
+        Returns:
+            tuple: The keys of melds only suits, and the mapping from the keys of melds with one pair suits to the smallest number(0-based) of the pair.
+    """
+    melds_keys: set[int] = set()
+    counts = [0] * 11  # 2 more positions for chows starting at 7 and 8, always kept 0
+
+    def add_melds(i: int) -> None:
+        if i == 9:
+            melds_keys.add(sum(count * base for count, base in zip(counts, SUIT_KEY_BASES)))
+            return
+        # pong at number i
+        for pong_num in range(2):
+            counts[i] += 3 * pong_num
+            # chows starting at number i
+            for chow_num in range(5 if i <= 6 else 1):
+                counts[i] += chow_num
+                counts[i + 1] += chow_num
+                counts[i + 2] += chow_num
+                if counts[i] <= 4 and counts[i + 1] <= 4 and counts[i + 2] <= 4:
+                    add_melds(i + 1)
+                counts[i] -= chow_num
+                counts[i + 1] -= chow_num
+                counts[i + 2] -= chow_num
+            counts[i] -= 3 * pong_num
+
+    add_melds(0)
+
+    pair_keys: dict[int, int] = {}
+    for key in melds_keys:
+        for number, base in enumerate(SUIT_KEY_BASES):
+            if key // base % 5 <= 2:
+                pair_key = key + 2 * base
+                if number < pair_keys.get(pair_key, 9):
+                    pair_keys[pair_key] = number
+    return frozenset(melds_keys), pair_keys
+
+def calculate_shanten(counts: Sequence[int], melds_num: int = 0) -> int:
+    """
+        Calculate the shanten number of the hand, the count of tiles to replace before a ready hand.
+        Only the basic legal hand(4 melds and 1 pair) is considered.
+
+        Args:
+            counts: The count of every tile ID in hand.
+            melds_num: The count of declared melds(pong, kong, and chow).
+
+        Returns:
+            int: -1 for a complete legal hand, 0 for a ready hand, and so on.
+    """
+    # The most partials for every (melds, pair) as index `melds * 2 + pair`, -1 if not reached. More partials never raise the shanten
+    # number for the same melds and pair, so combining the blocks of the groups only keeps the most partials of every state.
+    partials_of = [-1] * 10
+    partials_of[min(melds_num, 4) * 2] = 0
+    groups = [_blocks(suit_key(counts, suit_start), True) for suit_start in range(0, SUITED_TILE_ID_NUM, 9)]
+    groups += [_blocks(counts[tile_id], False) for tile_id in range(SUITED_TILE_ID_NUM, PLAYING_TILE_ID_NUM) if counts[tile_id]]
+    for blocks in groups:
+        if blocks is _EMPTY_BLOCKS:
+            continue
+        partials_next = [-1] * 10
+        for state, partials in enumerate(partials_of):
+            if partials < 0:
+                continue
+            melds, pair = state >> 1, state & 1
+            for dm, dt, dp in blocks:
+                if pair + dp <= 1:
+                    state_next = min(melds + dm, 4) * 2 + pair + dp
+                    if partials + dt > partials_next[state_next]:
+                        partials_next[state_next] = partials + dt
+        partials_of = partials_next
+
+    shanten = 8
+    for state, partials in enumerate(partials_of):
+        if partials >= 0:
+            melds, pair = state >> 1, state & 1
+            shanten = min(shanten, 8 - 2 * melds - min(partials, 4 - melds) - pair)
+    return shanten
+
+def count_jokers_needed(counts: Sequence[int], joker_id: int) -> int:
+    """
+        Count the jokers needed to complete a legal hand(melds and exactly one pair) with the other tiles, jokers stand for any tile.
+        Every suit and honor tile is solved alone as (jokers for melds only, jokers for melds and the pair), and the pair goes to the
+        group it costs least, or is made of 2 jokers. A hand with 3n + 2 tiles is legal if this is at most `counts[joker_id]`.
+
+        Args:
+            counts: The count of every tile ID, including the jokers.
+            joker_id: The tile ID of the joker.
+
+        Returns:
+            int: The least count of jokers, `TILE_ID_NUM` if there are other bonus tiles, which can never be completed.
+    """
+    if any(counts[tile_id] for tile_id in range(PLAYING_TILE_ID_NUM, TILE_ID_NUM) if tile_id != joker_id):
+        return TILE_ID_NUM
+    jokers_num = counts[joker_id]
+    melds_need = 0
+    pair_extra = 2  # the pair of 2 jokers
+    for suit_start in range(0, SUITED_TILE_ID_NUM, 9):
+        key = suit_key(counts, suit_start)
+        if suit_start <= joker_id < suit_start + 9:
+            key -= jokers_num * SUIT_KEY_BASES[joker_id - suit_start]
+        if key:
+            melds, pair = _joker_needs(key, True)
+            melds_need += melds
+            pair_extra = min(pair_extra, pair - melds)
+    for tile_id in range(SUITED_TILE_ID_NUM, PLAYING_TILE_ID_NUM):
+        if counts[tile_id] and tile_id != joker_id:
+            melds, pair = _joker_needs(counts[tile_id], False)
+            melds_need += melds
+            pair_extra = min(pair_extra, pair - melds)
+    return melds_need + pair_extra
+
+def find_pair_id(counts: Sequence[int]) -> int:
+    """
+        Look up whether the counts by tile ID form a legal hand: melds and exactly one pair.
+        Honors can only form pongs, and bonus tiles can not form a legal hand.
+
+        Args:
+            counts: The count of every tile ID.
+
+        Returns:
+            int: The tile ID of the pair if the hand is legal, the smallest one if there are multiple decompositions, otherwise -1.
+    """
+    melds_keys, pair_keys = load_suit_tables()
+    pair_id = -1
+    for suit_start in range(0, SUITED_TILE_ID_NUM, 9):
+        key = suit_key(counts, suit_start)
+        if key in melds_keys:
+            continue
+        if pair_id >= 0 or key not in pair_keys:
+            return -1
+        pair_id = suit_start + pair_keys[key]
+
+    for tile_id in range(SUITED_TILE_ID_NUM, PLAYING_TILE_ID_NUM):
+        count = counts[tile_id]
+        if count == 2 and pair_id < 0:
+            pair_id = tile_id
+        elif count != 0 and count != 3:
+            return -1
+
+    if any(counts[PLAYING_TILE_ID_NUM:TILE_ID_NUM]):
+        return -1
+    return pair_id
+
+def find_joker_waits(counts: Sequence[int], joker_id: int) -> list[int]:
+    """
+        Find the tiles completing the hand to a legal hand with jokers, see `count_jokers_needed`.
+
+        Args:
+            counts: The count of every tile ID in hand including the jokers, with 3n + 1 tiles.
+            joker_id: The tile ID of the joker.
+
+        Returns:
+            list: The sorted tile IDs of the waiting tiles, only tiles with less than 4 in hand are considered.
+    """
+    jokers_num = counts[joker_id]
+    # One more tile saves at most one joker, and the joker itself completes the hand if any other tile does
+    if count_jokers_needed(counts, joker_id) > jokers_num + 1:
+        return []
+    waits = [joker_id] if counts[joker_id] < 4 else []
+    counts_check = list(counts)
+    for tile_id in range(PLAYING_TILE_ID_NUM):
+        if tile_id != joker_id and counts_check[tile_id] < 4:
+            counts_check[tile_id] += 1
+            if count_jokers_needed(counts_check, joker_id) <= jokers_num:
+                waits.append(tile_id)
+            counts_check[tile_id] -= 1
+    return sorted(waits)
+
+def find_waits(counts: Sequence[int]) -> list[int]:
+    """
+        Find the tiles completing the hand to a legal hand, only tiles with less than 4 in hand are considered.
+
+        Args:
+            counts: The count of every tile ID in hand, with 3n + 1 tiles.
+
+        Returns:
+            list: The sorted tile IDs of the waiting tiles.
+    """
+    # Only a tile identical or close (in the same suit) to a tile in hand can complete a meld or the pair
+    candidates: set[int] = set()
+    for tile_id in range(PLAYING_TILE_ID_NUM):
+        if counts[tile_id]:
+            if tile_id < SUITED_TILE_ID_NUM:
+                suit_start = tile_id - tile_id % 9
+                candidates.update(range(max(suit_start, tile_id - 2), min(suit_start + 9, tile_id + 3)))
+            else:
+                candidates.add(tile_id)
+
+    waits = []
+    counts_check = list(counts)
+    for tile_id in sorted(candidates):
+        if counts_check[tile_id] < 4:
+            counts_check[tile_id] += 1
+            if find_pair_id(counts_check) >= 0:
+                waits.append(tile_id)
+            counts_check[tile_id] -= 1
+    return waits
+
+def iter_decompositions(counts: Sequence[int]) -> Iterator[tuple[int, tuple[int, ...], tuple[int, ...]]]:
+    """
+        Lazily generate every distinct decomposition of a legal hand into one pair and melds, the pairs in tile ID order.
+        Only the suit holding the pair is not decomposable into melds, so the pairs are found by the suit tables, and a hand which
+        is not legal generates nothing without enumerating any meld.
+
+        Args:
+            counts: The count of every tile ID in hand.
+
+        Returns:
+            Iterator: The tile ID of the pair, the tile IDs of the pongs, and the first tile IDs of the chows, both sorted.
+    """
+    if any(counts[PLAYING_TILE_ID_NUM:TILE_ID_NUM]):
+        return
+    melds_keys, pair_keys = load_suit_tables()
+    keys = [suit_key(counts, suit_start) for suit_start in range(0, SUITED_TILE_ID_NUM, 9)]
+    # the suits not decomposable into melds, only one of them can hold the pair
+    pair_suits = [suit_idx for suit_idx, key in enumerate(keys) if key not in melds_keys]
+    honor_pongs = []
+    honor_pairs = []
+    for tile_id in range(SUITED_TILE_ID_NUM, PLAYING_TILE_ID_NUM):
+        if counts[tile_id] == 3:
+            honor_pongs.append(tile_id)
+        elif counts[tile_id] == 2:
+            honor_pairs.append(tile_id)
+        elif counts[tile_id]:
+            return
+    if len(pair_suits) + len(honor_pairs) != 1 or any(keys[suit_idx] not in pair_keys for suit_idx in pair_suits):
+        return
+
+    # the pair is the honor pair, or any pair leaving only melds in the suit
+    pair_ids = honor_pairs or [
+        pair_suits[0] * 9 + number for number, base in enumerate(SUIT_KEY_BASES)
+        if counts[pair_suits[0] * 9 + number] >= 2 and keys[pair_suits[0]] - 2 * base in melds_keys
+    ]
+    for pair_id in pair_ids:
+        keys_left = list(keys)
+        if pair_id < SUITED_TILE_ID_NUM:
+            keys_left[pair_id // 9] -= 2 * SUIT_KEY_BASES[pair_id % 9]
+        for bamboo, characters, dots in itertools.product(*(_suit_decompositions(key) for key in keys_left)):
+            pongs = bamboo[0] + tuple(9 + number for number in characters[0]) + tuple(18 + number for number in dots[0]) + tuple(honor_pongs)
+            chows = bamboo[1] + tuple(9 + number for number in characters[1]) + tuple(18 + number for number in dots[1])
+            yield pair_id, pongs, chows
+
+def load_suit_tables() -> tuple[frozenset[int], dict[int, int]]:
+    """
+        Load the suit tables, from memory, from `table_path`, or build and persist them.
+
+        Returns:
+            tuple: The same as `build_suit_tables`.
+    """
+    global _tables
+    if _tables is not None:
+        return _tables
+    try:
+        with open(table_path, 'rb') as f:
+            version, tables = pickle.load(f)
+        if version == _TABLE_VERSION:
+            _tables = tables
+            return tables
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+
+    _tables = build_suit_tables()
+    try:
+        with open(table_path, 'wb') as f:
+            pickle.dump((_TABLE_VERSION, _tables), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # Read-only location, keep the tables in memory only
+        pass
+    return _tables
+
+def _blocks(key: int, seq: bool) -> frozenset[tuple[int, int, int]]:
+    """
+        Decompose a suit key (or the count of one honor tile when `seq` is False) into blocks.
+
+        Returns:
+            frozenset: The non-dominated (melds, partials, pair) counts of all decompositions.
+    """
+    if key == 0:
+        return _EMPTY_BLOCKS
+    blocks = _blocks_memo.get((key, seq))
+    if blocks is not None:
+        return blocks
+
+    # Decompose from the lowest number with tiles
+    base = 1
+    while key // base % 5 == 0:
+        base *= 5
+    count = key // base % 5
+    count_next = key // (base * 5) % 5 if seq else 0
+    count_nn = key // (base * 25) % 5 if seq else 0
+
+    # (remaining key, melds, partials, pair)
+    options = [(key - base, 0, 0, 0)]  # isolated tile
+    if count >= 3:
+        options.append((key - 3 * base, 1, 0, 0))  # pong
+    if count >= 2:
+        options.append((key - 2 * base, 0, 1, 0))  # partial pong
+        options.append((key - 2 * base, 0, 0, 1))  # pair
+    if count_next and count_nn:
+        options.append((key - 31 * base, 1, 0, 0))  # chow
+    if count_next:
+        options.append((key - 6 * base, 0, 1, 0))  # partial chow with consecutive numbers
+    if count_nn:
+        options.append((key - 26 * base, 0, 1, 0))  # partial chow with a gap
+
+    result = {
+        (m + dm, t + dt, p + dp)
+        for remaining, dm, dt, dp in options
+        for m, t, p in _blocks(remaining, seq) if p + dp <= 1
+    }
+    blocks = _prune_blocks(result)
+    _blocks_memo[(key, seq)] = blocks
+    return blocks
+
+def _decompositions(key: int) -> Iterator[tuple[tuple[int, ...], tuple[int, ...]]]:
+    # The lowest number left is in a pong or is the first number of chows, all its tiles are taken at once, so every
+    # decomposition is generated once
+    if key == 0:
+        yield (), ()
+        return
+    number = 0
+    while key // SUIT_KEY_BASES[number] % 5 == 0:
+        number += 1
+    count = key // SUIT_KEY_BASES[number] % 5
+    for pongs_num in range(count // 3 + 1):
+        chows_num = count - 3 * pongs_num
+        remaining = key - 3 * pongs_num * SUIT_KEY_BASES[number]
+        if chows_num:
+            if number > 6 or key // SUIT_KEY_BASES[number + 1] % 5 < chows_num or key // SUIT_KEY_BASES[number + 2] % 5 < chows_num:
+                continue
+            remaining -= chows_num * (SUIT_KEY_BASES[number] + SUIT_KEY_BASES[number + 1] + SUIT_KEY_BASES[number + 2])
+        for pongs, chows in _decompositions(remaining):
+            yield (number,) * pongs_num + pongs, (number,) * chows_num + chows
+
+def _joker_needs(key: int, seq: bool) -> tuple[int, int]:
+    """
+        Solve a suit key (or the count of one honor tile when `seq` is False) with jokers. Every meld or pair is taken with the lowest
+        tile left, the missing tiles of it are jokers.
+
+        Returns:
+            tuple: The least jokers to complete the tiles as melds only, and as melds with one pair.
+    """
+    if key == 0:
+        return 0, 2
+    needs = _joker_memo.get((key, seq))
+    if needs is not None:
+        return needs
+
+    number = 0
+    while key // SUIT_KEY_BASES[number] % 5 == 0:
+        number += 1
+    base = SUIT_KEY_BASES[number]
+    count = key // base % 5
+
+    # (remaining key, jokers, is the pair)
+    options = [(key - used * base, 3 - used, False) for used in range(1, min(count, 3) + 1)]  # pong
+    options += [(key - used * base, 2 - used, True) for used in range(1, min(count, 2) + 1)]  # pair
+    if seq:
+        # chows with the lowest tile, the numbers below it are all jokers
+        for seq_start in range(max(number - 2, 0), min(number, 6) + 1):
+            remaining = key
+            used = 0
+            for seq_number in range(number, seq_start + 3):
+                if key // SUIT_KEY_BASES[seq_number] % 5:
+                    remaining -= SUIT_KEY_BASES[seq_number]
+                    used += 1
+            options.append((remaining, 3 - used, False))
+
+    melds_need = pair_need = 4 * 14
+    for remaining, jokers, is_pair in options:
+        melds, pair = _joker_needs(remaining, seq)
+        if is_pair:
+            pair_need = min(pair_need, jokers + melds)
+        else:
+            melds_need = min(melds_need, jokers + melds)
+            pair_need = min(pair_need, jokers + pair)
+    needs = melds_need, pair_need
+    _joker_memo[(key, seq)] = needs
+    return needs
+
+def _prune_blocks(blocks: set[tuple[int, int, int]]) -> frozenset[tuple[int, int, int]]:
+    # Drop the (melds, partials, pair) dominated by another one, which can never give a smaller shanten number
+    return frozenset(
+        block for block in blocks
+        if not any(other != block and all(o >= b for o, b in zip(other, block)) for other in blocks)
+    )
+
+def _suit_decompositions(key: int) -> tuple[tuple[tuple[int, ...], tuple[int, ...]], ...]:
+    """
+        Returns:
+            tuple: The numbers(0-based) of the pongs and the first numbers of the chows, of every decomposition of a suit key into melds.
+    """
+    decompositions = _decompositions_memo.get(key)
+    if decompositions is None:
+        decompositions = tuple(_decompositions(key))
+        _decompositions_memo[key] = decompositions
+    return decompositions
+
+def suit_key(counts: Sequence[int], suit_start: int) -> int:
+    c = counts
+    s = suit_start
+    return c[s] + 5 * (c[s + 1] + 5 * (c[s + 2] + 5 * (c[s + 3] + 5 * (c[s + 4] + 5 * (c[s + 5] + 5 * (c[s + 6] + 5 * (c[s + 7] + 5 * c[s + 8])))))))
+
+def test_count_jokers_needed() -> None:
+    counts = [0] * TILE_ID_NUM
+    # bamboo 112 + characters 123 + dots 789 + dragons1 pong + 2 jokers(winds1)
+    for tile_id in [0, 0, 1, 9, 10, 11, 24, 25, 26, 27, 27, 27, 30, 30]:
+        counts[tile_id] += 1
+    print(count_jokers_needed(counts, 30))  # 2, e.g., bamboo 11 and 12 + joker3
+    counts[30] = 1
+    print(find_joker_waits(counts, 30))  # [0, 1, 2, 3, 30]
+    counts[1], counts[11] = 0, 2  # bamboo 11 + characters 1233 + dots 789 + dragons1 pong + 1 joker
+    print(find_joker_waits(counts, 30))  # [0, 9, 10, 11, 12, 13, 30]
+
+def test_iter_decompositions() -> None:
+    counts = [0] * TILE_ID_NUM
+    # bamboo 11122233344455
+    for tile_id, count in enumerate([3, 3, 3, 3, 2]):
+        counts[tile_id] = count
+    for pair_id, pongs, chows in iter_decompositions(counts):
+        print(pair_id, pongs, chows)
+    # 1 (0,) (1, 2, 2), bamboo 22 + 111 + 234 345 345
+    # 4 (3,) (0, 0, 0), bamboo 55 + 444 + 123 123 123
+    # 4 (0,) (1, 1, 1)
+    # 4 (0, 1, 2, 3) ()
+    counts[27] = 1
+    print(list(iter_decompositions(counts)))  # []
+
+def test_find_pair_id() -> None:
+    counts = [0] * TILE_ID_NUM
+    # bamboo 1112345678999 + bamboo5
+    for tile_id, count in enumerate([3, 1, 1, 1, 2, 1, 1, 1, 3]):
+        counts[tile_id] = count
+    print(find_pair_id(counts))  # 4, the pair is bamboo5
+    counts[4] = 1  # bamboo 1112345678999
+    counts[27] = 3  # dragons1 pong
+    print(find_pair_id(counts))  # -1
+    counts[4] = 0  # bamboo 111234678999
+    counts[28] = 2  # dragons2 pair
+    print(find_pair_id(counts))  # 28
+
+def test_calculate_shanten() -> None:
+    counts = [0] * TILE_ID_NUM
+    for tile_id in [0, 1, 2, 9, 10, 11, 18, 19, 20, 27, 27, 27, 30]:
+        counts[tile_id] += 1
+    print(calculate_shanten(counts), find_waits(counts))  # 0 [30]
+    counts[30], counts[31] = 0, 1
+    print(calculate_shanten(counts))  # 0
+    counts[2], counts[13] = 0, 1
+    print(calculate_shanten(counts))  # 1
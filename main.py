@@ -1,10 +1,157 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any
+
 from game import MahjongGame
-from option_config import setup_game
+from option_config import check_options_config, set_options_config, setup_game
+from runner import agent_types, run_batch
+
+# The keys of a batch config file besides the options of `option_config.set_options_config`, and their defaults. Every key is also a
+# flag, which takes precedence over the file.
+batch_defaults: dict[str, Any] = {
+    'games': 1,
+    'seed': 0,
+    'workers': None,  # os.cpu_count()
+    'agent': 'shanten',
+    'output': '-',  # stdout
+    'archive': None,
+    'profile': False,
+}
+
+# The types of the values of `batch_defaults`, `None` is also allowed for the keys defaulting to `None`
+_batch_types: dict[str, type] = {'games': int, 'seed': int, 'workers': int, 'agent': str, 'output': str, 'archive': str, 'profile': bool}
+
+def batch_config(args: argparse.Namespace) -> tuple[dict[str, bool | int], dict[str, Any]]:
+    """
+        Merge the defaults, the JSON file `args.config`, and the flags given in `args`.
+
+        Raises:
+            ValueError: If a key of the file is unknown, or a value has the wrong type or is out of range, see also
+                `option_config.check_options_config`.
+
+        Returns:
+            tuple[dict, dict]: The options from `option_config.set_options_config`, and the batch config with the keys of `batch_defaults`.
+    """
+    options: dict[str, Any] = {}
+    config: dict[str, Any] = dict(batch_defaults)
+    option_keys = set_options_config().keys()
+    if args.config is not None:
+        with open(args.config, encoding='utf-8') as f:
+            loaded = json.load(f)
+        if not isinstance(loaded, dict):
+            raise ValueError(f'Expected a JSON object in {args.config}.')
+        unknown = loaded.keys() - option_keys - config.keys()
+        if unknown:
+            raise ValueError(f'Unknown keys in {args.config}: {', '.join(sorted(unknown))}.')
+        for key, value in loaded.items():
+            (options if key in option_keys else config)[key] = value
+    for key in (*option_keys, *config):
+        value = getattr(args, key, None)
+        if value is not None:
+            (options if key in option_keys else config)[key] = value
+    options_config = check_options_config(options)
+    for key, value in config.items():
+        expected = _batch_types[key]
+        # bool is an int, but not a count of games
+        if not (value is None and batch_defaults[key] is None) and (type(value) is not expected):
+            raise ValueError(f'Expected {'an' if expected is int else 'a'} {expected.__name__} for {key}, got {value!r}.')
+    if config['games'] < 1 or (config['workers'] is not None and config['workers'] < 1):
+        raise ValueError(f'Expected at least 1 game and 1 worker, got {config['games']} and {config['workers']}.')
+    if config['agent'] not in agent_types:
+        raise ValueError(f'Unknown agent {config['agent']!r}, expected one of {', '.join(agent_types)}.')
+    return options_config, config
+
+def main(argv: None | list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Play Mahjong at the console, or play headless games in a batch with --games or --config.')
+    parser.add_argument('--config', help='A JSON file of the rule options (the keys of option_config.set_options_config) and the batch flags, the flags take precedence.')
+    parser.add_argument('--games', type=int, help='Play this count of headless games instead of the console game, 1 by default with --config.')
+    parser.add_argument('--seed', type=int, help='The master seed, game i is seeded with runner.game_seed(seed, i). 0 by default.')
+    parser.add_argument('--workers', type=int, help='The count of worker processes, os.cpu_count() by default, and 1 to play in this process.')
+    parser.add_argument('--agent', choices=list(agent_types), help='The bot of all players, shanten by default.')
+    parser.add_argument('--output', '-o', help='Write one JSON line per game to this file, or - for stdout (default).')
+    parser.add_argument('--archive', help='Also record every game to this archive, see record.ArchiveWriter.')
+    parser.add_argument('--profile', action=argparse.BooleanOptionalAction, help='Profile every game, in the results and the summary.')
+    for key in ('suited', 'honors', 'bonus'):
+        parser.add_argument(f'--{key.replace('_', '-')}', dest=key, action=argparse.BooleanOptionalAction, help=f'The {key} option.')
+    parser.add_argument('--joker', type=_joker_flag, help='off, or the offset of the joker from the drawn tile, 0 or 1, see option_config.decide_joker_config.')
+    args = parser.parse_args(argv)
 
-def main():
+    if args.config is None and args.games is None:
+        play_console()
+        return
+    try:
+        options_config, config = batch_config(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    play_batch(options_config, config)
+
+def play_batch(options_config: dict[str, bool | int], config: dict[str, Any]) -> None:
+    """
+        Play the games of `config` from `batch_config`, stream the results as JSON lines, then write the summary as one JSON line to
+        stdout, or to stderr when the results go to stdout.
+
+        Returns:
+            None.
+    """
+    to_stdout = config['output'] == '-'
+    output = sys.stdout if to_stdout else open(config['output'], 'w', buffering=1 << 16, encoding='utf-8')
+    start = time.perf_counter()
+    try:
+        stats = run_batch(config['games'], options_config, config['seed'], config['workers'], config['agent'], config['archive'], config['profile'], output)
+        output.flush()
+    except BrokenPipeError:
+        # the reader of stdout has gone, e.g. `| head`, stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        raise SystemExit(1)
+    finally:
+        if not to_stdout:
+            output.close()
+    summary: dict[str, Any] = {**stats.summary(), 'seed': config['seed'], 'seconds': round(time.perf_counter() - start, 3)}
+    if stats.profiler is not None:
+        summary['profile'] = stats.profiler.as_dict()
+    print(json.dumps(summary), file=sys.stderr if to_stdout else sys.stdout)
+
+def play_console() -> None:
     options_config = setup_game()
     game = MahjongGame(options_config)
     game.run()
 
+def _joker_flag(value: str) -> bool | int:
+    return False if value.lower() in {'off', 'false', 'no'} else int(value)
+
+def test_batch_config() -> None:
+    import tempfile
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({'joker': 1, 'bonus': True, 'games': 100, 'seed': 7}, f)
+    try:
+        args = argparse.Namespace(config=f.name, games=5, seed=None, workers=None, agent=None, output=None, archive=None, profile=None,
+                                  suited=None, honors=False, bonus=None, joker=None)
+        options_config, config = batch_config(args)
+    finally:
+        os.remove(f.name)
+    print(options_config)  # {'suited': True, 'honors': False, 'bonus': True, 'joker': 1}
+    print(config['games'], config['seed'], config['agent'], config['output'])  # 5 7 shanten -
+
+    for loaded, flags in (({'games': '100'}, {}), ({'workers': 1.5}, {}), ({'profile': 1}, {}), ({'games': 0}, {}),
+                          ({'bonus': 'yes'}, {}), ({}, {'suited': False, 'honors': False})):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(loaded, f)
+        try:
+            batch_config(argparse.Namespace(**{**vars(args), 'config': f.name, 'games': None, 'honors': None, **flags}))
+        except ValueError as e:
+            print(e)
+        finally:
+            os.remove(f.name)
+    # Expected an int for games, got '100'.
+    # Expected an int for workers, got 1.5.
+    # Expected a bool for profile, got 1.
+    # Expected at least 1 game and 1 worker, got 0 and None.
+    # Expected a bool for bonus, got 'yes'.
+    # Expected suited or honors tiles in the game.
+
 if __name__ == '__main__':
     main()
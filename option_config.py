@@ -1,5 +1,39 @@
+from typing import Any
+
+from tiles import tile_set
 from utils import input_list, input_yes_or_no
 
+# The tiles dealt before the first discard: 13 for every player of 4, the dealer's 14th tile, and the tile deciding the joker
+min_tiles_num: int = 4 * 13 + 2
+
+def check_options_config(options: dict[str, Any]) -> dict[str, bool | int]:
+    """
+        Check options from an untrusted source, like a JSON file or a client, against the keys and types of `set_options_config`.
+
+        Raises:
+            ValueError: If a key is unknown, a value has the wrong type, or the tiles are too few to deal.
+
+        Returns:
+            dict: All options, the options not given are the defaults of `set_options_config`.
+    """
+    options_config = set_options_config()
+    unknown = options.keys() - options_config.keys()
+    if unknown:
+        raise ValueError(f'Unknown options: {', '.join(sorted(map(str, unknown)))}.')
+    for key, value in options.items():
+        if key == 'joker':
+            if value is not False and (type(value) is not int or value not in (0, 1)):
+                raise ValueError(f'Expected false, 0, or 1 for joker, got {value!r}.')
+        elif not isinstance(value, bool):
+            raise ValueError(f'Expected a bool for {key}, got {value!r}.')
+        options_config[key] = value
+    if not options_config['suited'] and not options_config['honors']:
+        raise ValueError('Expected suited or honors tiles in the game.')
+    tiles_num = len(tile_set(options_config))
+    if tiles_num < min_tiles_num:
+        raise ValueError(f'Expected at least {min_tiles_num} tiles to deal, the options give {tiles_num}.')
+    return options_config
+
 def decide_joker_config(joker: bool = False) -> bool | int :
     # TODO: Methods to determine the joker tile vary by variant. Future updates may include options to choose from. 
     # Currently, only this method is implemented:
@@ -15,7 +49,17 @@ def decide_joker_config(joker: bool = False) -> bool | int :
         return joker
     return int(input_list(f'Decide joker tile: {' '.join(f'{i}.{joker_descriptions[i]}' for i in range(len(joker_descriptions)))}?(Only input number) ', [f'{i}' for i in range(len(joker_descriptions))], 'Invalid chow seq.'))
 
+def joker_offset(options_config: dict[str, bool | int]) -> None | int:
+    """
+        Returns:
+            None | int: None without joker, otherwise the joker config from `decide_joker_config`, which is the offset of the joker from
+            the drawn tile.
+    """
+    joker = options_config['joker']
+    return None if joker is False else int(joker)
+
 def set_options_config(suited: bool = True, honors: bool = True, bonus: bool = False, joker: bool | int = False) -> dict[str, bool | int]:
+    # the options are compiled into lookup tables by `rules.compile_rules`
     options_config = {
         'suited': suited,
         'honors': honors,
@@ -37,3 +81,16 @@ def setup_game() -> dict[str, bool | int]:
 
     options_config = set_options_config(suited, honors, bonus, decide_joker_config(joker))
     return options_config
+
+def test_check_options_config() -> None:
+    print(check_options_config({'joker': 1}) == set_options_config(joker=1))  # True
+    for options in ({'jokers': 1}, {'suited': 'no'}, {'joker': True}, {'joker': 2}, {'suited': False}):
+        try:
+            check_options_config(options)
+        except ValueError as e:
+            print(e)
+    # Unknown options: jokers.
+    # Expected a bool for suited, got 'no'.
+    # Expected false, 0, or 1 for joker, got True.
+    # Expected false, 0, or 1 for joker, got 2.
+    # Expected at least 54 tiles to deal, the options give 28.
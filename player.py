@@ -1,9 +1,16 @@
-from collections import deque
-from typing import TypedDict
+from typing import TYPE_CHECKING, TypedDict
 
-from basic_rules import check_legal_hand, count_identical_tiles, find_chow_tiles, find_identical_tiles, find_tiles_in_tiles
-from tiles import MahjongTile, WindPosition
-from utils import input_player_action
+from agents import ConsoleAgent, MahjongAgent
+from events import log
+from basic_rules import check_legal_hand, find_chow_seqs
+from hand_cache import cached_calculate_shanten, cached_find_waits
+from hand_table import find_joker_waits
+from tiles import SUITED_TILE_ID_NUM, TILE_ID_NUM, TILES, MahjongTile, WindPosition, counts_to_suit_masks, tiles_to_counts
+from wall import Wall
+
+if TYPE_CHECKING:
+    from claims import ClaimIndex
+    from rules import RuleSet
 
 class ActionPlayer(TypedDict):
     player_idx: int  # -1 when setup
@@ -13,40 +20,53 @@ class ActionPlayer(TypedDict):
     pong: dict[WindPosition, list[MahjongTile]]
 
 class MahjongPlayer:
-    def __init__(self, idx: int) -> None:
+    def __init__(self, idx: int, agent: None | MahjongAgent = None, rules: 'None | RuleSet' = None) -> None:
         self.idx = idx
-        self.tiles_hold: list[MahjongTile] = []
+        self.agent: MahjongAgent = agent if agent is not None else ConsoleAgent()  # decide actions for this player
+        self.rules: 'None | RuleSet' = rules  # the compiled options of the game
+        self._tiles_hold: list[MahjongTile] = []
+        # kept with `self.tiles_hold` by `self.add_tile` and `self.remove_tile`, the count of every tile ID and the numbers of every suit
+        self.counts: list[int] = [0] * TILE_ID_NUM
+        self.suit_masks: list[int] = [0] * 3
+        # the claim index of the table, updated with the hand, see `claims.ClaimIndex.add_player`
+        self.claims: None | ClaimIndex = None
+        self.claims_seat: int = 0
         self.tiles_discard: list[MahjongTile] = []
         self.position: None | WindPosition = None
         self.is_dealer: bool = False
+        self.joker: None | MahjongTile = None  # the joker tile of the round, set by `self.set_joker`
         # if check other players, it can only be one tiles_seq, so it's the only one `list[MahjongTile]``
         # if check self, it can be a tiles_seq of concealed kong `list[MahjongTile]`, or one element `MahjongTile` for kong from pong.
         # contain some declared melds
         self.pong: list[list[MahjongTile]] = []
         self.kong: list[list[MahjongTile]] = []
         self.chow: list[list[MahjongTile]] = []
+        # cached from `self.tiles_hold`, reset by `self.hand_changed` when `self.tiles_hold` changes
+        self._shanten: None | int = None
+        self._waits: None | frozenset[MahjongTile] = None
+
+    def add_tile(self, tile: MahjongTile) -> None:
+        self._tiles_hold.append(tile)
+        self.counts[tile.tile_id] += 1
+        self.hand_changed(tile.tile_id)
 
     def call_hu_from_discard(self, hu_tiles: dict[WindPosition, list[list[MahjongTile]]], tile: MahjongTile, other_player_idx: int) -> None:
-        print(f'Player{self.idx} Call Hu {hu_tiles} from discard tile {tile}. Hu!')
-        print(f'The discard tile is from Player{other_player_idx}.')
+        log.info('hu', 'Player{player} Call Hu {hu_tiles} from discard tile {tile}. Hu!\nThe discard tile is from Player{other_player}.', player=self.idx, hu_tiles=hu_tiles, tile=tile, other_player=other_player_idx)
 
     def call_hu_from_wall(self, hu_tiles: dict[WindPosition, list[list[MahjongTile]]], tile: MahjongTile) -> None:
-        print(f'Player{self.idx} Call Self-draw Hu {hu_tiles} with {tile} from wall. Hu!')
+        log.info('hu', 'Player{player} Call Self-draw Hu {hu_tiles} with {tile} from wall. Hu!', player=self.idx, hu_tiles=hu_tiles, tile=tile)
 
     def choose_action(self, pos_actions: ActionPlayer) -> None | int | str:
-        print(pos_actions)
         hu_bool = False if pos_actions['hu'] == None or list(pos_actions['hu'].values()) in ([], [[]]) else True
         kong_bool = False if pos_actions['kong'] == None or list(pos_actions['kong'].values()) in ([], [[]]) else True
         pong_bool = False if pos_actions['pong'] == None or list(pos_actions['pong'].values()) in ([], [[]]) else True
         chow_bool = False if pos_actions['chow'] in (None, [], [[]]) else True
-        print(f'hu_bool: {hu_bool}')
-        print(f'kong_bool: {kong_bool}')
-        print(f'pong_bool: {pong_bool}')
-        print(f'chow_bool: {chow_bool}')
+        if log.debug_on:
+            log.debug('actions', '{pos_actions}\nhu_bool: {hu_bool}\nkong_bool: {kong_bool}\npong_bool: {pong_bool}\nchow_bool: {chow_bool}', pos_actions=pos_actions, hu_bool=hu_bool, kong_bool=kong_bool, pong_bool=pong_bool, chow_bool=chow_bool)
         if not (hu_bool or kong_bool or pong_bool or chow_bool):
             # if can not choose any action
             return None
-        return input_player_action(hu_bool, kong_bool, pong_bool, chow_bool, pos_actions['chow'])
+        return self.agent.choose_claim(self, hu_bool, kong_bool, pong_bool, chow_bool, pos_actions['chow'])
 
     def declare_chow(self, player_chow_seq: list[list[MahjongTile]], tile: MahjongTile) -> None:
         """
@@ -55,144 +75,234 @@ class MahjongPlayer:
         Returns:
             list: None.
         """
-        print(f'debug chow: player_chow_seq{player_chow_seq}')
         tiles_seq = player_chow_seq[0]
-        print(f'Player{self.idx} Declare Chow {tiles_seq}')
+        log.info('chow', 'Player{player} Declare Chow {tiles_seq}', player=self.idx, tiles_seq=tiles_seq)
 
         for tile_chow in tiles_seq:
             if tile_chow != tile:
-                self.tiles_hold.remove(tile_chow)
+                self.remove_tile(tile_chow)
                 self.tiles_discard.append(tile_chow)
 
         self.chow.append(tiles_seq)
-        print(f'Current declared chow: {self.chow}')
+        log.debug('melds', 'Current declared chow: {chow}', chow=self.chow)
 
-    def declare_concealed_kong(self, tiles: deque[MahjongTile], kong_seq: list[MahjongTile]) -> None:
+    def declare_concealed_kong(self, wall: Wall, kong_seq: list[MahjongTile]) -> None:
         # In Mahjong game, the Concealed Kong tile should not be shown to others. Here print the kong seq for debugging.
-        print(f'Player{self.idx} Concealed Kong {kong_seq}.')
+        log.info('kong', 'Player{player} Concealed Kong {kong_seq}.', player=self.idx, kong_seq=kong_seq)
         for _ in range(4):
-            self.tiles_hold.remove(kong_seq[0])
+            self.remove_tile(kong_seq[0])
         self.kong.append(kong_seq)
-        print(f'Current declared kong: {self.kong}')
+        log.debug('melds', 'Current declared kong: {kong}', kong=self.kong)
 
-        if len(tiles) > 0:
+        if wall:
             # Draw from the other side after kong
-            draw_tile = tiles.pop()
-            print(f'Player{self.idx} draws {draw_tile} from the other side of the wall')
-            self.tiles_hold.append(draw_tile)
+            draw_tile = wall.draw_back()
+            log.info('draw', 'Player{player} draws {tile} from the other side of the wall', player=self.idx, tile=draw_tile)
+            self.add_tile(draw_tile)
 
-    def declare_exposed_kong(self, tiles: deque[MahjongTile], tile: MahjongTile) -> None:
+    def declare_exposed_kong(self, wall: Wall, tile: MahjongTile) -> None:
         tiles_seq = [tile] * 4
-        print(f'Player{self.idx} Declare Exposed Kong {tiles_seq}')
+        log.info('kong', 'Player{player} Declare Exposed Kong {tiles_seq}', player=self.idx, tiles_seq=tiles_seq)
         for _ in range(3):
-            self.tiles_hold.remove(tile)
+            self.remove_tile(tile)
             self.tiles_discard.append(tile)
 
         self.kong.append(tiles_seq)
-        print(f'Current declared kong: {self.kong}')
+        log.debug('melds', 'Current declared kong: {kong}', kong=self.kong)
 
-        if len(tiles) > 0:
+        if wall:
             # Draw from the other side after kong
-            draw_tile = tiles.pop()
-            print(f'Player{self.idx} draws {draw_tile} from the other side of the wall')
-            self.tiles_hold.append(draw_tile)
+            draw_tile = wall.draw_back()
+            log.info('draw', 'Player{player} draws {tile} from the other side of the wall', player=self.idx, tile=draw_tile)
+            self.add_tile(draw_tile)
 
-    def declare_exposed_kong_from_pong(self, tiles: deque[MahjongTile], kong_seq: MahjongTile) -> None:
+    def declare_exposed_kong_from_pong(self, wall: Wall, kong_seq: MahjongTile) -> None:
         tiles_seq = [kong_seq] * 4
-        print(f'Player{self.idx} Declare Kong {tiles_seq} from Pong.')
-        self.tiles_hold.remove(kong_seq)
+        log.info('kong', 'Player{player} Declare Kong {tiles_seq} from Pong.', player=self.idx, tiles_seq=tiles_seq)
+        self.remove_tile(kong_seq)
         self.pong.remove([kong_seq] * 3)
         self.kong.append(tiles_seq)
-        print(f'Current declared kong: {self.kong}')
-        print(f'Current declared pong: {self.pong}')
+        log.debug('melds', 'Current declared kong: {kong}', kong=self.kong)
+        log.debug('melds', 'Current declared pong: {pong}', pong=self.pong)
 
-        if len(tiles) > 0:
+        if wall:
             # Draw from the other side after kong
-            draw_tile = tiles.pop()
-            print(f'Player{self.idx} draws {draw_tile} from the other side of the wall')
-            self.tiles_hold.append(draw_tile)
+            draw_tile = wall.draw_back()
+            log.info('draw', 'Player{player} draws {tile} from the other side of the wall', player=self.idx, tile=draw_tile)
+            self.add_tile(draw_tile)
 
     def declare_pong(self, tile: MahjongTile) -> None:
         tiles_seq = [tile] * 3
-        print(f'Player{self.idx} Declare Pong {tiles_seq}')
+        log.info('pong', 'Player{player} Declare Pong {tiles_seq}', player=self.idx, tiles_seq=tiles_seq)
         for _ in range(2):
-            self.tiles_hold.remove(tile)
+            self.remove_tile(tile)
             self.tiles_discard.append(tile)
 
         self.pong.append(tiles_seq)
-        print(f'Current declared pong: {self.pong}')
+        log.debug('melds', 'Current declared pong: {pong}', pong=self.pong)
 
     def discard_tile(self, tile: MahjongTile) -> None:
-        self.tiles_hold.remove(tile)
+        self.remove_tile(tile)
         self.tiles_discard.append(tile)
 
-    def draw_tiles(self, tiles: deque[MahjongTile], draw_num: int = 1) -> MahjongTile:
+    def draw_tiles(self, wall: Wall, draw_num: int = 1) -> MahjongTile:
         for _ in range(draw_num):
-            if len(tiles) > 0:
-                draw_tile = tiles.popleft()
-                print(f'Player{self.idx} draws {draw_tile}')
-                self.tiles_hold.append(draw_tile)
-        print(f'Player{self.idx} holds {self.tiles_hold}')
+            if wall:
+                draw_tile = wall.draw()
+                log.info('draw', 'Player{player} draws {tile}', player=self.idx, tile=draw_tile)
+                self.add_tile(draw_tile)
+        if log.debug_on:
+            log.debug('hand', 'Player{player} holds {tiles_hold}', player=self.idx, tiles_hold=list(self.tiles_hold))
         return draw_tile
 
-def check_chow(tiles_hold: list[MahjongTile], tile: MahjongTile) -> list[list[MahjongTile]]:
-    is_chow_contain = False
-    if tile in tiles_hold:
-        is_chow_contain = True
+    def hand_changed(self, tile_id: None | int = None) -> None:
+        """
+        Drop the cached waits and shanten number, and update the suit masks and the claim index from `self.counts`, called after
+        every change of `self.tiles_hold`.
 
-    chow_tiles = find_chow_tiles(tiles_hold, tile)
-    if not is_chow_contain: 
-        tiles_hold.remove(tile)
+        Args:
+            tile_id: The only tile ID whose count changed, None to rebuild everything from `self.counts`.
 
-    print(f'debug chow, tiles_hold: {tiles_hold}, tile: {tile}, check_chow_tiles:{chow_tiles}')
+        Returns:
+            None.
+        """
+        self._shanten = None
+        self._waits = None
+        if tile_id is None:
+            self.suit_masks = counts_to_suit_masks(self.counts)
+            if self.claims is not None:
+                self.claims.rebuild(self.claims_seat)
+            return
+        if tile_id < SUITED_TILE_ID_NUM:
+            bit = 1 << tile_id % 9
+            if self.counts[tile_id]:
+                self.suit_masks[tile_id // 9] |= bit
+            else:
+                self.suit_masks[tile_id // 9] &= ~bit
+        if self.claims is not None:
+            self.claims.tile_changed(self.claims_seat, tile_id, self.counts[tile_id])
+
+    def remove_tile(self, tile: MahjongTile) -> None:
+        self._tiles_hold.remove(tile)
+        self.counts[tile.tile_id] -= 1
+        self.hand_changed(tile.tile_id)
+
+    def reset(self) -> None:
+        """
+        Clear all tiles for a new round.
+
+        Returns:
+            None.
+        """
+        self.joker = None
+        self.tiles_hold = []
+        self.tiles_discard = []
+        self.pong = []
+        self.kong = []
+        self.chow = []
+
+    def set_joker(self, joker: None | MahjongTile) -> None:
+        """
+        Set the joker tile of the round, the waits with jokers are found by `hand_table.find_joker_waits`.
+
+        Returns:
+            None.
+        """
+        self.joker = joker
+        # the waits depend on the joker, index them again as if the hand changed
+        self.tiles_hold = self._tiles_hold
+
+    @property
+    def shanten(self) -> int:
+        """
+        The shanten number of `self.tiles_hold` with the declared melds, -1 for a complete legal hand and 0 for a ready hand.
+        """
+        if self._shanten is None:
+            self._shanten = cached_calculate_shanten(self.counts, len(self.pong) + len(self.kong) + len(self.chow))
+        return self._shanten
+
+    @property
+    def tiles_hold(self) -> list[MahjongTile]:
+        """
+        The tiles in hand. Change them with `self.add_tile` and `self.remove_tile`, or assign a new list, to keep `self.counts`.
+        """
+        return self._tiles_hold
+
+    @tiles_hold.setter
+    def tiles_hold(self, tiles: list[MahjongTile]) -> None:
+        self._tiles_hold = tiles
+        self.counts = tiles_to_counts(tiles)
+        self.hand_changed()
+
+    @property
+    def waits(self) -> frozenset[MahjongTile]:
+        """
+        The tiles to complete a legal hand with `self.tiles_hold`, empty if the player is not waiting for one tile.
+        """
+        if self._waits is None:
+            if len(self.tiles_hold) % 3 == 1 and self.joker is not None:
+                self._waits = frozenset(TILES[tile_id] for tile_id in find_joker_waits(self.counts, self.joker.tile_id))
+            elif len(self.tiles_hold) % 3 == 1:
+                self._waits = frozenset(TILES[tile_id] for tile_id in cached_find_waits(self.counts))
+            else:
+                self._waits = frozenset()
+        return self._waits
+
+def check_chow(suit_masks: list[int], tile: MahjongTile) -> list[list[MahjongTile]]:
+    chow_tiles = find_chow_seqs(suit_masks, tile)
+
+    if log.debug_on:
+        log.debug('check_chow', 'debug chow, suit_masks: {suit_masks}, tile: {tile}, check_chow_tiles:{chow_tiles}', suit_masks=[f'{mask:09b}' for mask in suit_masks], tile=tile, chow_tiles=chow_tiles)
 
-    if len(chow_tiles) == 0:
-        return []
     return chow_tiles
 
-def check_concealed_kong(tiles_hold: list[MahjongTile]) -> list[list[MahjongTile]]:
-    kong_seqs = count_identical_tiles(tiles_hold)
+def check_concealed_kong(counts: list[int]) -> list[list[MahjongTile]]:
+    kong_seqs = [[TILES[tile_id]] * 4 for tile_id, count in enumerate(counts) if count == 4]
 
-    print(f'debug check_concealed_kong, tiles_hold: {tiles_hold}, check_kong_tiles:{kong_seqs}')
+    if log.debug_on:
+        log.debug('check_kong', 'debug check_concealed_kong, check_kong_tiles:{kong_seqs}', kong_seqs=kong_seqs)
 
-    if len(kong_seqs) == 0:
-        return []
     return kong_seqs
 
-def check_exposed_kong(tiles_hold: list[MahjongTile], tile: MahjongTile) -> None | MahjongTile:
-    print(f'--------------check_exposed_kong tiles_hold:{tiles_hold}, tile: {tile}, {find_identical_tiles(tiles_hold, tile)}')
-    if find_identical_tiles(tiles_hold, tile) == 4:
-        print(f'debug check_exposed_kong, tiles_hold: {tiles_hold}, check_kong_tiles:{tile}')
+def check_exposed_kong(counts: list[int], tile: MahjongTile) -> None | MahjongTile:
+    if log.debug_on:
+        log.debug('check_kong', 'check_exposed_kong tile: {tile}, {identical_num}', tile=tile, identical_num=counts[tile.tile_id] + 1)
+    if counts[tile.tile_id] == 3:
         return tile
     return None
 
-def check_exposed_kong_from_pong(tiles_hold: list[MahjongTile], pong: list[list[MahjongTile]]) -> list[MahjongTile]:
-    if len(pong) == 0:
-        return []
-    declare_pong_tiles = [tiles[0] for tiles in pong]
-    kong_from_pong_seqs = list(find_tiles_in_tiles(tiles_hold, declare_pong_tiles))
+def check_exposed_kong_from_pong(counts: list[int], pong: list[list[MahjongTile]]) -> list[MahjongTile]:
+    kong_from_pong_seqs = [tiles[0] for tiles in pong if counts[tiles[0].tile_id]]
     if len(kong_from_pong_seqs) == 0:
         return []
-    print(f'Can exposed kong from pong in: {kong_from_pong_seqs}')
+    log.debug('check_kong', 'Can exposed kong from pong in: {kong_from_pong_seqs}', kong_from_pong_seqs=kong_from_pong_seqs)
     return kong_from_pong_seqs
 
-def check_hu_from_discard(tiles_hold: list[MahjongTile], tile_discard: None | MahjongTile = None) -> list[list[MahjongTile]]:
+def check_hu_from_discard(tiles_hold: list[MahjongTile], tile_discard: None | MahjongTile = None, joker: None | MahjongTile = None) -> list[list[MahjongTile]]:
     # check tiles held in hand (usually after draw tiles) when tile_discard is None
     # check tiles held in hand and with discarded one tile when tile_discard is not None
     check_tiles = tiles_hold.copy() if tile_discard is None else tiles_hold.copy() + [tile_discard]
     # if complete legal hand, legal_hand is list[list[MahjongTile]], else []
-    legal_hand = check_legal_hand(check_tiles)
+    legal_hand = check_legal_hand(check_tiles, joker)
     return legal_hand
 
-def check_hu_from_wall(tiles_hold: list[MahjongTile]) -> list[list[MahjongTile]]:
-    legal_hand = check_legal_hand(tiles_hold)
+def check_hu_from_wall(tiles_hold: list[MahjongTile], joker: None | MahjongTile = None) -> list[list[MahjongTile]]:
+    legal_hand = check_legal_hand(tiles_hold, joker)
     if len(legal_hand) > 0:
-        print(f'Can self-hu from wall: {legal_hand}')
+        log.debug('check_hu', 'Can self-hu from wall: {legal_hand}', legal_hand=legal_hand)
     return legal_hand
 
-def check_pong(tiles_hold: list[MahjongTile], tile: MahjongTile) -> list[MahjongTile]:
-    print(f'====================tiles_hold:{tiles_hold}, tile: {tile}, {find_identical_tiles(tiles_hold, tile)}')
-    if find_identical_tiles(tiles_hold, tile) == 3:
-        print(f'debug check_pong, tiles_hold: {tiles_hold}, check_pong_tiles:{tile}')
+def check_pong(counts: list[int], tile: MahjongTile) -> list[MahjongTile]:
+    if log.debug_on:
+        log.debug('check_pong', 'check_pong tile: {tile}, {identical_num}', tile=tile, identical_num=counts[tile.tile_id] + 1)
+    if counts[tile.tile_id] == 2:
         return [tile] * 3
     return []
+
+def test_waits() -> None:
+    player = MahjongPlayer(0)
+    player.tiles_hold = [MahjongTile('bamboo', number) for number in [1, 1, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 9]]
+    print(sorted(player.waits), player.shanten)  # [bamboo1, bamboo2, ..., bamboo9] 0
+    player.discard_tile(MahjongTile('bamboo', 5))
+    player.add_tile(MahjongTile('dots', 1))
+    print(sorted(player.waits), player.shanten)  # [dots1] 0
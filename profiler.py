@@ -0,0 +1,171 @@
+from collections import Counter
+from collections.abc import Callable
+from functools import wraps
+import time
+from types import ModuleType
+from typing import Any, TypedDict
+
+import game as game_module
+import hand_cache
+import hand_table
+import player as player_module
+from game import MahjongGame
+
+# The phases timed as methods of the profiled `MahjongGame`, the time of a phase includes the phases it calls
+game_phases: tuple[str, ...] = ('build_walls', 'deal_starting_tiles', 'check_current_player', 'check_other_players', 'decide_other_player_action')
+
+# The rule checks timed while the profiled game is running, the same functions imported by `game`
+rule_checks: tuple[str, ...] = ('check_chow', 'check_concealed_kong', 'check_exposed_kong_from_pong', 'check_hu_from_discard', 'check_hu_from_wall')
+
+# The entry points of the engine, rule checks are only patched while one of them is running
+_game_entries: tuple[str, ...] = ('play_round', 'run', 'start_game')
+
+class PhaseStats(TypedDict):
+    calls: int
+    seconds: float
+
+class GameProfiler:
+    """
+        Opt-in timing and counters of `MahjongGame`, pass one to `MahjongGame(profiler=...)`. Games without a profiler run the plain methods,
+        so there is no overhead when disabled.
+
+        Besides the phases, the counters are:
+            `check_legal_hand`: the legal hand checks, from `check_hu_*`.
+            `suit_table_lookups`: the legal hand lookups in the suit tables, from `check_legal_hand` and the waits.
+            `shanten_blocks`: the new suit decompositions for shanten numbers, which are memoized across games.
+            `<name>_cache_hits`, `<name>_cache_misses`, `<name>_cache_evictions`: the lookups of every cache in `hand_cache`.
+
+        The profiler patches the rule checks in `game`, `player`, `hand_cache`, and `hand_table` while the profiled game is running,
+        so profile only one game at a time in one process.
+    """
+    def __init__(self) -> None:
+        self.phases: dict[str, PhaseStats] = {}
+        self.counters: Counter[str] = Counter()
+        self.games_num: int = 0
+        self._depth: int = 0  # the nesting of game entry calls
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            'games': self.games_num,
+            'phases': {name: dict(stats) for name, stats in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+    def attach(self, game: MahjongGame) -> None:
+        """
+            Wrap the phases and the entry points of `game` as instance attributes.
+
+            Returns:
+                None.
+        """
+        for name in game_phases:
+            setattr(game, name, self.timed(name, getattr(game, name)))
+        for name in _game_entries:
+            setattr(game, name, self._entry(getattr(game, name)))
+        game.claims.resolve = self.timed('claims.resolve', game.claims.resolve)  # type: ignore[method-assign]
+        self.games_num += 1
+
+    def merge(self, other: 'GameProfiler | dict[str, Any]') -> None:
+        """
+            Add the results of another profiler, or of its `as_dict`, e.g., from a worker process.
+
+            Returns:
+                None.
+        """
+        other_dict = other.as_dict() if isinstance(other, GameProfiler) else other
+        self.games_num += other_dict['games']
+        for name, stats in other_dict['phases'].items():
+            phase = self.phases.setdefault(name, PhaseStats(calls=0, seconds=0.0))
+            phase['calls'] += stats['calls']
+            phase['seconds'] += stats['seconds']
+        self.counters.update(other_dict['counters'])
+
+    def report(self) -> str:
+        """
+            Returns:
+                str: A table of all phases sorted by time, and the counters, per game.
+        """
+        games_num = max(self.games_num, 1)
+        lines = [f'{self.games_num} games', f'{'phase':<32}{'calls/game':>12}{'ms/game':>12}{'us/call':>12}']
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1]['seconds']):
+            us_per_call = stats['seconds'] / max(stats['calls'], 1) * 1e6
+            lines.append(f'{name:<32}{stats['calls'] / games_num:12.1f}{stats['seconds'] / games_num * 1e3:12.3f}{us_per_call:12.2f}')
+        for name, count in sorted(self.counters.items()):
+            lines.append(f'{name:<32}{count / games_num:12.1f}')
+        return '\n'.join(lines)
+
+    def timed(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """
+            Returns:
+                Callable: `func` recording its calls and time in `self.phases[name]`.
+        """
+        stats = self.phases.setdefault(name, PhaseStats(calls=0, seconds=0.0))
+        perf_counter = time.perf_counter
+
+        @wraps(func)
+        def timed_func(*args: Any, **kwargs: Any) -> Any:
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats['calls'] += 1
+                stats['seconds'] += perf_counter() - start
+        return timed_func
+
+    def _counted(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        counters = self.counters
+
+        @wraps(func)
+        def counted_func(*args: Any, **kwargs: Any) -> Any:
+            counters[name] += 1
+            return func(*args, **kwargs)
+        return counted_func
+
+    def _entry(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        def entry_func(*args: Any, **kwargs: Any) -> Any:
+            if self._depth > 0:
+                return func(*args, **kwargs)
+            patches = self._patches()
+            originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+            blocks_num = len(hand_table._blocks_memo)
+            caches_stats = hand_cache.cache_stats()
+            for module, name, patched in patches:
+                setattr(module, name, patched)
+            self._depth += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                for module, name, original in originals:
+                    setattr(module, name, original)
+                self.counters['shanten_blocks'] += len(hand_table._blocks_memo) - blocks_num
+                for cache_name, stats in hand_cache.cache_stats().items():
+                    for stat in ('hits', 'misses', 'evictions'):
+                        self.counters[f'{cache_name}_cache_{stat}'] += int(stats[stat] - caches_stats[cache_name][stat])
+        return entry_func
+
+    def _patches(self) -> list[tuple[ModuleType, str, Callable[..., Any]]]:
+        patches: list[tuple[ModuleType, str, Callable[..., Any]]] = [
+            (game_module, name, self.timed(name, getattr(game_module, name))) for name in rule_checks
+        ]
+        patches.append((player_module, 'check_legal_hand', self._counted('check_legal_hand', player_module.check_legal_hand)))
+        patches.append((hand_cache, 'find_pair_id', self._counted('suit_table_lookups', hand_cache.find_pair_id)))
+        patches.append((hand_table, 'find_pair_id', self._counted('suit_table_lookups', hand_table.find_pair_id)))
+        return patches
+
+def test_game_profiler() -> None:
+    import random
+    from agents import MahjongAgent, RandomAgent
+    from events import LogLevel, log
+    from option_config import set_options_config
+
+    profiler = GameProfiler()
+    for seed in range(2):
+        agents: list[MahjongAgent] = [RandomAgent(random.Random(seed * 4 + seat)) for seat in range(4)]
+        game = MahjongGame(set_options_config(), agents, profiler=profiler)
+        with log.at_level(LogLevel.SILENT):
+            game.start_game()
+            game.play_round()
+    print(profiler.games_num, profiler.phases['build_walls']['calls'], profiler.phases['check_other_players']['calls'] > 0)  # 2 2 True
+    print(game_module.check_chow is player_module.check_chow)  # True
@@ -0,0 +1,324 @@
+from collections.abc import Iterable, Iterator
+from enum import IntEnum
+import mmap
+import struct
+from types import TracebackType
+from typing import BinaryIO, Literal
+
+from events import LogLevel, log
+from option_config import joker_offset
+from player import MahjongPlayer
+from rules import compile_rules
+from tiles import TILES, MahjongTile, WindPosition
+from wall import Wall
+
+RECORD_MAGIC: bytes = b'MJGR'
+
+ARCHIVE_MAGIC: bytes = b'MJGA'
+
+RECORD_VERSION: int = 1
+
+# magic, version, options flags(suited, honors, bonus), joker(-1 if no joker), seed, dealer position, player idx at every position,
+# tiles in the wall, actions
+_header = struct.Struct('<4sBBbQB4sHI')
+
+# action, position, tile ID
+_action = struct.Struct('<BBB')
+
+# one offset in the index, and the offsets of one game and the next one
+_offset = struct.Struct('<Q')
+_offsets = struct.Struct('<QQ')
+
+# index offset, games, magic
+_archive_footer = struct.Struct('<QQ4s')
+
+class Action(IntEnum):
+    DRAW = 0  # draw from the wall, the tile drawn
+    DISCARD = 1  # the tile discarded
+    CHOW = 2  # the first tile of the chow seq, with the last discard tile
+    PONG = 3  # the tile to pong, the last discard tile
+    EXPOSED_KONG = 4  # the tile to kong, the last discard tile
+    CONCEALED_KONG = 5  # the tile to kong, from the hand
+    KONG_FROM_PONG = 6  # the tile added to the declared pong
+    HU_WALL = 7  # the tile drawn to complete the legal hand
+    HU_DISCARD = 8  # the discard tile to complete the legal hand
+
+class GameRecord:
+    """
+        One round as a compact binary stream: the options config, the seed, the seats, the wall in dealing order, and every action
+        after the starting tiles are dealt, 3 bytes per action.
+    """
+    def __init__(self, options_config: dict[str, bool | int], dealer_position: WindPosition, seat_players: list[int], wall: Iterable[MahjongTile], seed: int = 0) -> None:
+        """
+        Args:
+            options_config: The options from `option_config.set_options_config`.
+            dealer_position: The position of the dealer in this round.
+            seat_players: The player idx at every position, in the order of `WindPosition` values.
+            wall: The tiles in dealing order, the starting tiles are dealt from the left and the kong tiles are drawn from the right.
+            seed: The seed the game was played with, 0 if unknown.
+        """
+        self.options_config = options_config
+        self.dealer_position = dealer_position
+        self.seat_players = seat_players
+        self.wall: bytes = bytes(tile.tile_id for tile in wall)
+        self.seed = seed
+        self.actions: bytearray = bytearray()
+
+    def add_action(self, action: Action, position: WindPosition, tile: MahjongTile) -> None:
+        self.actions += _action.pack(action, position.value, tile.tile_id)
+
+    @property
+    def actions_num(self) -> int:
+        return len(self.actions) // _action.size
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview) -> 'GameRecord':
+        """
+            Parse a record written by `GameRecord.to_bytes`, extra bytes after the record are ignored.
+
+            Returns:
+                GameRecord: The record.
+        """
+        if len(data) < _header.size:
+            raise ValueError('Truncated game record.')
+        magic, version, flags, joker, seed, dealer, seats, wall_num, actions_num = _header.unpack_from(data)
+        if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise ValueError(f'Not a game record of version {RECORD_VERSION}.')
+        wall_start = _header.size
+        actions_start = wall_start + wall_num
+        actions_stop = actions_start + actions_num * _action.size
+        if len(data) < actions_stop:
+            raise ValueError('Truncated game record.')
+        options_config: dict[str, bool | int] = {
+            'suited': bool(flags & 1),
+            'honors': bool(flags & 2),
+            'bonus': bool(flags & 4),
+            'joker': False if joker < 0 else joker,
+        }
+        record = GameRecord(options_config, WindPosition(dealer), list(seats), [], seed)
+        record.wall = bytes(data[wall_start:actions_start])
+        record.actions = bytearray(data[actions_start:actions_stop])
+        return record
+
+    def iter_actions(self) -> Iterator[tuple[Action, WindPosition, MahjongTile]]:
+        for action, position, tile_id in _action.iter_unpack(self.actions):
+            yield Action(action), WindPosition(position), TILES[tile_id]
+
+    @property
+    def size(self) -> int:
+        return _header.size + len(self.wall) + len(self.actions)
+
+    def to_bytes(self) -> bytes:
+        flags = self.options_config['suited'] | self.options_config['honors'] << 1 | self.options_config['bonus'] << 2
+        joker_c = joker_offset(self.options_config)
+        joker = -1 if joker_c is None else joker_c
+        header = _header.pack(RECORD_MAGIC, RECORD_VERSION, flags, joker, self.seed, self.dealer_position.value, bytes(self.seat_players), len(self.wall), self.actions_num)
+        return header + self.wall + self.actions
+
+class GameReplay:
+    """
+        Rebuild the state of a recorded round, step by step. The state after `self.step` actions is kept in `self.position_players`,
+        `self.wall` and the other attributes named the same as in `MahjongGame`.
+    """
+    def __init__(self, record: GameRecord) -> None:
+        self.record = record
+        self.actions = list(record.iter_actions())
+        self.wall: Wall = Wall()
+        self.position_players: dict[WindPosition, MahjongPlayer] = {}
+        self.dealer_position: WindPosition = record.dealer_position
+        self.current_position: WindPosition = record.dealer_position
+        self.joker: None | MahjongTile = None
+        self.tile_discard: None | MahjongTile = None  # the last discard tile, to chow, pong, or kong
+        self.hu_position: None | WindPosition = None
+        self.hu_type: None | Literal['wall', 'discard'] = None
+        self.step: int = 0  # the count of actions applied
+        self.deal_starting_tiles()
+
+    def apply(self, action: Action, position: WindPosition, tile: MahjongTile) -> None:
+        """
+            Apply one action the same way `MahjongGame` does, the events are not logged.
+
+            Returns:
+                None.
+        """
+        player = self.position_players[position]
+        with log.at_level(LogLevel.SILENT):
+            if action == Action.DRAW:
+                draw_tile = player.draw_tiles(self.wall)
+                if draw_tile is not tile:
+                    raise ValueError(f'Corrupt game record: expected to draw {tile}, got {draw_tile}.')
+            elif action == Action.DISCARD:
+                player.discard_tile(tile)
+                self.tile_discard = tile
+            elif action == Action.CHOW:
+                player.declare_chow([[tile, tile + 1, tile + 2]], self._claimed_tile())
+            elif action == Action.PONG:
+                player.declare_pong(self._claimed_tile())
+            elif action == Action.EXPOSED_KONG:
+                player.declare_exposed_kong(self.wall, self._claimed_tile())
+            elif action == Action.CONCEALED_KONG:
+                player.declare_concealed_kong(self.wall, [tile] * 4)
+            elif action == Action.KONG_FROM_PONG:
+                player.declare_exposed_kong_from_pong(self.wall, tile)
+            else:
+                self.hu_position = position
+                self.hu_type = 'wall' if action == Action.HU_WALL else 'discard'
+        self.current_position = position
+        self.step += 1
+
+    def deal_starting_tiles(self) -> None:
+        """
+            Reset all players and deal the starting tiles from the recorded wall, the same as `MahjongGame.deal_starting_tiles`.
+
+            Returns:
+                None.
+        """
+        self.wall.build(self.record.wall)
+        rules = compile_rules(self.record.options_config)
+        self.position_players = {
+            WindPosition(value): MahjongPlayer(player_idx, rules=rules) for value, player_idx in enumerate(self.record.seat_players)
+        }
+        self.dealer_position = self.record.dealer_position
+        self.current_position = self.dealer_position
+        self.joker = None
+        self.tile_discard = None
+        self.hu_position = None
+        self.hu_type = None
+        self.step = 0
+        with log.at_level(LogLevel.SILENT):
+            for i in range(4):
+                for idx_pos in range(4):
+                    self.position_players[self.dealer_position + idx_pos].draw_tiles(self.wall, 4 if i != 3 else 1)
+            self.position_players[self.dealer_position].draw_tiles(self.wall)
+        if rules.joker_ids is not None:
+            self.joker = TILES[rules.joker_ids[self.wall.draw().tile_id]]
+            for player in self.position_players.values():
+                player.set_joker(self.joker)
+
+    def seek(self, step: int) -> None:
+        """
+            Rebuild the state after the first `step` actions, seeking backwards deals the starting tiles again.
+
+            Returns:
+                None.
+        """
+        if not 0 <= step <= len(self.actions):
+            raise IndexError(f'Step {step} out of range [0, {len(self.actions)}].')
+        if step < self.step:
+            self.deal_starting_tiles()
+        while self.step < step:
+            self.apply(*self.actions[self.step])
+
+    def _claimed_tile(self) -> MahjongTile:
+        if self.tile_discard is None:
+            raise ValueError('Corrupt game record: claim before any discard.')
+        return self.tile_discard
+
+class ArchiveReader:
+    """
+        Read an archive written by `ArchiveWriter` through a memory map, `reader[k]` seeks to game k with the offset index
+        without parsing the other games.
+    """
+    def __init__(self, path: str) -> None:
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC or len(self.mmap) < len(ARCHIVE_MAGIC) + _archive_footer.size:
+            self.close()
+            raise ValueError(f'{path} is not a game archive.')
+        index_offset, games_num, magic = _archive_footer.unpack_from(self.mmap, len(self.mmap) - _archive_footer.size)
+        if magic != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a complete game archive.')
+        self.index_offset: int = index_offset
+        self.games_num: int = games_num
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+    def __exit__(self, exc_type: None | type[BaseException], exc: None | BaseException, tb: None | TracebackType) -> None:
+        self.close()
+
+    def __getitem__(self, game_idx: int) -> GameRecord:
+        if game_idx < 0:
+            game_idx += len(self)
+        if not 0 <= game_idx < len(self):
+            raise IndexError(f'Game {game_idx} out of range.')
+        start, stop = _offsets.unpack_from(self.mmap, self.index_offset + game_idx * _offset.size)
+        return GameRecord.from_bytes(self.mmap[start:stop])
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        for game_idx in range(len(self)):
+            yield self[game_idx]
+
+    def __len__(self) -> int:
+        return self.games_num
+
+    def close(self) -> None:
+        self.mmap.close()
+        self.file.close()
+
+class ArchiveWriter:
+    """
+        Write game records one after another, and the offset index at the end when closed.
+    """
+    def __init__(self, path: str) -> None:
+        self.file: BinaryIO = open(path, 'wb')
+        self.file.write(ARCHIVE_MAGIC)
+        self.offsets: list[int] = []
+        self.offset = len(ARCHIVE_MAGIC)
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+    def __exit__(self, exc_type: None | type[BaseException], exc: None | BaseException, tb: None | TracebackType) -> None:
+        self.close()
+
+    def add(self, record: GameRecord | bytes) -> None:
+        data = record.to_bytes() if isinstance(record, GameRecord) else record
+        self.offsets.append(self.offset)
+        self.file.write(data)
+        self.offset += len(data)
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        # the offset of the index is the end of the last game
+        self.offsets.append(self.offset)
+        for offset in self.offsets:
+            self.file.write(_offset.pack(offset))
+        self.file.write(_archive_footer.pack(self.offset, len(self.offsets) - 1, ARCHIVE_MAGIC))
+        self.file.close()
+
+def test_game_replay() -> None:
+    import os
+    import random
+    import tempfile
+    from agents import MahjongAgent, RandomAgent
+    from game import MahjongGame
+    from option_config import set_options_config
+
+    agents: list[MahjongAgent] = [RandomAgent(random.Random(seat)) for seat in range(4)]
+    game = MahjongGame(set_options_config(), agents, record=True)
+    with log.at_level(LogLevel.SILENT):
+        game.start_game()
+        game.play_round()
+    assert game.record is not None and game.position_players is not None
+    record = GameRecord.from_bytes(game.record.to_bytes())
+    replay = GameReplay(record)
+    replay.seek(record.actions_num)
+    print(all(sorted(replay.position_players[pos].tiles_hold) == sorted(player.tiles_hold) for pos, player in game.position_players.items()), replay.hu_position == game.hu_position)  # True True
+    # the table seed is recorded, and replays the same round with the same agents
+    again = MahjongGame(set_options_config(), [RandomAgent(random.Random(seat)) for seat in range(4)], record=True, rng=record.seed)
+    with log.at_level(LogLevel.SILENT):
+        again.start_game()
+        again.play_round()
+    assert again.record is not None
+    print(record.seed == game.seed, again.record.to_bytes() == record.to_bytes())  # True True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'games.mjga')
+        with ArchiveWriter(path) as writer:
+            for _ in range(3):
+                writer.add(record)
+        with ArchiveReader(path) as reader:
+            print(len(reader), reader[2].to_bytes() == record.to_bytes())  # 3 True
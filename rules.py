@@ -0,0 +1,92 @@
+from array import array
+from typing import Any
+
+from option_config import joker_offset
+from scoring import ScoreTable, default_table
+from tiles import TILE_ID_NUM, TILES, tile_set
+
+# The special legal hands which can be enabled, every one would be a bool option of `option_config.set_options_config`, none yet
+SPECIAL_HANDS: tuple[str, ...] = ()
+
+_rule_sets: dict[tuple[Any, ...], 'RuleSet'] = {}
+
+class RuleSet:
+    """
+        The options compiled once into lookup tables, immutable and shared by all games with the same options, see `compile_rules`.
+    """
+    __slots__ = ('key', 'tile_ids', 'joker_offset', 'joker_ids', 'special_hands', 'score_table')
+
+    key: tuple[Any, ...]  # (suited, honors, bonus, joker offset, special hands)
+    tile_ids: array[int]  # all tiles in the game, shared, see `tiles.tile_set`
+    joker_offset: None | int
+    joker_ids: None | tuple[int, ...]  # the joker tile ID for every drawn tile ID
+    special_hands: frozenset[str]  # the enabled names in `SPECIAL_HANDS`
+    score_table: ScoreTable
+
+    def __init__(self, options_config: dict[str, bool | int], score_table: None | ScoreTable = None) -> None:
+        key = _rules_key(options_config)
+        offset = key[3]
+        special_hands = frozenset(key[4])
+        set_ = object.__setattr__
+        set_(self, 'key', key)
+        set_(self, 'tile_ids', tile_set(options_config))
+        set_(self, 'joker_offset', offset)
+        set_(self, 'joker_ids', None if offset is None else tuple((TILES[tile_id] + offset).tile_id for tile_id in range(TILE_ID_NUM)))
+        set_(self, 'special_hands', special_hands)
+        set_(self, 'score_table', score_table if score_table is not None else default_table)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # rebuilt from the options, `__setattr__` refuses the default copy and pickle protocol
+        return (RuleSet, (self.options_config, self.score_table))
+
+    def __repr__(self) -> str:
+        return f'RuleSet({self.options_config})'
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError('RuleSet is immutable.')
+
+    @property
+    def options_config(self) -> dict[str, bool | int]:
+        """
+            The options this rule set is compiled from, as a new dict.
+        """
+        suited, honors, bonus, offset, special_hands = self.key
+        options_config: dict[str, bool | int] = {'suited': suited, 'honors': honors, 'bonus': bonus, 'joker': False if offset is None else offset}
+        for name in SPECIAL_HANDS:
+            options_config[name] = name in special_hands
+        return options_config
+
+def compile_rules(options_config: 'dict[str, bool | int] | RuleSet') -> RuleSet:
+    """
+        Compile the options from `option_config.set_options_config`, the same options share one cached `RuleSet`.
+
+        Returns:
+            RuleSet: The compiled options, or `options_config` itself if it is already compiled.
+    """
+    if isinstance(options_config, RuleSet):
+        return options_config
+    key = _rules_key(options_config)
+    rules = _rule_sets.get(key)
+    if rules is None:
+        rules = RuleSet(options_config)
+        _rule_sets[key] = rules
+    return rules
+
+def _rules_key(options_config: dict[str, bool | int]) -> tuple[Any, ...]:
+    return (
+        bool(options_config['suited']), bool(options_config['honors']), bool(options_config['bonus']), joker_offset(options_config),
+        tuple(name for name in SPECIAL_HANDS if options_config.get(name, False)),
+    )
+
+def test_compile_rules() -> None:
+    from option_config import set_options_config
+
+    rules = compile_rules(set_options_config(joker=1))
+    print(rules is compile_rules(rules.options_config), len(rules.tile_ids), rules.special_hands)  # True 136 frozenset()
+    assert rules.joker_ids is not None
+    print(TILES[rules.joker_ids[8]], TILES[rules.joker_ids[27]], compile_rules(set_options_config()).joker_ids)  # bamboo1 dragons2 None
+    try:
+        rules.joker_offset = None
+    except AttributeError as e:
+        print(e)  # RuleSet is immutable.
+
@@ -0,0 +1,187 @@
+from collections import Counter, deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+import json
+import os
+from typing import Any, Literal, NotRequired, TextIO, TypedDict
+
+from advisor import AdvisorAgent
+from agents import MahjongAgent, RandomAgent, ShantenAgent
+from events import LogLevel, log
+from game import MahjongGame, players_num
+from option_config import set_options_config
+from profiler import GameProfiler
+from record import ArchiveWriter
+from seeding import derive_seed, spawn_rng
+
+# The bots can be chosen by name, so that the choice can be sent to worker processes
+agent_types: dict[str, type[RandomAgent]] = {
+    'random': RandomAgent,
+    'shanten': ShantenAgent,
+    'advisor': AdvisorAgent,
+}
+
+class GameResult(TypedDict):
+    game_idx: int
+    seed: int
+    dealer_seat: int  # the value of the dealer `WindPosition`
+    hu_seat: int  # the value of the winner `WindPosition`, -1 when draw
+    hu_type: None | Literal['wall', 'discard']
+    turns: int
+    fan: int  # the fan of the winning hand, 0 when draw
+    record: NotRequired[bytes]  # the `record.GameRecord` bytes, only when the game is recorded
+    profile: NotRequired[dict[str, Any]]  # the `profiler.GameProfiler.as_dict` of the game, only when the game is profiled
+
+class BatchStats:
+    """
+        Aggregate the results of many games.
+    """
+    def __init__(self) -> None:
+        self.games_num: int = 0
+        self.draws_num: int = 0
+        self.turns_num: int = 0
+        self.fan_num: int = 0
+        self.hu_seats: Counter[int] = Counter()
+        self.hu_types: Counter[str] = Counter()
+        self.profiler: None | GameProfiler = None  # the profiles of all profiled games
+
+    def add(self, result: GameResult) -> None:
+        self.games_num += 1
+        self.turns_num += result['turns']
+        if result['hu_type'] is None:
+            self.draws_num += 1
+        else:
+            self.hu_seats[result['hu_seat']] += 1
+            self.hu_types[result['hu_type']] += 1
+            self.fan_num += result['fan']
+        if 'profile' in result:
+            if self.profiler is None:
+                self.profiler = GameProfiler()
+            self.profiler.merge(result['profile'])
+
+    def summary(self) -> dict[str, float | int | dict[str, int]]:
+        games_num = max(self.games_num, 1)
+        return {
+            'games': self.games_num,
+            'draw_rate': self.draws_num / games_num,
+            'mean_turns': self.turns_num / games_num,
+            'mean_fan': self.fan_num / max(self.games_num - self.draws_num, 1),  # per winning hand
+            'hu_seats': {str(seat): self.hu_seats[seat] for seat in range(players_num)},
+            'hu_types': {hu_type: self.hu_types[hu_type] for hu_type in ('wall', 'discard')},
+        }
+
+def game_seed(master_seed: int, game_idx: int) -> int:
+    """
+        Derive the seed of one game from the master seed, independent of how the games are split across workers.
+
+        Returns:
+            int: A 64-bit seed.
+    """
+    return derive_seed(master_seed, game_idx)
+
+def iter_games(games_num: int, options_config: dict[str, bool | int], master_seed: int = 0, workers: None | int = None, agent: str = 'shanten', chunk_size: int = 64, record: bool = False, profile: bool = False) -> Iterator[GameResult]:
+    """
+        Play `games_num` games across a process pool, and yield the results in game order as soon as they are finished.
+        At most 2 chunks per worker are in flight, so memory stays bounded for any `games_num`.
+
+        Args:
+            games_num: The count of games to play.
+            options_config: The options from `option_config.set_options_config`.
+            master_seed: Every game is seeded with `game_seed(master_seed, game_idx)`.
+            workers: The count of worker processes, `os.cpu_count()` by default, and 1 to play in this process.
+            agent: The name of the bot in `agent_types` for all players.
+            chunk_size: The count of games sent to a worker at once.
+            record: Whether to record every game in the results.
+            profile: Whether to profile every game in the results.
+
+        Returns:
+            Iterator: The results of the games.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = ((game_idx, min(game_idx + chunk_size, games_num)) for game_idx in range(0, games_num, chunk_size))
+    if workers == 1:
+        for start, stop in chunks:
+            yield from play_games(options_config, master_seed, start, stop, agent, record, profile)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[list[GameResult]]] = deque()
+        for start, stop in chunks:
+            pending.append(executor.submit(play_games, options_config, master_seed, start, stop, agent, record, profile))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def play_game(options_config: dict[str, bool | int], seed: int, game_idx: int = 0, agent: str = 'shanten', record: bool = False, profile: bool = False) -> GameResult:
+    """
+        Play one headless round with new players. The same `seed` always replays the same game.
+
+        Returns:
+            GameResult: The result of the game.
+    """
+    # The table shuffles and rolls dice with the stream of `seed`, and every player gets the child stream of its seat
+    agents: list[MahjongAgent] = [agent_types[agent](spawn_rng(seed, seat)) for seat in range(players_num)]
+    profiler = GameProfiler() if profile else None
+    game = MahjongGame(options_config, agents, record, profiler, seed)
+    with log.at_level(LogLevel.SILENT):
+        game.start_game()
+        result = game.play_round()
+    game_result = GameResult(
+        game_idx=game_idx,
+        seed=seed,
+        dealer_seat=result['dealer_position'].value,
+        hu_seat=-1 if result['hu_position'] is None else result['hu_position'].value,
+        hu_type=result['hu_type'],
+        turns=result['turns'],
+        fan=result['fan'],
+    )
+    if game.record is not None:
+        game.record.seed = seed
+        game_result['record'] = game.record.to_bytes()
+    if profiler is not None:
+        game_result['profile'] = profiler.as_dict()
+    return game_result
+
+def play_games(options_config: dict[str, bool | int], master_seed: int, start: int, stop: int, agent: str, record: bool = False, profile: bool = False) -> list[GameResult]:
+    return [play_game(options_config, game_seed(master_seed, game_idx), game_idx, agent, record, profile) for game_idx in range(start, stop)]
+
+def run_batch(games_num: int, options_config: dict[str, bool | int], master_seed: int = 0, workers: None | int = None, agent: str = 'shanten', archive_path: None | str = None, profile: bool = False, output: None | TextIO = None) -> BatchStats:
+    """
+        Play `games_num` games with `iter_games` and aggregate the results, only the aggregates are kept in memory.
+
+        Args:
+            archive_path: If given, record every game and write them in game order to this archive, see `record.ArchiveWriter`.
+            profile: Whether to profile every game, aggregated in `BatchStats.profiler`.
+            output: If given, write every result as one JSON line to this stream as soon as the game is finished, in game order,
+                without the record bytes.
+
+        Returns:
+            BatchStats: The aggregated results.
+    """
+    stats = BatchStats()
+    writer = ArchiveWriter(archive_path) if archive_path is not None else None
+    try:
+        for result in iter_games(games_num, options_config, master_seed, workers, agent, record=writer is not None, profile=profile):
+            stats.add(result)
+            if writer is not None:
+                writer.add(result.pop('record'))
+            if output is not None:
+                output.write(json.dumps(result, separators=(',', ':')))
+                output.write('\n')
+    finally:
+        if writer is not None:
+            writer.close()
+    return stats
+
+def test_play_game() -> None:
+    options_config = set_options_config()
+    print(play_game(options_config, game_seed(0, 3), 3) == list(iter_games(4, options_config, workers=1))[3])  # True
+
+def test_run_batch() -> None:
+    import io
+
+    output = io.StringIO()
+    stats = run_batch(3, set_options_config(), master_seed=1, workers=1, output=output)
+    lines = output.getvalue().splitlines()
+    print(len(lines), stats.summary()['games'], json.loads(lines[2]) == play_game(set_options_config(), game_seed(1, 2), 2))  # 3 3 True
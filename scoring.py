@@ -0,0 +1,205 @@
+from collections.abc import Sequence
+from typing import NotRequired, TypedDict
+
+from hand_table import iter_decompositions
+from tiles import PLAYING_TILE_ID_NUM, SUITED_TILE_ID_NUM, MahjongTile, WindPosition, tiles_to_counts
+
+# The facts of a winning hand, every fact is one bit of the features of the hand. A pattern requires some facts and excludes others,
+# so matching one pattern is 2 bitmask tests, and every decomposition of the hand is only computed once for all patterns.
+FEATURES: tuple[str, ...] = (
+    # the win context
+    'self_draw',  # win from the wall
+    'dealer',
+    'after_kong',  # win with the replacement tile of a kong
+    # the tiles, including the declared melds
+    'bamboo',
+    'characters',
+    'dots',
+    'honors',
+    'one_suit',  # exactly one of bamboo, characters, and dots
+    'simples',  # no terminals(1 and 9) or honors
+    'jokers',  # jokers in hand, the decomposition facts below are not set for a hand with jokers
+    # the decomposition, a kong also counts as a pong
+    'concealed',  # no declared pong, kong or chow, `MahjongPlayer.kong` does not tell concealed kongs apart
+    'kong',
+    'no_chows',
+    'no_pongs',
+    'dragons1_pong',
+    'dragons2_pong',
+    'dragons3_pong',
+    'seat_wind_pong',
+)
+
+FEATURE_BITS: dict[str, int] = {name: 1 << i for i, name in enumerate(FEATURES)}
+
+_SUIT_BITS: tuple[int, ...] = (FEATURE_BITS['bamboo'], FEATURE_BITS['characters'], FEATURE_BITS['dots'])
+
+class Pattern(TypedDict):
+    fan: int
+    require: list[str]  # the features all present in the hand
+    exclude: NotRequired[list[str]]  # the features all absent from the hand
+
+class Score(TypedDict):
+    fan: int
+    patterns: list[str]  # the names of the matched patterns, in the order of the table
+
+class WinContext(TypedDict):
+    self_draw: bool  # from `MahjongGame.hu_from_wall`, otherwise `MahjongGame.hu_from_discard`
+    dealer: bool
+    seat_wind: WindPosition
+    after_kong: NotRequired[bool]
+
+class ScoreTable:
+    """
+        The patterns of a rule set, compiled to the bitmasks of `FEATURES`.
+    """
+    def __init__(self, patterns: dict[str, Pattern]) -> None:
+        self.names: list[str] = []
+        self.fans: list[int] = []
+        self.masks: list[tuple[int, int]] = []  # the require and exclude bitmasks of every pattern
+        for name, pattern in patterns.items():
+            self.names.append(name)
+            self.fans.append(pattern['fan'])
+            self.masks.append((features_mask(pattern['require']), features_mask(pattern.get('exclude', []))))
+
+    def score(self, features: int) -> Score:
+        """
+            Returns:
+                Score: The sum of fan and the names of all patterns matched by `features`.
+        """
+        fan = 0
+        patterns = []
+        for name, pattern_fan, (require, exclude) in zip(self.names, self.fans, self.masks):
+            if features & require == require and not features & exclude:
+                fan += pattern_fan
+                patterns.append(name)
+        return Score(fan=fan, patterns=patterns)
+
+def features_mask(names: Sequence[str]) -> int:
+    """
+        Returns:
+            int: The bitmask of the features.
+    """
+    mask = 0
+    for name in names:
+        if name not in FEATURE_BITS:
+            raise ValueError(f'Unknown feature {name!r}, expected one of {FEATURES}.')
+        mask |= FEATURE_BITS[name]
+    return mask
+
+def hand_features(tiles_hold: list[MahjongTile], pong: list[list[MahjongTile]], kong: list[list[MahjongTile]], chow: list[list[MahjongTile]], context: WinContext, joker: None | MahjongTile = None) -> list[int]:
+    """
+        Compute the features of a winning hand for every decomposition, see `FEATURES` and `hand_table.iter_decompositions`.
+
+        Args:
+            tiles_hold: The tiles in hand with the winning tile, like `MahjongPlayer.tiles_hold` after the win.
+            pong: The declared pongs, like `MahjongPlayer.pong`.
+            kong: The declared kongs, like `MahjongPlayer.kong`.
+            chow: The declared chows, like `MahjongPlayer.chow`.
+            context: How the hand wins.
+            joker: The joker tile of the round.
+
+        Returns:
+            list: The bitmask of the features of every decomposition, only one for a hand with jokers, empty if `tiles_hold` is not a legal hand.
+    """
+    counts = tiles_to_counts(tiles_hold)
+    features = 0
+    if context['self_draw']:
+        features |= FEATURE_BITS['self_draw']
+    if context['dealer']:
+        features |= FEATURE_BITS['dealer']
+    if context.get('after_kong', False):
+        features |= FEATURE_BITS['after_kong']
+
+    # all tiles including the declared melds, and without jokers
+    counts_all = list(counts)
+    for meld in pong + kong + chow:
+        for tile in meld:
+            counts_all[tile.tile_id] += 1
+    if joker is not None and counts[joker.tile_id]:
+        features |= FEATURE_BITS['jokers']
+        counts_all[joker.tile_id] -= counts[joker.tile_id]
+    simples = True
+    for suit_start, suit_bit in zip(range(0, SUITED_TILE_ID_NUM, 9), _SUIT_BITS):
+        if any(counts_all[suit_start:suit_start + 9]):
+            features |= suit_bit
+            simples = simples and not counts_all[suit_start] and not counts_all[suit_start + 8]
+    if any(counts_all[SUITED_TILE_ID_NUM:PLAYING_TILE_ID_NUM]):
+        features |= FEATURE_BITS['honors']
+        simples = False
+    if simples:
+        features |= FEATURE_BITS['simples']
+    if (features & _SUIT_BITS[0]) + (features & _SUIT_BITS[1]) + (features & _SUIT_BITS[2]) in _SUIT_BITS:
+        features |= FEATURE_BITS['one_suit']
+    if features & FEATURE_BITS['jokers']:
+        return [features]
+
+    if not pong and not kong and not chow:
+        features |= FEATURE_BITS['concealed']
+    if kong:
+        features |= FEATURE_BITS['kong']
+    declared_pongs = tuple(meld[0].tile_id for meld in pong + kong)
+    seat_wind_id = SUITED_TILE_ID_NUM + 3 + context['seat_wind'].value
+    features_list = []
+    for _, pongs, chows in iter_decompositions(counts):
+        melds_features = features
+        if not chows and not chow:
+            melds_features |= FEATURE_BITS['no_chows']
+        if not pongs and not declared_pongs:
+            melds_features |= FEATURE_BITS['no_pongs']
+        for tile_id in pongs + declared_pongs:
+            if SUITED_TILE_ID_NUM <= tile_id < SUITED_TILE_ID_NUM + 3:
+                melds_features |= FEATURE_BITS[f'dragons{tile_id - SUITED_TILE_ID_NUM + 1}_pong']
+            elif tile_id == seat_wind_id:
+                melds_features |= FEATURE_BITS['seat_wind_pong']
+        features_list.append(melds_features)
+    return features_list
+
+def score_hand(tiles_hold: list[MahjongTile], pong: list[list[MahjongTile]], kong: list[list[MahjongTile]], chow: list[list[MahjongTile]], context: WinContext, joker: None | MahjongTile = None, table: None | ScoreTable = None) -> None | Score:
+    """
+        Score a winning hand with the patterns of `table`, `default_table` by default, the other arguments are the same as `hand_features`.
+
+        Returns:
+            None | Score: The score of the decomposition with the most fan, None if `tiles_hold` is not a legal hand.
+    """
+    table = table or default_table
+    best = None
+    for features in hand_features(tiles_hold, pong, kong, chow, context, joker):
+        score = table.score(features)
+        if best is None or score['fan'] > best['fan']:
+            best = score
+    return best
+
+default_patterns: dict[str, Pattern] = {
+    'self_draw': Pattern(fan=1, require=['self_draw']),
+    'concealed_hand': Pattern(fan=1, require=['concealed']),
+    'all_simples': Pattern(fan=1, require=['simples']),
+    'all_chows': Pattern(fan=1, require=['no_pongs']),
+    'all_pongs': Pattern(fan=2, require=['no_chows']),
+    'mixed_one_suit': Pattern(fan=3, require=['one_suit', 'honors']),
+    'pure_one_suit': Pattern(fan=6, require=['one_suit'], exclude=['honors']),
+    'all_honors': Pattern(fan=8, require=['honors'], exclude=['bamboo', 'characters', 'dots']),
+    'dragons1_pong': Pattern(fan=1, require=['dragons1_pong']),
+    'dragons2_pong': Pattern(fan=1, require=['dragons2_pong']),
+    'dragons3_pong': Pattern(fan=1, require=['dragons3_pong']),
+    'seat_wind_pong': Pattern(fan=1, require=['seat_wind_pong']),
+    'dead_wall_draw': Pattern(fan=1, require=['self_draw', 'after_kong']),
+}
+
+default_table: ScoreTable = ScoreTable(default_patterns)
+
+def test_score_hand() -> None:
+    context = WinContext(self_draw=True, dealer=False, seat_wind=WindPosition.SOUTH)
+    # bamboo 234 567 99 + dragons1 pong, with a declared pong of bamboo1
+    tiles_hold = [MahjongTile('bamboo', number) for number in [2, 3, 4, 5, 6, 7, 9, 9]] + [MahjongTile('dragons', 1)] * 3
+    pong = [[MahjongTile('bamboo', 1)] * 3]
+    print(score_hand(tiles_hold, pong, [], [], context))  # {'fan': 5, 'patterns': ['self_draw', 'mixed_one_suit', 'dragons1_pong']}
+    tiles_hold = [MahjongTile('dots', number) for number in [2, 2, 2, 3, 4, 5, 6, 6, 6, 7, 7]] + [MahjongTile('winds', 2)] * 3
+    print(score_hand(tiles_hold, [], [], [], WinContext(self_draw=False, dealer=True, seat_wind=WindPosition.SOUTH)))  # {'fan': 5, 'patterns': ['concealed_hand', 'mixed_one_suit', 'seat_wind_pong']}
+    print(score_hand(tiles_hold[1:], [], [], [], context))  # None
+    # bamboo 111 222 333 or 123 123 123 + dots 345 + dots 77, the decomposition with chows scores more here
+    tiles_hold = [MahjongTile('bamboo', number) for number in [1, 1, 1, 2, 2, 2, 3, 3, 3]] + [MahjongTile('dots', number) for number in [3, 4, 5, 7, 7]]
+    print(score_hand(tiles_hold, [], [], [], context, table=ScoreTable({'all_chows': Pattern(fan=1, require=['no_pongs'])})))  # {'fan': 1, 'patterns': ['all_chows']}
+    print(len(hand_features(tiles_hold, [], [], [], context)))  # 2
+    table = ScoreTable({'dealer_win': Pattern(fan=2, require=['dealer']), 'all_simples': default_patterns['all_simples']})
+    print(table.score(features_mask(['dealer', 'simples', 'kong'])))  # {'fan': 3, 'patterns': ['dealer_win', 'all_simples']}
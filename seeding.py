@@ -0,0 +1,52 @@
+import hashlib
+import os
+import random
+import struct
+
+# Every random stream is derived from one seed and a path of keys, e.g. the master seed of a batch -> the game index -> the seat,
+# so that a stream only depends on its own path, not on how many streams were spawned before it or in which process.
+
+def derive_seed(seed: int, *keys: int | str) -> int:
+    """
+        Derive the seed of a child stream from the seed of its parent and the keys of the child.
+
+        Returns:
+            int: A 64-bit seed.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for key in (seed, *keys):
+        digest.update(_encode_key(key))
+    return int.from_bytes(digest.digest(), 'little')
+
+def new_seed() -> int:
+    """
+        A fresh seed from the OS, for tables not given one, so that they can still be replayed from their seed.
+
+        Returns:
+            int: A 64-bit seed.
+    """
+    return int.from_bytes(os.urandom(8), 'little')
+
+def spawn_rng(seed: int, *keys: int | str) -> random.Random:
+    """
+        Returns:
+            random.Random: The child stream of `seed` at the path `keys`, see `derive_seed`.
+    """
+    return random.Random(derive_seed(seed, *keys))
+
+def _encode_key(key: int | str) -> bytes:
+    # a type tag and a length before the bytes of every key, so that no two different paths encode the same, e.g. 1 and '1', or
+    # 'a:b' and 'a', 'b'
+    if isinstance(key, str):
+        tag, data = b's', key.encode()
+    else:
+        tag, data = b'i', key.to_bytes((key.bit_length() + 8) // 8, 'little', signed=True)
+    return tag + struct.pack('<I', len(data)) + data
+
+def test_spawn_rng() -> None:
+    print(derive_seed(7, 3) == derive_seed(7, 3), derive_seed(7, 3) != derive_seed(7, '3', 0), derive_seed(7, 3) < 2 ** 64)  # True True True
+    print(derive_seed(7, 1) != derive_seed(7, '1'), derive_seed(7, 'a:b') != derive_seed(7, 'a', 'b'), derive_seed(7, -1) != derive_seed(7, 255))  # True True True
+    # a child stream does not depend on the siblings drawn before it
+    first = spawn_rng(7, 1).random()
+    [spawn_rng(7, seat).random() for seat in range(4)]
+    print(spawn_rng(7, 1).random() == first, spawn_rng(7, 1).random() != spawn_rng(7, 2).random())  # True True
@@ -0,0 +1,397 @@
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import json
+from typing import Any
+
+from agents import MahjongAgent, ShantenAgent
+from events import LogLevel, log
+from game import MahjongGame, players_num
+from option_config import check_options_config
+from player import MahjongPlayer
+from seeding import new_seed, spawn_rng
+from tiles import TILES, MahjongTile
+
+# Players connect over TCP or a Unix socket and exchange JSON lines, tiles are tile IDs.
+#   client -> server:
+#       {"type": "join", "table": str, "players": int, "seed": int, "options": dict}, `players` (the count of connected players
+#           at the table, the other seats are bots), `seed`, and `options` are only used by the first player joining the table
+#       {"type": "reply", "id": int, "value": ...}, the answer to a decision request
+#   server -> client:
+#       {"type": "seated", "table": str, "seat": int}
+#       {"type": "discard", "id": int, "hand": [int]}, reply the tile ID to discard
+#       {"type": "claim", "id": int, "hand": [int], "hu": bool, "kong": bool, "pong": bool, "chow": bool, "chow_seqs": [[int]]},
+#           reply "hu", "kong", "pong", "skip", or the index in "chow_seqs"
+#       {"type": "kong", "id": int, "hand": [int], "kong_seqs": [int | [int]]}, reply the index in "kong_seqs"
+#       {"type": "result", "table": str, "seat": int, "seed": int, "hu_seat": int, "hu_type": null | str, "fan": int, "turns": int},
+#           `seed` replays the table, a fresh one when the first player sends none
+#       {"type": "error", "message": str}
+#
+# The game engine calls the agents synchronously, so every table plays in a worker thread and its `RemoteAgent`s wait for the replies
+# sent by the event loop, while the event loop only handles the sockets. A slow or disconnected player never blocks other tables, and
+# gets the decision of a `ShantenAgent` after `decision_timeout` seconds.
+
+class PlayerSession:
+    """
+        The connection of one player, matching the replies with the decision requests.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.closed: bool = False
+        self.pending: dict[int, asyncio.Future[Any]] = {}  # the requests waiting for replies, by request ID
+        self.request_id: int = 0
+
+    async def read_replies(self) -> None:
+        """
+            Resolve the pending requests with the replies, until the player disconnects.
+
+            Returns:
+                None.
+        """
+        try:
+            while line := await self.reader.readline():
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    await self.send({'type': 'error', 'message': 'Invalid JSON.'})
+                    continue
+                future = self.pending.get(message.get('id')) if message.get('type') == 'reply' else None
+                if future is not None and not future.done():
+                    future.set_result(message.get('value'))
+        except ConnectionError:
+            pass
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('The player disconnected.'))
+
+    async def request(self, message: dict[str, Any], timeout: float) -> Any:
+        """
+            Send a decision request and wait for the reply.
+
+            Returns:
+                Any: The value of the reply.
+        """
+        self.request_id += 1
+        request_id = self.request_id
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.send({**message, 'id': request_id})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            del self.pending[request_id]
+
+    async def send(self, message: dict[str, Any]) -> None:
+        if self.closed:
+            raise ConnectionError('The player disconnected.')
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        await self.writer.drain()
+
+class RemoteAgent(MahjongAgent):
+    """
+        Decide with the replies of a connected player, called in the thread of the table. The decision of `fallback` is taken when
+        the player does not reply in time, replies an invalid value, or disconnects.
+    """
+    def __init__(self, session: PlayerSession, loop: asyncio.AbstractEventLoop, timeout: float, fallback: MahjongAgent) -> None:
+        self.session = session
+        self.loop = loop
+        self.timeout = timeout
+        self.fallback = fallback
+
+    def ask(self, message: dict[str, Any]) -> Any:
+        """
+            Send a decision request from the thread of the table, and block the table until the reply.
+
+            Returns:
+                Any: The value of the reply, None without a reply.
+        """
+        if self.session.closed:
+            return None
+        future = asyncio.run_coroutine_threadsafe(self.session.request(message, self.timeout), self.loop)
+        try:
+            return future.result()
+        except (TimeoutError, ConnectionError):
+            return None
+
+    def choose_claim(self, player: MahjongPlayer, hu_bool: bool, kong_bool: bool, pong_bool: bool, chow_bool: bool, chow_seqs: None | list[list[MahjongTile]]) -> str | int:
+        chow_seqs = chow_seqs if chow_bool and chow_seqs else []
+        choices: list[str | int] = ['skip']
+        choices += [action for action, bool_ in [('hu', hu_bool), ('kong', kong_bool), ('pong', pong_bool)] if bool_]
+        choices += range(len(chow_seqs))
+        value = self.ask({
+            'type': 'claim', 'hand': tile_ids(player.tiles_hold), 'hu': hu_bool, 'kong': kong_bool, 'pong': pong_bool, 'chow': chow_bool,
+            'chow_seqs': [tile_ids(seq) for seq in chow_seqs],
+        })
+        # bool is also int in JSON decoding, which is not a chow index
+        if value in choices and not isinstance(value, bool):
+            return value
+        return self.fallback.choose_claim(player, hu_bool, kong_bool, pong_bool, chow_bool, chow_seqs)
+
+    def choose_discard(self, player: MahjongPlayer) -> MahjongTile:
+        value = self.ask({'type': 'discard', 'hand': tile_ids(player.tiles_hold)})
+        if isinstance(value, int) and 0 <= value < len(TILES) and TILES[value] in player.tiles_hold:
+            return TILES[value]
+        return self.fallback.choose_discard(player)
+
+    def choose_kong(self, player: MahjongPlayer, kong_seqs: list[MahjongTile | list[MahjongTile]]) -> int:
+        value = self.ask({
+            'type': 'kong', 'hand': tile_ids(player.tiles_hold),
+            'kong_seqs': [seq.tile_id if isinstance(seq, MahjongTile) else tile_ids(seq) for seq in kong_seqs],
+        })
+        if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < len(kong_seqs):
+            return value
+        return self.fallback.choose_kong(player, kong_seqs)
+
+class Table:
+    """
+        One game round, started when `players` players have joined, the other seats are played by `ShantenAgent`s.
+    """
+    def __init__(self, name: str, players: int, seed: int, options_config: dict[str, bool | int]) -> None:
+        self.name = name
+        self.players = players
+        self.seed = seed
+        self.options_config = options_config
+        self.sessions: list[PlayerSession] = []  # the connected player at every seat from 0
+
+    def play(self, loop: asyncio.AbstractEventLoop, decision_timeout: float) -> dict[str, Any]:
+        """
+            Play the round in the thread of the table.
+
+            Returns:
+                dict: The result of the round, the same for all players.
+        """
+        agents: list[MahjongAgent] = []
+        for seat in range(players_num):
+            bot = ShantenAgent(spawn_rng(self.seed, seat))
+            agents.append(RemoteAgent(self.sessions[seat], loop, decision_timeout, bot) if seat < len(self.sessions) else bot)
+        game = MahjongGame(self.options_config, agents, rng=self.seed)
+        game.start_game()
+        result = game.play_round()
+        return {
+            'type': 'result',
+            'table': self.name,
+            'seed': self.seed,
+            'hu_seat': result['hu_player_idx'],
+            'hu_type': result['hu_type'],
+            'fan': result['fan'],
+            'turns': result['turns'],
+        }
+
+class GameServer:
+    """
+        Host many tables in one process, every table plays in one thread of a pool of `max_tables` threads, the tables beyond wait
+        for a free thread.
+    """
+    def __init__(self, max_tables: int = 256, decision_timeout: float = 30.0) -> None:
+        self.decision_timeout = decision_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_tables, thread_name_prefix='table')
+        self.tables: dict[str, Table] = {}  # the tables waiting for players
+        self.tasks: set[asyncio.Task[None]] = set()  # the tables playing
+        self.results_num: int = 0
+        # the game events are not logged while any table plays, the tables play concurrently in threads, so the level is set
+        # once for all of them by the event loop instead of by every table
+        self.playing_num: int = 0
+        self.silent: ExitStack = ExitStack()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+            Seat the player with the first message, then read the replies until the player disconnects.
+
+            Returns:
+                None.
+        """
+        session = PlayerSession(reader, writer)
+        table: None | Table = None
+        try:
+            message = json.loads(await reader.readline() or b'null')
+            if not isinstance(message, dict) or message.get('type') != 'join':
+                raise ValueError('Expected a join message.')
+            table = self.join(session, message)
+            # the seated message is written before the task of a full table starts
+            await session.send({'type': 'seated', 'table': table.name, 'seat': table.sessions.index(session)})
+            await session.read_replies()
+        except (ValueError, TypeError) as e:
+            try:
+                await session.send({'type': 'error', 'message': str(e)})
+            except ConnectionError:
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            session.closed = True
+            writer.close()
+            # leave a table still waiting for players, and drop it when nobody is left
+            if table is not None and self.tables.get(table.name) is table:
+                table.sessions.remove(session)
+                if not table.sessions:
+                    del self.tables[table.name]
+
+    def join(self, session: PlayerSession, message: dict[str, Any]) -> Table:
+        """
+            Seat the player at the table named in `message`, which is created by the first player joining it. The table is started
+            by the last player joining it, without awaiting in between, so that concurrent joins see a table only until it is full.
+
+            Returns:
+                Table: The table of the player.
+        """
+        name = str(message.get('table', ''))
+        table = self.tables.get(name)
+        if table is None:
+            players = int(message.get('players', players_num))
+            if not 1 <= players <= players_num:
+                raise ValueError(f'Expected 1 to {players_num} players, got {players}.')
+            options = message.get('options', {})
+            if not isinstance(options, dict):
+                raise ValueError('Expected a JSON object of options.')
+            options_config = check_options_config(options)
+            table = Table(name, players, int(message.get('seed', new_seed())), options_config)
+            self.tables[name] = table
+        table.sessions.append(session)
+        if len(table.sessions) == table.players:
+            del self.tables[name]
+            task = asyncio.create_task(self.run_table(table))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return table
+
+    async def run_table(self, table: Table) -> None:
+        """
+            Play the round of a full table, and send the result to all players, or an error message if the round fails. The
+            connections of the players are closed in any case.
+
+            Returns:
+                None.
+        """
+        loop = asyncio.get_running_loop()
+        if not self.playing_num:
+            self.silent.enter_context(log.at_level(LogLevel.SILENT))
+        self.playing_num += 1
+        try:
+            result = await loop.run_in_executor(self.executor, table.play, loop, self.decision_timeout)
+            self.results_num += 1
+            messages = [{**result, 'seat': seat} for seat in range(len(table.sessions))]
+        except Exception as e:
+            messages = [{'type': 'error', 'message': f'The table failed: {e!r}'}] * len(table.sessions)
+        finally:
+            self.playing_num -= 1
+            if not self.playing_num:
+                self.silent.close()
+        try:
+            for session, message in zip(table.sessions, messages):
+                try:
+                    await session.send(message)
+                except ConnectionError:
+                    pass
+        finally:
+            for session in table.sessions:
+                session.writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 0, path: None | str = None) -> asyncio.Server:
+        """
+            Start listening on TCP `host`:`port`, or on the Unix socket at `path`. The game events are not logged while tables
+            play, as they play concurrently.
+
+            Returns:
+                asyncio.Server: The started server.
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_client, path)
+        return await asyncio.start_server(self.handle_client, host, port)
+
+def tile_ids(tiles: list[MahjongTile]) -> list[int]:
+    return [tile.tile_id for tile in tiles]
+
+async def scripted_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, table: str, players: int = players_num, seed: None | int = None, reply: bool = True, options: None | dict[str, Any] = None) -> dict[str, Any]:
+    """
+        A scripted player for tests and load tests: join `table`, always call Hu, never claim other actions, and discard the last tile
+        in hand. With `reply` False, never reply to test the timeouts.
+
+        Returns:
+            dict: The result message, or the error message.
+    """
+    join: dict[str, Any] = {'type': 'join', 'table': table, 'players': players}
+    if seed is not None:
+        join['seed'] = seed
+    if options is not None:
+        join['options'] = options
+    writer.write(json.dumps(join).encode() + b'\n')
+    try:
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message['type'] in ('result', 'error'):
+                return message
+            if message['type'] == 'seated' or not reply:
+                continue
+            if message['type'] == 'discard':
+                value: Any = message['hand'][-1]
+            elif message['type'] == 'claim':
+                value = 'hu' if message['hu'] else 'skip'
+            else:
+                value = 0
+            writer.write(json.dumps({'type': 'reply', 'id': message['id'], 'value': value}).encode() + b'\n')
+            await writer.drain()
+        return {'type': 'error', 'message': 'The server disconnected.'}
+    finally:
+        writer.close()
+
+def test_game_server() -> None:
+    async def play() -> list[dict[str, Any]]:
+        server = GameServer(max_tables=8, decision_timeout=0.01)
+        tcp_server = await server.serve()
+        port = tcp_server.sockets[0].getsockname()[1]
+        clients = []
+        # 6 tables with 2 players each, and one table with a player never replying
+        for table_idx in range(7):
+            for _ in range(2 if table_idx < 6 else 1):
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                clients.append(scripted_client(reader, writer, f'table{table_idx}', 2 if table_idx < 6 else 1, seed=table_idx, reply=table_idx < 6))
+        # a table with too few tiles to deal
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        clients.append(scripted_client(reader, writer, 'table7', 1, options={'suited': False}))
+        results = await asyncio.wait_for(asyncio.gather(*clients), 60)
+        # a player leaving a table still waiting for players, the table is dropped
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(json.dumps({'type': 'join', 'table': 'table8', 'players': 2}).encode() + b'\n')
+        seated = json.loads(await reader.readline())
+        waiting = 'table8' in server.tables
+        writer.close()
+
+        async def dropped() -> None:
+            while 'table8' in server.tables:
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(dropped(), 10)
+        results.append({**seated, 'waiting': waiting})
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        server.executor.shutdown()
+        return results
+
+    level = log.level
+    results = asyncio.run(play())
+    print(len(results), all(result['type'] == 'result' for result in results[:13]), results[13]['message'])  # 15 True Expected at least 54 tiles to deal, the options give 28.
+    print(results[0]['hu_seat'] == results[1]['hu_seat'], [result['seat'] for result in results[:2]])  # True [0, 1]
+    print(results[14]['type'], results[14]['waiting'])  # seated True
+    # the level is only changed while the tables play
+    print(log.level == level)  # True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host Mahjong tables for players connecting over TCP or a Unix socket.')
+    parser.add_argument('--host', default='127.0.0.1', help='The TCP host.')
+    parser.add_argument('--port', type=int, default=8765, help='The TCP port.')
+    parser.add_argument('--unix', default=None, help='Listen on the Unix socket at this path instead of TCP.')
+    parser.add_argument('--max-tables', type=int, default=256, help='The count of tables playing at once.')
+    parser.add_argument('--decision-timeout', type=float, default=30.0, help='The seconds to wait for a decision before a bot decides.')
+    args = parser.parse_args()
+
+    async def main() -> None:
+        server = GameServer(args.max_tables, args.decision_timeout)
+        async with await server.serve(args.host, args.port, args.unix) as tcp_server:
+            print(f'Serving on {args.unix or f'{args.host}:{args.port}'}')
+            await tcp_server.serve_forever()
+
+    asyncio.run(main())
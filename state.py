@@ -0,0 +1,370 @@
+from typing import TYPE_CHECKING
+
+from player import MahjongPlayer
+from record import Action, GameRecord
+from rules import RuleSet, compile_rules
+from tiles import TILE_ID_NUM, TILES, MahjongTile, WindPosition
+from wall import Wall
+
+if TYPE_CHECKING:
+    from game import MahjongGame
+
+# The state of one round in a few flat buffers of tile IDs, so that search can clone it and apply or undo actions cheaply:
+#   `wall`: the tiles in dealing order, never changed once dealt, so clones share it. The live wall is drawn from `head`, and the kong
+#       replacement tiles from the tail.
+#   `counts`: the count of every tile ID in the hand of every seat, at `seat * TILE_ID_NUM + tile_id`.
+#   `discards`: (seat, tile ID) pairs in the order they are shown, the same tiles as `MahjongPlayer.tiles_discard`: the discard tiles,
+#       and the tiles from hand of the declared pongs, exposed kongs and chows.
+#   `melds`: (seat, `Action`, tile ID) triples of the declared melds in order, a chow by its smallest tile.
+# The actions are the ones of `record.Action`, applied the same way as `record.GameReplay.apply`.
+
+_NO_TILE: int = 255
+
+# the tiles from hand shown as discards by every claim action
+_SHOWN_NUM: dict[Action, int] = {Action.DISCARD: 1, Action.CHOW: 2, Action.PONG: 2, Action.EXPOSED_KONG: 3}
+
+_KONG_ACTIONS: frozenset[Action] = frozenset({Action.EXPOSED_KONG, Action.CONCEALED_KONG, Action.KONG_FROM_PONG})
+
+class GameState:
+    """
+        A flat copy of the state of one round, see the comments above. `self.clone` copies the buffers only, and every applied action
+        can be undone with `self.undo`. Build one from a dealt `MahjongGame` or a `GameRecord`, and materialize it with
+        `self.players` or `self.restore`.
+    """
+    __slots__ = ('wall', 'head', 'tail', 'counts', 'discards', 'melds', 'seat_players', 'dealer', 'current', 'joker', 'rules', 'tile_discard', 'hu_seat', 'hu_action', 'history')
+
+    def __init__(self, wall: bytes, seat_players: tuple[int, ...], dealer: int, joker: int = _NO_TILE, rules: None | RuleSet = None) -> None:
+        """
+            An empty round before dealing, see `self.from_record` and `self.from_game` to build a dealt one.
+
+            Args:
+                wall: The tile IDs in dealing order.
+                seat_players: The player idx at every seat, in the order of `WindPosition` values.
+                dealer: The seat of the dealer.
+                joker: The tile ID of the joker, 255 without joker.
+                rules: The compiled options of the game, given to the players of `self.players`.
+        """
+        self.wall = wall
+        self.head: int = 0  # the count of tiles drawn from the head
+        self.tail: int = 0  # the count of tiles drawn from the tail
+        self.counts: bytearray = bytearray(4 * TILE_ID_NUM)
+        self.discards: bytearray = bytearray()
+        self.melds: bytearray = bytearray()
+        self.seat_players = seat_players
+        self.dealer = dealer
+        self.current: int = dealer
+        self.joker = joker
+        self.rules = rules
+        self.tile_discard: int = _NO_TILE  # the last discard tile, to chow, pong, or kong
+        self.hu_seat: int = -1
+        self.hu_action: int = -1  # `Action.HU_WALL` or `Action.HU_DISCARD` after a win
+        # (action, seat, tile ID, current seat, last discard tile, kong replacement tile, index of the pong in `self.melds`) of every
+        # applied action, to undo it
+        self.history: list[tuple[int, int, int, int, int, int, int]] = []
+
+    def __len__(self) -> int:
+        # the tiles left in the wall
+        return len(self.wall) - self.head - self.tail
+
+    def apply(self, action: Action, seat: int, tile_id: int) -> None:
+        """
+            Apply one action, the same way as `record.GameReplay.apply`. The tile of `Action.DRAW` must be the next one in the wall.
+
+            Returns:
+                None.
+        """
+        counts = self.counts
+        base = seat * TILE_ID_NUM
+        claimed = self.tile_discard
+        back_id = _NO_TILE
+        pong_idx = -1
+        if action == Action.DRAW:
+            if self.head + self.tail < len(self.wall):
+                if self.wall[self.head] != tile_id:
+                    raise ValueError(f'Expected to draw {TILES[tile_id]}, the wall has {TILES[self.wall[self.head]]}.')
+                counts[base + tile_id] += 1
+                self.head += 1
+            else:
+                tile_id = _NO_TILE
+        elif action == Action.DISCARD:
+            counts[base + tile_id] -= 1
+            self.discards += bytes((seat, tile_id))
+            self.tile_discard = tile_id
+        elif action == Action.CHOW:
+            for chow_id in range(tile_id, tile_id + 3):
+                if chow_id != claimed:
+                    counts[base + chow_id] -= 1
+                    self.discards += bytes((seat, chow_id))
+            self.melds += bytes((seat, action, tile_id))
+        elif action == Action.PONG or action == Action.EXPOSED_KONG:
+            shown_num = _SHOWN_NUM[action]
+            counts[base + claimed] -= shown_num
+            self.discards += bytes((seat, claimed)) * shown_num
+            self.melds += bytes((seat, action, claimed))
+        elif action == Action.CONCEALED_KONG:
+            counts[base + tile_id] -= 4
+            self.melds += bytes((seat, action, tile_id))
+        elif action == Action.KONG_FROM_PONG:
+            counts[base + tile_id] -= 1
+            pong_idx = self._find_meld(seat, Action.PONG, tile_id)
+            del self.melds[pong_idx:pong_idx + 3]
+            self.melds += bytes((seat, action, tile_id))
+        else:
+            self.hu_seat = seat
+            self.hu_action = action
+        if action in _KONG_ACTIONS and self.head + self.tail < len(self.wall):
+            self.tail += 1
+            back_id = self.wall[-self.tail]
+            counts[base + back_id] += 1
+        self.history.append((action, seat, tile_id, self.current, claimed, back_id, pong_idx))
+        self.current = seat
+
+    def clone(self) -> 'GameState':
+        """
+            Returns:
+                GameState: A copy sharing only the immutable wall and seats, with its own history to undo.
+        """
+        state = GameState.__new__(GameState)
+        state.wall = self.wall
+        state.head = self.head
+        state.tail = self.tail
+        state.counts = self.counts[:]
+        state.discards = self.discards[:]
+        state.melds = self.melds[:]
+        state.seat_players = self.seat_players
+        state.dealer = self.dealer
+        state.current = self.current
+        state.joker = self.joker
+        state.rules = self.rules
+        state.tile_discard = self.tile_discard
+        state.hu_seat = self.hu_seat
+        state.hu_action = self.hu_action
+        state.history = self.history[:]
+        return state
+
+    @staticmethod
+    def from_game(game: 'MahjongGame') -> 'GameState':
+        """
+            Copy the state of the round being played by `game`. The order of the melds of different types is not kept by the players,
+            so the pongs, kongs and chows of every seat are copied in this order, and every kong as an exposed kong. The last discard
+            tile is only known if the game is recorded.
+
+            Returns:
+                GameState: The state.
+        """
+        if game.position_players is None:
+            raise ValueError('The round is not dealt.')
+        tile_ids = game.wall.tile_ids
+        wall = bytes(tile_ids[game.wall.start:]) + bytes(tile_ids[:game.wall.start])
+        seat_players = tuple(game.position_players[WindPosition(seat)].idx for seat in range(4))
+        state = GameState(wall, seat_players, game.dealer_position.value, game.joker.tile_id if game.joker is not None else _NO_TILE, game.rules)
+        state.head = game.wall.head
+        state.tail = game.wall.tail
+        for seat in range(4):
+            player = game.position_players[WindPosition(seat)]
+            state.counts[seat * TILE_ID_NUM:(seat + 1) * TILE_ID_NUM] = bytes(player.counts)
+            for tile in player.tiles_discard:
+                state.discards += bytes((seat, tile.tile_id))
+            for action, melds in ((Action.PONG, player.pong), (Action.EXPOSED_KONG, player.kong), (Action.CHOW, player.chow)):
+                for meld in melds:
+                    state.melds += bytes((seat, action, min(tile.tile_id for tile in meld)))
+        state.current = game.current_position.value
+        if game.record is not None:
+            # the game does not keep the last discard tile, only its record does
+            discards = [tile for action, _, tile in game.record.iter_actions() if action == Action.DISCARD]
+            state.tile_discard = discards[-1].tile_id if discards else _NO_TILE
+        if game.hu_position is not None:
+            state.hu_seat = game.hu_position.value
+            state.hu_action = Action.HU_WALL if game.hu_type == 'wall' else Action.HU_DISCARD
+        return state
+
+    @staticmethod
+    def from_record(record: GameRecord) -> 'GameState':
+        """
+            Deal the starting tiles from the recorded wall, the same as `record.GameReplay.deal_starting_tiles`.
+
+            Returns:
+                GameState: The state before the first recorded action, apply `record.iter_actions` to replay the round.
+        """
+        rules = compile_rules(record.options_config)
+        state = GameState(record.wall, tuple(record.seat_players), record.dealer_position.value, rules=rules)
+        for i in range(4):
+            for idx_pos in range(4):
+                base = (state.dealer + idx_pos) % 4 * TILE_ID_NUM
+                for _ in range(4 if i != 3 else 1):
+                    if state.head < len(state.wall):
+                        state.counts[base + state.wall[state.head]] += 1
+                        state.head += 1
+        state.counts[state.dealer * TILE_ID_NUM + state.wall[state.head]] += 1
+        state.head += 1
+        joker_ids = rules.joker_ids
+        if joker_ids is not None:
+            state.joker = joker_ids[state.wall[state.head]]
+            state.head += 1
+        return state
+
+    def hand(self, seat: int) -> list[MahjongTile]:
+        """
+            Returns:
+                list: The tiles in hand of the seat, sorted.
+        """
+        base = seat * TILE_ID_NUM
+        return [TILES[tile_id] for tile_id in range(TILE_ID_NUM) for _ in range(self.counts[base + tile_id])]
+
+    def players(self) -> dict[WindPosition, MahjongPlayer]:
+        """
+            Returns:
+                dict: New players at every position with the hands, discards and declared melds, the rules and the joker of this state, and the
+                    default agents.
+        """
+        position_players = {}
+        joker = TILES[self.joker] if self.joker != _NO_TILE else None
+        for seat in range(4):
+            player = MahjongPlayer(self.seat_players[seat], rules=self.rules)
+            self._fill(player, seat)
+            player.set_joker(joker)
+            position_players[WindPosition(seat)] = player
+        return position_players
+
+    def restore(self, game: 'MahjongGame') -> None:
+        """
+            Put this state into the round of `game`, keeping its players and agents. The hands are restored sorted.
+
+            Returns:
+                None.
+        """
+        if game.position_players is None:
+            raise ValueError('The round is not dealt.')
+        game.wall.build(self.wall)
+        game.wall.head = self.head
+        game.wall.tail = self.tail
+        game.joker = TILES[self.joker] if self.joker != _NO_TILE else None
+        for seat in range(4):
+            player = game.position_players[WindPosition(seat)]
+            self._fill(player, seat)
+            player.set_joker(game.joker)
+        game.current_position = WindPosition(self.current)
+        game.hu_position = WindPosition(self.hu_seat) if self.hu_seat >= 0 else None
+        game.hu_type = None if self.hu_seat < 0 else 'wall' if self.hu_action == Action.HU_WALL else 'discard'
+
+    def to_wall(self) -> Wall:
+        """
+            Returns:
+                Wall: A new wall with the tiles left in this state.
+        """
+        wall = Wall(self.wall)
+        wall.head = self.head
+        wall.tail = self.tail
+        return wall
+
+    def undo(self) -> None:
+        """
+            Undo the last applied action.
+
+            Returns:
+                None.
+        """
+        action, seat, tile_id, current, claimed, back_id, pong_idx = self.history.pop()
+        counts = self.counts
+        base = seat * TILE_ID_NUM
+        if back_id != _NO_TILE:
+            counts[base + back_id] -= 1
+            self.tail -= 1
+        if action == Action.DRAW:
+            if tile_id != _NO_TILE:
+                counts[base + tile_id] -= 1
+                self.head -= 1
+        elif action == Action.DISCARD:
+            counts[base + tile_id] += 1
+            del self.discards[-2:]
+        elif action == Action.CHOW:
+            for chow_id in range(tile_id, tile_id + 3):
+                if chow_id != claimed:
+                    counts[base + chow_id] += 1
+            del self.discards[-4:]
+            del self.melds[-3:]
+        elif action == Action.PONG or action == Action.EXPOSED_KONG:
+            counts[base + claimed] += _SHOWN_NUM[Action(action)]
+            del self.discards[-2 * _SHOWN_NUM[Action(action)]:]
+            del self.melds[-3:]
+        elif action == Action.CONCEALED_KONG:
+            counts[base + tile_id] += 4
+            del self.melds[-3:]
+        elif action == Action.KONG_FROM_PONG:
+            counts[base + tile_id] += 1
+            del self.melds[-3:]
+            self.melds[pong_idx:pong_idx] = bytes((seat, Action.PONG, tile_id))
+        else:
+            self.hu_seat = -1
+            self.hu_action = -1
+        self.current = current
+        self.tile_discard = claimed
+
+    def _fill(self, player: MahjongPlayer, seat: int) -> None:
+        player.tiles_hold = self.hand(seat)
+        player.tiles_discard = [TILES[self.discards[i + 1]] for i in range(0, len(self.discards), 2) if self.discards[i] == seat]
+        player.pong, player.kong, player.chow = [], [], []
+        for i in range(0, len(self.melds), 3):
+            if self.melds[i] == seat:
+                action, tile_id = self.melds[i + 1], self.melds[i + 2]
+                if action == Action.CHOW:
+                    player.chow.append([TILES[tile_id], TILES[tile_id + 1], TILES[tile_id + 2]])
+                elif action == Action.PONG:
+                    player.pong.append([TILES[tile_id]] * 3)
+                else:
+                    player.kong.append([TILES[tile_id]] * 4)
+
+    def _find_meld(self, seat: int, action: Action, tile_id: int) -> int:
+        for i in range(0, len(self.melds), 3):
+            if self.melds[i] == seat and self.melds[i + 1] == action and self.melds[i + 2] == tile_id:
+                return i
+        raise ValueError(f'No declared {action.name} of {TILES[tile_id]} at seat {seat}.')
+
+def test_game_state() -> None:
+    import random
+    from agents import MahjongAgent, RandomAgent
+    from events import LogLevel, log
+    from game import MahjongGame
+    from option_config import set_options_config
+    from record import GameReplay
+
+    agents: list[MahjongAgent] = [RandomAgent(random.Random(seat)) for seat in range(4)]
+    game = MahjongGame(set_options_config(joker=1), agents, record=True, rng=5)
+    with log.at_level(LogLevel.SILENT):
+        game.start_game()
+        game.play_round()
+    assert game.record is not None and game.position_players is not None
+    replay = GameReplay(game.record)
+    state = GameState.from_record(game.record)
+    start = state.clone()
+    same = True
+    for action, position, tile in game.record.iter_actions():
+        replay.apply(action, position, tile)
+        state.apply(action, position.value, tile.tile_id)
+        players = state.players()
+        same = same and all(
+            sorted(player.tiles_hold) == players[pos].tiles_hold and player.tiles_discard == players[pos].tiles_discard
+            and player.pong == players[pos].pong and player.kong == players[pos].kong and player.chow == players[pos].chow
+            for pos, player in replay.position_players.items()
+        )
+    print(same, state.hu_seat == game.hu_position.value if game.hu_position is not None else state.hu_seat == -1)  # True True
+    print(GameState.from_game(game).counts == state.counts, len(state) == len(game.wall))  # True True
+    # the players of a joker game wait with the joker: bamboo 111234567999 and the joker wait for any tile, not only for the joker
+    hand_state = GameState.from_record(game.record)
+    hand = [TILES[tile_id] for tile_id in (0, 0, 0, 1, 2, 3, 4, 5, 6, 8, 8, 8, hand_state.joker)]
+    hand_state.counts[TILE_ID_NUM:2 * TILE_ID_NUM] = bytes(sum(tile.tile_id == tile_id for tile in hand) for tile_id in range(TILE_ID_NUM))
+    player = hand_state.players()[WindPosition(1)]
+    joker_player = MahjongPlayer(0, rules=game.rules)
+    joker_player.tiles_hold = hand
+    joker_player.set_joker(TILES[hand_state.joker])
+    print(player.rules is game.rules, player.waits == joker_player.waits, len(player.waits) > 1)  # True True True
+
+    while state.history:
+        state.undo()
+    print(state.counts == start.counts, state.discards == start.discards, state.melds == start.melds, (state.head, state.tail) == (start.head, start.tail))  # True True True True
+
+    # a clone shares the wall only, applying to it leaves the original as it is, see `benchmark.py` for the speed of cloning
+    clone = start.clone()
+    action, position, tile = next(game.record.iter_actions())
+    clone.apply(action, position.value, tile.tile_id)
+    print(clone.wall is start.wall, clone.counts != start.counts, start.history == [], (start.head, start.current) == (state.head, state.current))  # True True True True
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from array import array
+from collections.abc import Sequence
 from enum import Enum
 import random
 from typing import Any
@@ -21,14 +23,55 @@ class WindPosition(Enum):
             return (other.value - self.value) % 4
         raise NotImplementedError('Not supported.')
 
+# Tile types in tile ID order, with the count of numbers of every type.
+# Suited and honors take tile IDs 0..33, bonus tiles take tile IDs 34..41.
+TILE_TYPES: tuple[tuple[str, int], ...] = (
+    ('bamboo', 9), ('characters', 9), ('dots', 9),
+    ('dragons', 3), ('winds', 4),
+    ('flowers', 4), ('seasons', 4),
+)
+
+SUITED_TYPES: tuple[str, ...] = ('bamboo', 'characters', 'dots')
+
+TILE_ID_NUM: int = sum(size for _, size in TILE_TYPES)
+
+PLAYING_TILE_ID_NUM: int = 34  # suited and honors, the tiles that can form a legal hand
+
+SUITED_TILE_ID_NUM: int = 27
+
+TYPE_SIZE: dict[str, int] = dict(TILE_TYPES)
+
+# The first tile ID of every tile type
+TYPE_ID_START: dict[str, int] = {
+    tile_type: sum(size for _, size in TILE_TYPES[:i]) for i, (tile_type, _) in enumerate(TILE_TYPES)
+}
+
 class MahjongTile:
-    def __init__(self, tile_type: str, number: int) -> None:
-        # Which tile
-        self.tile_type: str = tile_type
-        self.number: int = number
-        # Where is the tile in game
-        self.wall_pos: None | WindPosition = None
-        self.wall_idx: None | int = None
+    """
+        An immutable tile. Every (tile_type, number) has exactly one interned instance, use `tile_id` for cheap comparisons.
+    """
+    __slots__ = ('tile_id', 'tile_type', 'number')
+
+    tile_id: int
+    tile_type: str
+    number: int
+
+    def __new__(cls, tile_type: str, number: int) -> MahjongTile:
+        if tile_type not in TYPE_SIZE or not 1 <= number <= TYPE_SIZE[tile_type]:
+            raise ValueError(f'Invalid tile: {tile_type}{number}.')
+        return TILES[TYPE_ID_START[tile_type] + number - 1]
+
+    @classmethod
+    def _intern(cls, tile_id: int, tile_type: str, number: int) -> MahjongTile:
+        tile = object.__new__(cls)
+        object.__setattr__(tile, 'tile_id', tile_id)
+        object.__setattr__(tile, 'tile_type', tile_type)
+        object.__setattr__(tile, 'number', number)
+        return tile
+
+    @staticmethod
+    def from_id(tile_id: int) -> MahjongTile:
+        return TILES[tile_id]
 
     @staticmethod
     def get_tiles_from_string(tile_str: str) -> MahjongTile:
@@ -37,57 +80,118 @@ class MahjongTile:
         return MahjongTile(tile_type_name, number)
 
     def __add__(self, other: Any) -> MahjongTile:
-        # TODO: modification for bonus and flowers
+        # TODO: modification for bonus
+        # The succeeding tile wraps around in the same tile type, e.g., bamboo9 + 1 is bamboo1, winds4 + 1 is winds1
         if isinstance(other, int):
-            num = self.number + other
-            if num <= 9 and self.tile_type in ['bamboo', 'characters', 'dots']:
-                return MahjongTile(self.tile_type, num)
-            return MahjongTile(self.tile_type, num % 9)
+            return TILES[TYPE_ID_START[self.tile_type] + (self.number - 1 + other) % TYPE_SIZE[self.tile_type]]
         raise NotImplementedError('Not supported.')
 
+    def __copy__(self) -> MahjongTile:
+        return self
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> MahjongTile:
+        return self
+
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, MahjongTile):
-            return self.tile_type == other.tile_type and self.number == other.number
+            return self is other
         elif isinstance(other, tuple) and isinstance(other[0], str) and isinstance(other[1], int):
             return self.tile_type == other[0] and self.number == other[1]
         raise NotImplementedError('Not supported.')
 
     def __hash__(self) -> int:
-        return hash((self.tile_type, self.number))
+        return self.tile_id
 
     def __lt__(self, other: Any) -> bool:
         if isinstance(other, MahjongTile):
-            return (self.tile_type, self.number) < (other.tile_type, other.number)
+            return self.tile_id < other.tile_id
         raise NotImplementedError('Not supported.')
 
+    def __reduce__(self) -> tuple[Any, ...]:
+        # unpickle to the interned instance
+        return MahjongTile.from_id, (self.tile_id,)
+
     def __repr__(self) -> str:
         return f'{self.tile_type}{self.number}'
 
-def shuffle_tiles(options_config: dict[str, bool]) -> list[MahjongTile]:
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError('MahjongTile is immutable.')
+
+# All interned tiles, indexed by tile ID
+TILES: tuple[MahjongTile, ...] = tuple(
+    MahjongTile._intern(TYPE_ID_START[tile_type] + number - 1, tile_type, number)
+    for tile_type, size in TILE_TYPES for number in range(1, size + 1)
+)
+
+# The tile IDs of the tile set of every (suited, honors, bonus) options, built on first use
+_tile_sets: dict[tuple[bool, bool, bool], array[int]] = {}
+
+def shuffle_tiles(options_config: dict[str, bool | int], rng: random.Random) -> list[MahjongTile]:
+    """
+        Shuffle all tiles with tile type config, with the stream `rng` of the table.
+
+        Returns:
+            list: The shuffled tiles.
+    """
+    tile_ids = list(tile_set(options_config))
+    rng.shuffle(tile_ids)
+    return [TILES[tile_id] for tile_id in tile_ids]
+
+def tile_set(options_config: dict[str, bool | int]) -> array[int]:
+    """
+        The tile IDs of all tiles in the game with tile type config, in tile ID order. The array is cached and shared, copy it before
+        changing it.
+
+        Returns:
+            array: The tile IDs, as unsigned bytes.
+    """
+    key = (bool(options_config['suited']), bool(options_config['honors']), bool(options_config['bonus']))
+    tile_ids = _tile_sets.get(key)
+    if tile_ids is None:
+        tile_ids = array('B')
+        if options_config['suited']:
+            tile_ids.extend(tile_id for tile_id in range(TYPE_ID_START['bamboo'], TYPE_ID_START['dragons']) for _ in range(4))
+
+        if options_config['honors']:
+            # winds1: East, winds2: South, winds3: West, winds4: North
+            # dragons1: Red, dragons2: Green, dragons3: White
+            tile_ids.extend(tile_id for tile_id in range(TYPE_ID_START['dragons'], TYPE_ID_START['flowers']) for _ in range(4))
+
+        if options_config['bonus']:
+            # flowers1: Plum blossom, flowers2: Orchid, flowers3: Bamboo, flowers4: Chrysanthemum
+            # seasons1: Spring, seasons2: Summer, seasons3: Autumn, seasons4: Winter
+            tile_ids.extend(range(TYPE_ID_START['flowers'], TILE_ID_NUM))
+        _tile_sets[key] = tile_ids
+    return tile_ids
+
+def counts_to_suit_masks(counts: Sequence[int]) -> list[int]:
+    """
+        The numbers in hand of every suit as a bitmask, bit `number - 1` is set if there is the tile.
+
+        Returns:
+            list: The bitmask of bamboo, characters, and dots.
+    """
+    return [
+        sum(1 << number for number in range(9) if counts[suit_start + number])
+        for suit_start in range(0, SUITED_TILE_ID_NUM, 9)
+    ]
+
+def tiles_to_counts(tiles: list[MahjongTile]) -> list[int]:
     """
-        Shuffle all tiles with tile type config.
+        Count tiles by tile ID.
 
         Returns:
-            None.
+            list: The count of every tile ID, with length `TILE_ID_NUM`.
     """
-    tiles = []
-    if options_config['suited']:
-        for tile_type in ['bamboo', 'characters', 'dots']:
-            for number in range(1, 10):
-                tiles += [MahjongTile(tile_type, number) for _ in range(4)]
-
-    if options_config['honors']:
-        # winds1: East, winds2: South, winds3: West, winds4: North
-        # dragons1: Red, dragons2: Green, dragons3: White
-        for tile_type, numbers in [('dragons', range(1, 4)), ('winds', range(1, 5))]:
-            tiles += [MahjongTile(tile_type, number) for number in numbers for _ in range(4)]
-
-    if options_config['bonus']:
-        # flowers1: Plum blossom, flowers2: Orchid, flowers3: Bamboo, flowers4: Chrysanthemum
-        # seasons1: Spring, seasons2: Summer, seasons3: Autumn, seasons4: Winter
-        for tile_type in ['flowers', 'seasons']:
-            tiles += [MahjongTile(tile_type, number) for number in range(1, 5)]
-
-    # shuffle tiles
-    random.shuffle(tiles)
-    return tiles
+    counts = [0] * TILE_ID_NUM
+    for tile in tiles:
+        counts[tile.tile_id] += 1
+    return counts
+
+def test_mahjong_tile() -> None:
+    tile = MahjongTile('bamboo', 9)
+    print(tile is MahjongTile.get_tiles_from_string('bamboo9'), tile.tile_id)  # True 8
+    print(tile + 1, MahjongTile('dragons', 3) + 1, MahjongTile('winds', 4) + 1)  # bamboo1 dragons1 winds1
+    print(sorted([MahjongTile('winds', 1), MahjongTile('dots', 2), MahjongTile('bamboo', 3)]))  # [bamboo3, dots2, winds1]
+    options_config: dict[str, bool | int] = {'suited': True, 'honors': True, 'bonus': False, 'joker': False}
+    print(len(tile_set(options_config)), tile_set(options_config) is tile_set({**options_config, 'joker': 1}))  # 136 True
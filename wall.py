@@ -0,0 +1,100 @@
+from array import array
+from collections.abc import Iterable, Iterator
+import random
+
+from tiles import TILES, MahjongTile
+
+class Wall:
+    """
+        The wall as a ring buffer of tile IDs. The tiles are kept in the order they are built, drawing starts at `self.start`
+        (decided by the dice) and goes on to the end and around. The live wall is drawn from the head, and the kong replacement
+        tiles are drawn from the tail (the dead wall).
+
+        The buffer is reused across rounds, so dealing a new round with the same tiles count does not allocate.
+    """
+    __slots__ = ('tile_ids', 'start', 'head', 'tail')
+
+    def __init__(self, tile_ids: Iterable[int] = (), start: int = 0) -> None:
+        self.tile_ids: array[int] = array('B')
+        self.start: int = 0  # the index in `self.tile_ids` of the first tile to draw
+        self.head: int = 0  # the count of tiles drawn from the head
+        self.tail: int = 0  # the count of tiles drawn from the tail
+        self.build(tile_ids, start)
+
+    def __bool__(self) -> bool:
+        return self.head + self.tail < len(self.tile_ids)
+
+    def __iter__(self) -> Iterator[MahjongTile]:
+        # the tiles left, from the head to the tail
+        tiles_num = len(self.tile_ids)
+        for i in range(self.head, tiles_num - self.tail):
+            yield TILES[self.tile_ids[(self.start + i) % tiles_num]]
+
+    def __len__(self) -> int:
+        return len(self.tile_ids) - self.head - self.tail
+
+    def __repr__(self) -> str:
+        return f'Wall({list(self)})'
+
+    def build(self, tile_ids: Iterable[int], start: int = 0) -> None:
+        """
+            Set the tiles in building order, and start drawing at index `start`.
+
+            Returns:
+                None.
+        """
+        tiles_num = 0
+        for tiles_num, tile_id in enumerate(tile_ids, 1):
+            if tiles_num <= len(self.tile_ids):
+                self.tile_ids[tiles_num - 1] = tile_id
+            else:
+                self.tile_ids.append(tile_id)
+        del self.tile_ids[tiles_num:]
+        self.start = start % tiles_num if tiles_num else 0
+        self.head = 0
+        self.tail = 0
+
+    def draw(self) -> MahjongTile:
+        """
+            Returns:
+                MahjongTile: The tile at the head of the live wall.
+        """
+        if self.head + self.tail >= len(self.tile_ids):
+            raise IndexError('Draw from an empty wall.')
+        tile_id = self.tile_ids[(self.start + self.head) % len(self.tile_ids)]
+        self.head += 1
+        return TILES[tile_id]
+
+    def draw_back(self) -> MahjongTile:
+        """
+            Returns:
+                MahjongTile: The tile at the tail, for the kong replacement draw.
+        """
+        if self.head + self.tail >= len(self.tile_ids):
+            raise IndexError('Draw from an empty wall.')
+        self.tail += 1
+        return TILES[self.tile_ids[(self.start - self.tail) % len(self.tile_ids)]]
+
+    def shuffle(self, tile_ids: array[int], rng: random.Random) -> None:
+        """
+            Copy `tile_ids` to the buffer and shuffle them in place, with the stream `rng` of the table. Drawing starts at index 0
+            until `self.start` is set.
+
+            Returns:
+                None.
+        """
+        self.tile_ids[:] = tile_ids
+        rng.shuffle(self.tile_ids)
+        self.start = 0
+        self.head = 0
+        self.tail = 0
+
+def test_wall() -> None:
+    wall = Wall(range(8), 3)
+    print(wall.draw(), wall.draw_back(), len(wall))  # bamboo4 bamboo3 6
+    print(wall)  # Wall([bamboo5, bamboo6, bamboo7, bamboo8, bamboo1, bamboo2])
+    tile_ids = wall.tile_ids
+    wall.build(range(8, 0, -1), 7)
+    print(wall.tile_ids is tile_ids, wall.draw(), len(wall))  # True bamboo2 7
+    wall.shuffle(array('B', range(8)), random.Random(0))
+    print(wall.tile_ids is tile_ids, sorted(wall) == [TILES[tile_id] for tile_id in range(8)])  # True True